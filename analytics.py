@@ -0,0 +1,267 @@
+# analytics.py
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from form_schema import MONTHLY_CATEGORIES
+
+# Scale factor that makes the MAD comparable to a standard deviation for normal data
+MAD_SCALE = 0.6745
+# Same for the mean absolute deviation, used when more than half the history is one value (MAD = 0)
+MEAN_AD_SCALE = 1.253314
+ANOMALY_THRESHOLD = 3.5
+
+
+def numeric_field_columns(categories=None):
+    """Data keys of every number field in the form categories (MONTHLY_CATEGORIES by default)"""
+    return [
+        f"{category}_{field['id']}"
+        for category, details in (categories or MONTHLY_CATEGORIES).items()
+        for field in details['fields']
+        if field['type'] == 'number'
+    ]
+
+
+# ==================== ANALYTICS FRAME ====================
+def build_analytics_frame(entries):
+    """One row per report: district, year, month, month_year, status and every numeric field"""
+    if not entries:
+        return pd.DataFrame(columns=['district', 'year', 'month', 'month_year', 'status'])
+
+    df = pd.DataFrame({
+        'district': [e.get('district') for e in entries],
+        'year': [e.get('year') for e in entries],
+        'month': [e.get('month') for e in entries],
+        'status': [e.get('status') for e in entries],
+    })
+    df['month_year'] = df['year'].astype(str) + '-' + df['month'].astype(int).map('{:02d}'.format)
+
+    data = pd.DataFrame([e.get('data', {}) for e in entries]).infer_objects()
+    numeric = data.select_dtypes(include=[np.number]).drop(
+        columns=data.select_dtypes(include=['bool']).columns
+    )
+    return pd.concat([df, numeric], axis=1)
+
+
+# ==================== ANOMALY SCORING ====================
+def _nanmedian(values, axis):
+    """np.nanmedian without the all-NaN slice warning"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return np.nanmedian(values, axis=axis)
+
+
+def _nanmean(values, axis):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return np.nanmean(values, axis=axis)
+
+
+def _robust_z(values, median, mad, mean_ad):
+    """Robust z-score; NaN only where there is no history (or no value).
+
+    With a zero MAD the mean absolute deviation sets the scale; against a constant history
+    any deviation is infinitely unusual (e.g. 10,000,000 after months of 0).
+    """
+    deviation = values - median
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(mad > 0, MAD_SCALE * deviation / mad,
+                     np.where(mean_ad > 0, deviation / (MEAN_AD_SCALE * mean_ad),
+                              np.where(deviation == 0, 0.0, np.sign(deviation) * np.inf)))
+    return np.where(np.isnan(deviation) | np.isnan(mad), np.nan, z)
+
+
+def _trailing_median_mad(values, group_start, window):
+    """Median, MAD and mean absolute deviation of the previous `window` rows of the same group, for every row at once"""
+    n, n_fields = values.shape
+    padded = np.vstack([np.full((window, n_fields), np.nan), values])
+    # windows[i] covers values[i - window : i] -> shape (n, n_fields, window)
+    windows = sliding_window_view(padded, window, axis=0)[:n]
+
+    # Drop window slots that belong to a different district
+    positions = np.arange(n)[:, None] - window + np.arange(window)[None, :]
+    other_group = positions < group_start[:, None]
+    windows = np.where(other_group[:, None, :], np.nan, windows)
+
+    median = _nanmedian(windows, axis=2)
+    deviations = np.abs(windows - median[:, :, None])
+    return median, _nanmedian(deviations, axis=2), _nanmean(deviations, axis=2)
+
+
+def score_submissions(history_df, pending_df, window=12, min_history=3, threshold=ANOMALY_THRESHOLD,
+                      categories=None):
+    """Score pending submissions against each district's trailing history and the state-wide distribution.
+
+    Returns (summary, flags): one summary row per pending submission, and one flag row per
+    field whose district or state robust z-score exceeds the threshold. `scored` is False for
+    submissions no field could be compared for; they must not be treated as normal.
+    """
+    fields = [c for c in numeric_field_columns(categories) if c in pending_df.columns]
+    summary_cols = ['district', 'year', 'month', 'anomaly_score', 'flag_count', 'flagged_fields', 'scored']
+    flag_cols = ['district', 'year', 'month', 'field', 'value', 'district_median', 'district_z',
+                 'state_median', 'state_z']
+    if pending_df.empty or not fields:
+        return pd.DataFrame(columns=summary_cols), pd.DataFrame(columns=flag_cols)
+
+    history = history_df.reindex(columns=['district', 'year', 'month'] + fields)
+    pending = pending_df.reindex(columns=['district', 'year', 'month'] + fields)
+
+    # History and pending rows in one frame ordered by district and period; pending rows
+    # sort after history of the same month and contribute no values to any window
+    combined = pd.concat(
+        [history.assign(_pending=False), pending.assign(_pending=True)],
+        ignore_index=True
+    ).sort_values(['district', 'year', 'month', '_pending'], kind='stable').reset_index(drop=True)
+
+    values = combined[fields].to_numpy(dtype=float)
+    history_values = np.where(combined['_pending'].to_numpy()[:, None], np.nan, values)
+
+    codes = combined['district'].astype('category').cat.codes.to_numpy()
+    row_index = np.arange(len(combined))
+    is_start = np.r_[True, codes[1:] != codes[:-1]]
+    group_start = np.maximum.accumulate(np.where(is_start, row_index, 0))
+
+    district_median, district_mad, district_mean_ad = _trailing_median_mad(history_values, group_start, window)
+    # Count of history values in each trailing window
+    observed = (~np.isnan(history_values)).astype(int)
+    cumulative = np.vstack([np.zeros((1, len(fields)), dtype=int), np.cumsum(observed, axis=0)])
+    window_start = np.maximum(row_index - window, group_start)
+    counts = cumulative[row_index] - cumulative[window_start]
+
+    district_z = np.where(counts >= min_history,
+                          _robust_z(values, district_median, district_mad, district_mean_ad), np.nan)
+
+    # State-wide distribution over all approved history
+    state_values = history[fields].to_numpy(dtype=float)
+    if len(state_values):
+        state_median = _nanmedian(state_values, axis=0)
+        state_mad = _nanmedian(np.abs(state_values - state_median), axis=0)
+        state_mean_ad = _nanmean(np.abs(state_values - state_median), axis=0)
+    else:
+        state_median = state_mad = state_mean_ad = np.full(len(fields), np.nan)
+    state_z = _robust_z(values, state_median[None, :], state_mad[None, :], state_mean_ad[None, :])
+
+    # Keep pending rows only
+    is_pending = combined['_pending'].to_numpy()
+    keys = combined.loc[is_pending, ['district', 'year', 'month']].reset_index(drop=True)
+    district_z, state_z = district_z[is_pending], state_z[is_pending]
+    scores = np.fmax(np.abs(district_z), np.abs(state_z))
+    flagged = scores > threshold
+
+    summary = keys.copy()
+    summary['anomaly_score'] = np.nan_to_num(scores, nan=0.0, posinf=np.inf).max(axis=1).round(2)
+    summary['flag_count'] = flagged.sum(axis=1)
+    field_names = np.array(fields, dtype=object)
+    summary['flagged_fields'] = [list(field_names[row]) for row in flagged]
+    summary['scored'] = (~np.isnan(scores)).any(axis=1)
+
+    rows, cols = np.nonzero(flagged)
+    flags = pd.DataFrame({
+        'district': keys['district'].to_numpy()[rows],
+        'year': keys['year'].to_numpy()[rows],
+        'month': keys['month'].to_numpy()[rows],
+        'field': field_names[cols],
+        'value': values[is_pending][rows, cols],
+        'district_median': district_median[is_pending][rows, cols],
+        'district_z': district_z[rows, cols].round(2),
+        'state_median': state_median[cols],
+        'state_z': state_z[rows, cols].round(2),
+    }, columns=flag_cols)
+
+    return summary, flags
+
+
+# ==================== SUBMISSION COMPLETENESS ====================
+# Reports for a month are due by this day of the following month
+SUBMISSION_DEADLINE_DAY = 10
+
+STATUS_NOT_DUE, STATUS_MISSING, STATUS_DRAFT, STATUS_SUBMITTED, STATUS_APPROVED, STATUS_REJECTED = range(6)
+STATUS_CODES = {
+    'draft': STATUS_DRAFT,
+    'submitted': STATUS_SUBMITTED,
+    'approved': STATUS_APPROVED,
+    'rejected': STATUS_REJECTED,
+}
+STATUS_LABELS = ['Not Due', 'Missing', 'Draft', 'Submitted', 'Approved', 'Rejected']
+STATUS_COLORS = ['#f8f9fa', '#adb5bd', '#6c757d', '#ffc107', '#28a745', '#dc3545']
+
+
+def submission_deadlines(year):
+    """Deadline timestamp (UTC) for each month of a year"""
+    following = pd.date_range(f"{year}-02-01", periods=12, freq='MS')
+    return (following + pd.Timedelta(days=SUBMISSION_DEADLINE_DAY - 1)).tz_localize('UTC')
+
+
+def build_status_matrix(rows, districts, year, now=None):
+    """District x month int8 status codes plus a late-submission mask for one year"""
+    now = pd.Timestamp(now) if now is not None else pd.Timestamp.now(tz='UTC')
+    if now.tzinfo is None:
+        now = now.tz_localize('UTC')
+    deadlines = submission_deadlines(year)
+
+    # Months without a report are Missing once their deadline has passed
+    codes = np.where(deadlines < now, STATUS_MISSING, STATUS_NOT_DUE).astype(np.int8)
+    codes = np.tile(codes, (len(districts), 1))
+    late = np.zeros(codes.shape, dtype=bool)
+    if not rows:
+        return codes, late
+
+    df = pd.DataFrame(rows)
+    district_idx = pd.Index(districts).get_indexer(df['district'])
+    month_idx = pd.to_numeric(df['month'], errors='coerce').fillna(0).astype(int).to_numpy() - 1
+    status = df['status'].map(STATUS_CODES).fillna(STATUS_DRAFT).astype(np.int8).to_numpy()
+    keep = (district_idx >= 0) & (month_idx >= 0) & (month_idx < 12)
+    codes[district_idx[keep], month_idx[keep]] = status[keep]
+
+    if 'submission_date' in df.columns:
+        submitted_at = pd.to_datetime(df['submission_date'], errors='coerce', utc=True)
+        is_late = (submitted_at > deadlines[np.clip(month_idx, 0, 11)]).fillna(False).to_numpy(dtype=bool)
+        late[district_idx[keep], month_idx[keep]] = is_late[keep]
+
+    return codes, late
+
+
+# ==================== REVIEW COMPARISON ====================
+def comparison_periods(year, month):
+    """(year, month) of the previous month and of the same month last year"""
+    previous = (year - 1, 12) if month == 1 else (year, month - 1)
+    return previous, (year - 1, month)
+
+
+def _pct_change(current, base):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = (current - base) / np.abs(base) * 100
+    return pct.where(base != 0).round(1)
+
+
+def build_review_comparison(current, previous=None, last_year=None, categories=None):
+    """One row per form field: the submission next to the previous month and the same month last year"""
+    rows = [
+        (category, field['label'], f"{category}_{field['id']}", field['type'] == 'number')
+        for category, details in (categories or MONTHLY_CATEGORIES).items()
+        for field in details['fields']
+    ]
+    frame = pd.DataFrame(rows, columns=['Category', 'Field', 'key', 'numeric'])
+
+    def values(report):
+        data = (report or {}).get('data', {})
+        return frame['key'].map(lambda key: data.get(key))
+
+    frame['Current'] = values(current)
+    frame['Previous Month'] = values(previous)
+    frame['Last Year'] = values(last_year)
+
+    numeric = frame['numeric']
+    current_num = pd.to_numeric(frame['Current'].where(numeric), errors='coerce')
+    for column, prefix in (('Previous Month', 'Δ Prev'), ('Last Year', 'Δ LY')):
+        base = pd.to_numeric(frame[column].where(numeric), errors='coerce')
+        frame[prefix] = current_num - base
+        frame[f"{prefix} %"] = _pct_change(current_num, base)
+
+    # Text and dropdown answers shown as strings so the table has one type per column
+    for column in ('Current', 'Previous Month', 'Last Year'):
+        frame[column] = frame[column].map(lambda v: '' if v is None else str(v))
+    return frame[['Category', 'Field', 'Current', 'Previous Month', 'Δ Prev', 'Δ Prev %',
+                  'Last Year', 'Δ LY', 'Δ LY %']]
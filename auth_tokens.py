@@ -0,0 +1,172 @@
+# auth_tokens.py
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+import requests
+from cryptography.x509 import load_pem_x509_certificate
+
+logger = logging.getLogger(__name__)
+
+# Public keys that sign Firebase Auth ID tokens, rotated by Google every few hours
+SECURETOKEN_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+SIGN_IN_URL = "https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword"
+REFRESH_URL = "https://securetoken.googleapis.com/v1/token"
+ISSUER_PREFIX = "https://securetoken.google.com/"
+# Allowed clock difference between this server and Google's
+CLOCK_SKEW = 60
+# Unknown key IDs trigger at most one key download per this many seconds
+MIN_KEY_REFRESH_INTERVAL = 30
+HTTP_TIMEOUT = 10
+# Custom claims set on every account; the same keys as the users collection
+CLAIM_KEYS = ('role', 'district', 'can_edit')
+
+# Sign-in errors from the Identity Toolkit API, as shown to users
+SIGN_IN_ERRORS = {
+    'EMAIL_NOT_FOUND': "Invalid email or password",
+    'INVALID_PASSWORD': "Invalid email or password",
+    'INVALID_LOGIN_CREDENTIALS': "Invalid email or password",
+    'INVALID_EMAIL': "Invalid email address",
+    'USER_DISABLED': "This account has been deactivated",
+    'TOO_MANY_ATTEMPTS_TRY_LATER': "Too many attempts, try again later",
+}
+
+
+class AuthError(Exception):
+    """Sign-in failed or an ID token is not valid"""
+
+
+class SigningKeys:
+    """Google's token signing certificates by key ID, cached for their max-age and re-downloaded on a key ID miss"""
+
+    def __init__(self, url=SECURETOKEN_CERTS_URL, fetch=None):
+        self.url = url
+        self._fetch = fetch or self._download
+        self._keys = {}
+        self._expires_at = 0.0
+        self._last_fetch = 0.0
+        self._lock = threading.Lock()
+
+    def _download(self):
+        response = requests.get(self.url, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        match = re.search(r"max-age=(\d+)", response.headers.get('Cache-Control', ''))
+        return response.json(), int(match.group(1)) if match else 3600
+
+    def refresh(self):
+        certificates, max_age = self._fetch()
+        keys = {kid: load_pem_x509_certificate(pem.encode()).public_key() for kid, pem in certificates.items()}
+        self._keys = keys
+        self._last_fetch = time.time()
+        self._expires_at = self._last_fetch + max_age
+
+    def get(self, kid):
+        """Public key for a key ID; raises AuthError if Google does not know it"""
+        key = self._keys.get(kid)
+        if key is not None and time.time() < self._expires_at:
+            return key
+        with self._lock:
+            key = self._keys.get(kid)
+            expired = time.time() >= self._expires_at
+            if key is None or expired:
+                if expired or time.time() - self._last_fetch >= MIN_KEY_REFRESH_INTERVAL:
+                    try:
+                        self.refresh()
+                    except Exception as e:
+                        # Keep using the old keys if Google is briefly unreachable
+                        logger.warning("Could not refresh token signing keys: %s", e)
+                        if not self._keys:
+                            raise AuthError("Token signing keys unavailable") from e
+                key = self._keys.get(kid)
+        if key is None:
+            raise AuthError("Token signed with an unknown key")
+        return key
+
+
+class VerifiedTokens:
+    """Claims of tokens already verified, kept until the token expires (bounded LRU)"""
+
+    def __init__(self, max_entries=4096):
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            claims = self._entries.get(key)
+            if claims is None:
+                return None
+            if claims['exp'] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, token, claims):
+        with self._lock:
+            self._entries[self._key(token)] = claims
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+SIGNING_KEYS = SigningKeys()
+VERIFIED_TOKENS = VerifiedTokens()
+
+
+def verify_id_token(token, project_id, keys=SIGNING_KEYS, cache=VERIFIED_TOKENS):
+    """Claims of a Firebase Auth ID token, checked locally (signature, audience, issuer, expiry)"""
+    claims = cache.get(token) if cache is not None else None
+    if claims is not None:
+        return claims
+    try:
+        header = jwt.get_unverified_header(token)
+        if header.get('alg') != 'RS256':
+            raise AuthError("Unexpected token algorithm")
+        claims = jwt.decode(
+            token,
+            keys.get(header.get('kid')),
+            algorithms=['RS256'],
+            audience=project_id,
+            issuer=ISSUER_PREFIX + project_id,
+            leeway=CLOCK_SKEW,
+            options={'require': ['exp', 'iat', 'aud', 'iss', 'sub']},
+        )
+    except jwt.PyJWTError as e:
+        raise AuthError(f"Invalid token: {e}") from e
+    if not claims['sub'] or claims.get('auth_time', 0) > time.time() + CLOCK_SKEW:
+        raise AuthError("Invalid token subject or auth time")
+    if cache is not None:
+        cache.put(token, claims)
+    return claims
+
+
+def _post(url, api_key, payload):
+    response = requests.post(url, params={'key': api_key}, json=payload, timeout=HTTP_TIMEOUT)
+    if response.ok:
+        return response.json()
+    try:
+        code = response.json()['error']['message'].split(' ')[0]
+    except Exception:
+        code = f"HTTP {response.status_code}"
+    raise AuthError(SIGN_IN_ERRORS.get(code, f"Sign-in failed ({code})"))
+
+
+def sign_in_with_password(api_key, email, password):
+    """Firebase Auth email/password sign-in; returns (id_token, refresh_token)"""
+    result = _post(SIGN_IN_URL, api_key, {'email': email, 'password': password, 'returnSecureToken': True})
+    return result['idToken'], result['refreshToken']
+
+
+def refresh_id_token(api_key, refresh_token):
+    """New (id_token, refresh_token) for a session whose ID token has expired"""
+    result = _post(REFRESH_URL, api_key, {'grant_type': 'refresh_token', 'refresh_token': refresh_token})
+    return result['id_token'], result['refresh_token']
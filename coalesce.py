@@ -0,0 +1,102 @@
+# coalesce.py
+import functools
+import threading
+import time
+from collections import defaultdict
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a user calls an expensive operation too often"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Too many requests, try again in {retry_after:.0f} s")
+        self.retry_after = retry_after
+
+
+# ==================== SINGLE-FLIGHT ====================
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key share its result"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = defaultdict(lambda: {"executed": 0, "coalesced": 0})
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.stats[key[0]]["coalesced"] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.stats[key[0]]["executed"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(counts) for name, counts in self.stats.items()}
+
+
+SINGLE_FLIGHT = SingleFlight()
+
+
+def coalesced(operation, flight=SINGLE_FLIGHT):
+    """Share one in-flight execution among concurrent identical calls in this process"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (operation, args, tuple(sorted(kwargs.items())))
+            return flight.do(key, fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ==================== RATE LIMITING ====================
+class RateLimiter:
+    """At most `limit` calls per user and operation in each fixed `window`-second time bucket"""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def check(self, user, operation):
+        """Count a call, or raise RateLimitExceeded if the user's current bucket is full"""
+        now = time.time()
+        bucket = int(now // self.window)
+        with self._lock:
+            # Buckets from earlier windows can never be hit again
+            for key in [k for k in self._counts if k[2] != bucket]:
+                del self._counts[key]
+            key = (user, operation, bucket)
+            if self._counts.get(key, 0) >= self.limit:
+                raise RateLimitExceeded((bucket + 1) * self.window - now)
+            self._counts[key] = self._counts.get(key, 0) + 1
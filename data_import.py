@@ -0,0 +1,124 @@
+# data_import.py
+from datetime import datetime
+
+import pandas as pd
+
+from form_schema import MONTHLY_CATEGORIES, DISTRICTS
+
+# Same key columns as the "Raw Data" sheet of the Excel report, so an export can be re-imported
+KEY_COLUMNS = ['District', 'Year', 'Month']
+FIRST_IMPORT_YEAR = 2000
+
+
+def field_columns(categories=None):
+    """(column, field) pairs for every field in the form categories (MONTHLY_CATEGORIES by default)"""
+    return [
+        (f"{category}_{field['id']}", field)
+        for category, details in (categories or MONTHLY_CATEGORIES).items()
+        for field in details['fields']
+    ]
+
+
+def import_template(categories=None):
+    """Empty frame with the expected import columns"""
+    return pd.DataFrame(columns=KEY_COLUMNS + [col for col, _ in field_columns(categories)])
+
+
+def read_import_file(uploaded_file):
+    """Read an uploaded CSV or Excel file into a DataFrame of strings"""
+    name = uploaded_file.name.lower()
+    if name.endswith('.csv'):
+        return pd.read_csv(uploaded_file, dtype=str, keep_default_na=False)
+
+    sheets = pd.read_excel(uploaded_file, sheet_name=None, dtype=str, keep_default_na=False)
+    # Prefer the raw data sheet of our own Excel report
+    return sheets.get('Raw Data', next(iter(sheets.values())))
+
+
+def validate_import_frame(df, allowed_districts=None, categories=None):
+    """Validate all rows at once; returns (clean_df, errors_df)"""
+    allowed_districts = allowed_districts or DISTRICTS
+    df = df.rename(columns=lambda c: str(c).strip()).reset_index(drop=True)
+    errors = []
+
+    def flag(mask, column, message):
+        if mask.any():
+            errors.append(pd.DataFrame({
+                # Row number as seen in a spreadsheet (header is row 1)
+                'Row': df.index[mask] + 2,
+                'Column': column,
+                'Error': message,
+            }))
+
+    missing = [col for col in KEY_COLUMNS if col not in df.columns]
+    if missing:
+        return df.iloc[0:0], pd.DataFrame({
+            'Row': [1] * len(missing), 'Column': missing, 'Error': 'Required column missing'
+        })
+
+    clean = pd.DataFrame(index=df.index)
+
+    # Key columns
+    clean['District'] = df['District'].astype(str).str.strip()
+    flag(~clean['District'].isin(allowed_districts), 'District', 'Unknown or not permitted district')
+
+    current_year = datetime.now().year
+    year = pd.to_numeric(df['Year'], errors='coerce')
+    flag(year.isna() | (year % 1 != 0) | (year < FIRST_IMPORT_YEAR) | (year > current_year),
+         'Year', f'Year must be a whole number between {FIRST_IMPORT_YEAR} and {current_year}')
+    clean['Year'] = year
+
+    month = pd.to_numeric(df['Month'], errors='coerce')
+    flag(month.isna() | (month % 1 != 0) | (month < 1) | (month > 12),
+         'Month', 'Month must be a whole number from 1 to 12')
+    clean['Month'] = month
+
+    flag(clean.duplicated(subset=KEY_COLUMNS, keep=False) & year.notna() & month.notna(),
+         'Month', 'Duplicate district/month in file')
+
+    # Data fields (missing columns and blank cells get the same defaults as the entry form)
+    for col, field in field_columns(categories):
+        raw = df[col].astype(str).str.strip() if col in df.columns else pd.Series('', index=df.index)
+        blank = raw == ''
+
+        if field['type'] == 'number':
+            values = pd.to_numeric(raw.where(~blank, '0'), errors='coerce')
+            flag(values.isna(), col, 'Not a number')
+            flag(values < 0, col, 'Must not be negative')
+            clean[col] = values
+        elif field['type'] == 'dropdown':
+            values = raw.where(~blank, field['options'][0])
+            flag(~values.isin(field['options']), col, f"Must be one of: {', '.join(field['options'])}")
+            clean[col] = values
+        else:
+            clean[col] = raw
+
+    errors_df = (
+        pd.concat(errors, ignore_index=True).sort_values(['Row', 'Column']).reset_index(drop=True)
+        if errors else pd.DataFrame(columns=['Row', 'Column', 'Error'])
+    )
+    bad_rows = errors_df['Row'].unique() - 2
+    clean = clean.drop(index=bad_rows)
+    clean[['Year', 'Month']] = clean[['Year', 'Month']].astype(int)
+    return clean, errors_df
+
+
+def frame_to_reports(clean_df, categories=None):
+    """Validated frame to (district, month, year, data) tuples for save_monthly_data_batch"""
+    data_cols = [col for col, _ in field_columns(categories)]
+    number_cols = [col for col, field in field_columns(categories) if field['type'] == 'number']
+
+    # Whole numbers go back as int, as the entry form stores them
+    numbers = clean_df[number_cols]
+    whole = (numbers % 1 == 0).all()
+    records = clean_df[data_cols].astype(object)
+    for col in number_cols:
+        records[col] = numbers[col].astype(int) if whole[col] else numbers[col]
+
+    return [
+        (district, int(month), int(year), data)
+        for district, month, year, data in zip(
+            clean_df['District'], clean_df['Month'], clean_df['Year'],
+            records.to_dict('records')
+        )
+    ]
@@ -0,0 +1,608 @@
+# data_store.py
+import logging
+import threading
+import time
+import streamlit as st
+from datetime import datetime
+from firebase_admin import firestore, auth
+from google.cloud.firestore_v1.field_path import FieldPath
+from firebase_config import get_firestore_client, firestore_call_options, auth_settings
+from auth_tokens import AuthError, CLAIM_KEYS, sign_in_with_password, refresh_id_token, verify_id_token
+from local_store import local_store_enabled
+from resilience import resilient, RETRYABLE_ERRORS, CircuitOpenError, StaleCache
+from coalesce import coalesced, RateLimiter, RateLimitExceeded
+from write_queue import WriteQueue
+from revisions import compute_delta, reconstruct_at_revision
+from report_mirror import ReportMirror, EPOCH
+from schema_registry import get_schema_registry
+
+logger = logging.getLogger(__name__)
+
+# ==================== FIREBASE FUNCTIONS ====================
+def create_user(email, password, district, role="district_user"):
+    """Create new user in Firebase Authentication"""
+    db = get_firestore_client()
+    try:
+        user = auth.create_user(
+            email=email,
+            password=password,
+            display_name=district
+        )
+        profile = {'role': role, 'district': district, 'can_edit': True}
+        # Role and district travel in the ID token, so sign-in needs no profile read
+        auth.set_custom_user_claims(user.uid, profile)
+        
+        # Store user details in Firestore
+        user_ref = db.collection('users').document(user.uid)
+        user_ref.set(dict(profile, email=email, created_at=firestore.SERVER_TIMESTAMP, is_active=True))
+        
+        return True, f"User created successfully: {email}"
+    except Exception as e:
+        return False, f"Error creating user: {str(e)}"
+
+def update_user_permissions(user_id, role, district, is_active, can_edit):
+    """Update a user's profile and token claims; inactive accounts are disabled in Firebase Auth"""
+    db = get_firestore_client()
+    try:
+        db.collection('users').document(user_id).update({'is_active': is_active, 'can_edit': can_edit},
+                                                         **firestore_call_options())
+        if not local_store_enabled():
+            # Takes effect when the user's ID token is next refreshed (within the hour)
+            auth.set_custom_user_claims(user_id, {'role': role, 'district': district, 'can_edit': can_edit})
+            auth.update_user(user_id, disabled=not is_active)
+        return True, "User permissions updated!"
+    except Exception as e:
+        return False, f"Error updating user {user_id}: {str(e)}"
+
+def _profile_claims(user_id):
+    """Claims for accounts created before custom claims were set: read the profile once and stamp them"""
+    profile = get_firestore_client().collection('users').document(user_id).get(**firestore_call_options()).to_dict()
+    if not profile:
+        raise AuthError("No user profile for this account")
+    claims = {key: profile.get(key) for key in CLAIM_KEYS}
+    try:
+        auth.set_custom_user_claims(user_id, claims)
+    except Exception as e:
+        logger.warning("Could not set custom claims for %s: %s", user_id, e)
+    return claims
+
+def _start_session(claims):
+    if claims.get('role') is None:
+        claims = dict(claims, **_profile_claims(claims['sub']))
+    st.session_state.authenticated = True
+    st.session_state.user_id = claims['sub']
+    st.session_state.user_role = claims.get('role') or 'district_user'
+    st.session_state.user_district = claims.get('district') or 'Unknown'
+
+def _authenticate_local(email):
+    """Local stand-in store only (development and load tests): sign in by email without a password check"""
+    query = get_firestore_client().collection('users').where('email', '==', email).limit(1).get()
+    if not query:
+        st.error("Invalid email or password")
+        return False
+    _start_session(dict(query[0].to_dict(), sub=query[0].id))
+    return True
+
+def authenticate_user(email, password):
+    """Sign in with Firebase Auth and start the session from the verified ID token's claims (shows the error if not)"""
+    if local_store_enabled():
+        return _authenticate_local(email)
+    api_key, project_id = auth_settings()
+    if not api_key or not project_id:
+        st.error("Sign-in is not configured: add api_key under [firebase_auth] in secrets")
+        return False
+    try:
+        id_token, refresh_token = sign_in_with_password(api_key, email, password)
+        _start_session(verify_id_token(id_token, project_id))
+    except AuthError as e:
+        st.error(str(e))
+        return False
+    except Exception as e:
+        st.error(f"Sign-in failed: {e}")
+        return False
+    st.session_state.id_token = id_token
+    st.session_state.refresh_token = refresh_token
+    return True
+
+def sign_out():
+    for key in ('id_token', 'refresh_token'):
+        st.session_state.pop(key, None)
+    st.session_state.authenticated = False
+
+def validate_session():
+    """Check the session's ID token on every rerun (a cache hit until it expires, then one refresh).
+
+    Returns False, after logging the session out, when the token can no longer be renewed.
+    """
+    id_token = st.session_state.get('id_token')
+    if not id_token:
+        # Demo and local-store sessions carry no token
+        return True
+    api_key, project_id = auth_settings()
+    try:
+        verify_id_token(id_token, project_id)
+        return True
+    except AuthError:
+        pass
+    try:
+        id_token, refresh_token = refresh_id_token(api_key, st.session_state.get('refresh_token'))
+        # Picks up role/district changes made since the last token
+        _start_session(verify_id_token(id_token, project_id))
+    except Exception as e:
+        logger.info("Session token could not be renewed: %s", e)
+        sign_out()
+        return False
+    st.session_state.id_token = id_token
+    st.session_state.refresh_token = refresh_token
+    return True
+
+def report_doc_id(district, year, month):
+    """Firestore document ID of a district's monthly report"""
+    return f"{district}_{year}_{month:02d}"
+
+def build_report_document(district, month, year, data, status="draft"):
+    """Report document exactly as save_monthly_data writes it"""
+    monthly_data = {
+        'district': district,
+        'month': month,
+        'year': year,
+        'data': data,
+        'schema_version': get_schema_registry().active.version,
+        'status': status,
+        'submitted_by': st.session_state.get('user_id'),
+        'submitted_at': firestore.SERVER_TIMESTAMP,
+        'last_modified': firestore.SERVER_TIMESTAMP
+    }
+    
+    # Add approval fields if submitted
+    if status == "submitted":
+        monthly_data['submission_date'] = firestore.SERVER_TIMESTAMP
+    
+    return monthly_data
+
+# ==================== REVISION HISTORY ====================
+def _revision_records(current, updated, action, changed_by):
+    """New revision number and the delta records to store for a write (none if nothing changed)"""
+    records = []
+    revision = (current or {}).get('revision', 0)
+    if current and 'revision' not in current:
+        # Report written before history was kept: record its existing state once as a baseline
+        records.append({'action': 'baseline', 'changed_by': current.get('submitted_by'),
+                        'changes': compute_delta(None, current)})
+    changes = compute_delta(current, updated)
+    if changes:
+        records.append({'action': action, 'changed_by': changed_by, 'changes': changes})
+    for record in records:
+        revision += 1
+        record.update(revision=revision, status=updated.get('status'), changed_at=firestore.SERVER_TIMESTAMP)
+    return revision, records
+
+def _stage_revisions(batch, ref, records):
+    for record in records:
+        batch.set(ref.collection('revisions').document(f"{record['revision']:06d}"), record)
+
+def _stage_report_write(batch, ref, current, monthly_data, action="save"):
+    """Add a report write and its revision records to a batch or transaction"""
+    revision, records = _revision_records(current, monthly_data, action, monthly_data.get('submitted_by'))
+    batch.set(ref, dict(monthly_data, revision=revision))
+    _stage_revisions(batch, ref, records)
+
+def _run_transaction(db, fn, *args):
+    """fn(transaction, *args) in a Firestore transaction, retried on contention.
+
+    Revision numbers and deltas come from reads inside the transaction, so concurrent writers
+    (the write queue flusher and an admin approval) never reuse a revision or diff a stale report.
+    """
+    return firestore.transactional(fn)(db.transaction(), *args)
+
+def _write_report_in_transaction(transaction, ref, monthly_data):
+    current = ref.get(transaction=transaction, **firestore_call_options(retry=False))
+    _stage_report_write(transaction, ref, current.to_dict() if current.exists else None, monthly_data)
+
+@resilient("save_monthly_data", serve_stale=False)
+def _write_report(doc_id, monthly_data):
+    db = get_firestore_client()
+    _run_transaction(db, _write_report_in_transaction, db.collection('monthly_reports').document(doc_id), monthly_data)
+    _report_cache.discard(doc_id)
+
+@resilient("get_report_revisions")
+def _fetch_report_revisions(doc_id):
+    revisions_ref = get_firestore_client().collection('monthly_reports').document(doc_id).collection('revisions')
+    return [doc.to_dict() for doc in revisions_ref.order_by('revision').get(**firestore_call_options(retry=False))]
+
+def get_report_revisions(doc_id):
+    """Revision records of a report, oldest first"""
+    if get_firestore_client() is None:
+        return []
+    try:
+        return _fetch_report_revisions(doc_id)
+    except Exception as e:
+        st.error(f"Error fetching history: {e}")
+        return []
+
+def reconstruct_report(doc_id, revision, revisions=None):
+    """Report fields and data as they were after a given revision"""
+    if revisions is None:
+        revisions = get_report_revisions(doc_id)
+    return reconstruct_at_revision(revisions, revision)
+
+# ==================== OFFLINE WRITE QUEUE ====================
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+def _is_retryable(error):
+    return isinstance(error, RETRYABLE_ERRORS + (CircuitOpenError,))
+
+def get_write_queue():
+    """Process-wide local write queue, with its background sync thread"""
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None:
+            _write_queue = WriteQueue()
+            _write_queue.start_flusher(_write_report, _is_retryable)
+        return _write_queue
+
+def pending_sync_count(district=None):
+    """Writes saved locally but not yet in Firestore, including ones the cloud rejected"""
+    if _write_queue is None:
+        return 0
+    return _write_queue.pending_count(district) + _write_queue.failed_count(district)
+
+def failed_sync_writes(district=None):
+    """Queued writes Firestore kept rejecting, as dicts for the pending-sync banner"""
+    if _write_queue is None:
+        return []
+    columns = ['seq', 'doc_id', 'district', 'failed_at', 'attempts', 'last_error']
+    return [dict(zip(columns, row)) for row in _write_queue.failed_summary(district)]
+
+def resubmit_failed_write(seq):
+    """Queue a rejected write again"""
+    if get_write_queue().resubmit_failed(seq):
+        return True, "Entry queued to sync again"
+    return False, "Entry is no longer waiting"
+
+def discard_failed_write(seq):
+    """Drop a rejected write for good"""
+    if get_write_queue().discard_failed(seq):
+        return True, "Entry discarded"
+    return False, "Entry is no longer waiting"
+
+def sync_pending_writes():
+    """Replay queued writes now; returns how many reached Firestore"""
+    return get_write_queue().flush(_write_report, _is_retryable)
+
+def _overlay_pending(reports, district=None, year=None, month=None):
+    """Reports with this process's not-yet-synced writes applied on top"""
+    if _write_queue is None:
+        return reports
+    pending = _write_queue.pending_documents(district)
+    if not pending:
+        return reports
+    merged = {report_doc_id(r['district'], r['year'], r['month']): r for r in reports}
+    for doc_id, doc in pending.items():
+        if (year and doc.get('year') != year) or (month and doc.get('month') != month):
+            continue
+        merged[doc_id] = dict(doc, pending_sync=True)
+    return sorted(merged.values(), key=lambda r: (r['district'], r['year'], r['month']))
+
+def save_monthly_data(district, month, year, data, status="draft"):
+    """Save monthly data (queued on local disk, synced to Firestore in the background)"""
+    db = get_firestore_client()
+    if db is None:
+        return False, "Firestore not connected (db is None)"
+    try:
+        doc_id = report_doc_id(district, year, month)
+        monthly_data = build_report_document(district, month, year, data, status)
+        
+        get_write_queue().enqueue(doc_id, monthly_data)
+        return True, "Data saved successfully"
+    except Exception as e:
+        return False, f"Error saving data: {str(e)}"
+
+# Firestore accepts at most 500 writes per batch
+BATCH_WRITE_LIMIT = 500
+
+def _import_chunk_in_transaction(transaction, db, refs, chunk, status):
+    snapshots = db.get_all(refs, transaction=transaction, **firestore_call_options())
+    current = {snap.id: snap.to_dict() for snap in snapshots if snap.exists}
+    for ref, (district, month, year, data) in zip(refs, chunk):
+        _stage_report_write(
+            transaction, ref, current.get(ref.id),
+            build_report_document(district, month, year, data, status), action="import"
+        )
+
+def save_monthly_data_batch(reports, status="draft"):
+    """Save many (district, month, year, data) reports with batched writes"""
+    db = get_firestore_client()
+    if db is None:
+        return False, "Firestore not connected (db is None)"
+    saved = 0
+    try:
+        reports_ref = db.collection('monthly_reports')
+        # Each report is up to three writes: the document, a baseline and its revision record
+        chunk_size = BATCH_WRITE_LIMIT // 3
+        for start in range(0, len(reports), chunk_size):
+            chunk = reports[start:start + chunk_size]
+            refs = [reports_ref.document(report_doc_id(district, year, month)) for district, month, year, _ in chunk]
+            _run_transaction(db, _import_chunk_in_transaction, db, refs, chunk, status)
+            for ref in refs:
+                _report_cache.discard(ref.id)
+            saved += len(chunk)
+        _mark_mirror_dirty()
+        return True, f"{saved} reports saved successfully"
+    except Exception as e:
+        return False, f"Error saving data after {saved} reports: {str(e)}"
+
+def get_existing_report_ids(doc_ids):
+    """Subset of doc_ids that already exist, read in one batched get_all"""
+    db = get_firestore_client()
+    if db is None or not doc_ids:
+        return set()
+    reports_ref = db.collection('monthly_reports')
+    snapshots = db.get_all([reports_ref.document(doc_id) for doc_id in doc_ids], **firestore_call_options())
+    return {snap.id for snap in snapshots if snap.exists}
+
+def _warn_stale(saved_at):
+    st.warning(
+        f"⚠️ Cloud service is slow or unavailable. Showing data as of "
+        f"{datetime.fromtimestamp(saved_at).strftime('%H:%M:%S')}."
+    )
+
+@resilient("get_district_data", on_stale=_warn_stale)
+def _fetch_district_data(district, month, year):
+    reports_ref = get_firestore_client().collection('monthly_reports')
+    
+    if month and year:
+        # Get specific month
+        doc_id = report_doc_id(district, year, month)
+        doc = reports_ref.document(doc_id).get(**firestore_call_options(retry=False))
+        if doc.exists:
+            return [doc.to_dict()]
+        return []
+    else:
+        # Get all data for district
+        query = reports_ref.where('district', '==', district).order_by('year').order_by('month')
+        docs = query.get(**firestore_call_options(retry=False))
+        return [doc.to_dict() for doc in docs]
+
+def get_district_data(district, month=None, year=None):
+    """Get monthly data for a district"""
+    try:
+        reports = _fetch_district_data(district, month, year)
+    except Exception as e:
+        st.error(f"Error fetching data: {e}")
+        reports = []
+    reports = _overlay_pending(reports, district, year if month else None, month if year else None)
+    return _share_reports(get_schema_registry().normalize_reports(reports))
+
+# Admin sessions opening the dashboard together share one query instead of each running it
+@coalesced("get_all_districts_data")
+@resilient("get_all_districts_data", on_stale=_warn_stale)
+def _fetch_all_districts_data(year, month):
+    reports_ref = get_firestore_client().collection('monthly_reports')
+    
+    if year and month:
+        query = reports_ref.where('year', '==', year).where('month', '==', month)
+    elif year:
+        query = reports_ref.where('year', '==', year)
+    else:
+        query = reports_ref
+    
+    docs = query.get(**firestore_call_options(retry=False))
+    return [doc.to_dict() for doc in docs]
+
+def get_all_districts_data(year=None, month=None):
+    """Get data for all districts (State Admin only)"""
+    try:
+        reports = _fetch_all_districts_data(year, month)
+    except Exception as e:
+        st.error(f"Error fetching data: {e}")
+        reports = []
+    reports = _overlay_pending(reports, year=year, month=month if year else None)
+    return _share_reports(get_schema_registry().normalize_reports(reports))
+
+# Full reloads (first load or an explicit refresh) allowed per admin per minute
+FULL_LOAD_LIMITER = RateLimiter(limit=5, window=60)
+
+def load_all_reports_for_user(user_id, force=False):
+    """Every report from the shared incremental mirror.
+
+    Ordinary reruns only pull changes, at most once per mirror min_interval; the per-user limit
+    applies to full reloads, i.e. an explicit refresh (force) or a mirror not loaded yet.
+    """
+    mirror = get_report_mirror()
+    full_load = force or mirror.watermark is None
+    try:
+        if full_load:
+            FULL_LOAD_LIMITER.check(user_id, "get_all_districts_data")
+    except RateLimitExceeded as e:
+        if mirror.watermark is None:
+            st.warning(f"⏳ {e}")
+            return []
+        st.caption(f"Showing data loaded earlier; refresh again in {e.retry_after:.0f} s")
+        force = False
+    try:
+        mirror.refresh(force=force)
+    except Exception as e:
+        st.error(f"Error fetching data: {e}")
+    return _share_reports(get_schema_registry().normalize_reports(_overlay_pending(mirror.snapshot())))
+
+# ==================== SHARED REPORT CACHE ====================
+# Reports read by any session, so sessions can keep just the doc ID of the report they have open
+REPORT_CACHE_TTL = 300
+_report_cache = StaleCache(max_entries=4096)
+
+@resilient("get_report")
+def _fetch_report(doc_id):
+    doc = get_firestore_client().collection('monthly_reports').document(doc_id).get(**firestore_call_options(retry=False))
+    return doc.to_dict() if doc.exists else None
+
+def _share_reports(reports):
+    """Put freshly read reports in the shared cache (queued local writes are looked up separately)"""
+    for report in reports:
+        if not report.get('pending_sync'):
+            _report_cache.put(report_doc_id(report['district'], report['year'], report['month']), report)
+    return reports
+
+def get_report(doc_id):
+    """One report by ID: a queued local write, else the shared cache, else Firestore"""
+    if _write_queue is not None:
+        district = doc_id.rsplit('_', 2)[0]
+        pending = _write_queue.pending_documents(district).get(doc_id)
+        if pending is not None:
+            return get_schema_registry().normalize_report(dict(pending, pending_sync=True))
+    
+    cached = _report_cache.get(doc_id)
+    if cached is not None and time.time() - cached[0] < REPORT_CACHE_TTL:
+        return cached[1]
+    if get_firestore_client() is None:
+        return None
+    try:
+        report = _fetch_report(doc_id)
+    except Exception as e:
+        st.error(f"Error fetching data: {e}")
+        return None
+    if report is None:
+        return None
+    return _share_reports([get_schema_registry().normalize_report(report)])[0]
+
+def get_reports_by_ids(doc_ids):
+    """{doc_id: report} for the IDs that exist, from the shared cache plus one batched get_all for the rest"""
+    found = {}
+    missing = []
+    for doc_id in dict.fromkeys(doc_ids):
+        cached = _report_cache.get(doc_id)
+        if cached is not None and time.time() - cached[0] < REPORT_CACHE_TTL:
+            found[doc_id] = cached[1]
+        else:
+            missing.append(doc_id)
+    
+    db = get_firestore_client()
+    if missing and db is not None:
+        try:
+            reports_ref = db.collection('monthly_reports')
+            snapshots = db.get_all([reports_ref.document(doc_id) for doc_id in missing], **firestore_call_options())
+            reports = [get_schema_registry().normalize_report(snap.to_dict()) for snap in snapshots if snap.exists]
+            for report in _share_reports(reports):
+                found[report_doc_id(report['district'], report['year'], report['month'])] = report
+        except Exception as e:
+            st.error(f"Error fetching data: {e}")
+    return found
+
+def report_cache_size():
+    return len(_report_cache)
+
+# Fields needed to show submission status, without the report payload
+STATUS_SUMMARY_FIELDS = ['district', 'year', 'month', 'status', 'submission_date', 'last_modified']
+
+def get_report_status_summary(year):
+    """Status-only projection of every report in a year"""
+    db = get_firestore_client()
+    try:
+        query = db.collection('monthly_reports').where('year', '==', year).select(STATUS_SUMMARY_FIELDS)
+        return [doc.to_dict() for doc in query.get(**firestore_call_options())]
+    except Exception as e:
+        st.error(f"Error fetching data: {e}")
+        return []
+
+def iter_all_reports(page_size=500, district=None, year_from=None, year_to=None):
+    """Yield every report page by page (cursor pagination, one page in memory at a time)"""
+    db = get_firestore_client()
+    if db is None:
+        return
+    query = db.collection('monthly_reports')
+    
+    if district:
+        # With a year range this needs the (district, year) composite index in firestore.indexes.json
+        query = query.where('district', '==', district)
+    if year_from or year_to:
+        # A range filter must also be the first ordering
+        if year_from:
+            query = query.where('year', '>=', year_from)
+        if year_to:
+            query = query.where('year', '<=', year_to)
+        query = query.order_by('year')
+    query = query.order_by(FieldPath.document_id()).limit(page_size)
+    
+    last_doc = None
+    while True:
+        page = (query.start_after(last_doc) if last_doc else query).get(**firestore_call_options())
+        for doc in page:
+            yield doc.id, doc.to_dict()
+        if len(page) < page_size:
+            break
+        last_doc = page[-1]
+
+# ==================== INCREMENTAL SYNC ====================
+_report_mirror = None
+_report_mirror_lock = threading.Lock()
+
+@resilient("get_reports_changed_since", serve_stale=False)
+def _fetch_page(query):
+    return query.get(**firestore_call_options(retry=False))
+
+def get_reports_changed_since(since=None, district=None, page_size=500):
+    """(doc_id, report) for every report whose last_modified is after `since`, oldest change first"""
+    db = get_firestore_client()
+    if db is None:
+        return []
+    query = db.collection('monthly_reports')
+    if district:
+        # Needs the (district, last_modified) composite index in firestore.indexes.json
+        query = query.where('district', '==', district)
+    query = (query.where('last_modified', '>', since or EPOCH)
+             .order_by('last_modified').order_by(FieldPath.document_id()).limit(page_size))
+    
+    changes = []
+    last_doc = None
+    while True:
+        page = _fetch_page(query.start_after(last_doc) if last_doc else query)
+        changes.extend((doc.id, doc.to_dict()) for doc in page)
+        if len(page) < page_size:
+            return changes
+        last_doc = page[-1]
+
+def get_report_mirror():
+    """Process-wide mirror of the report collection, refreshed from last_modified deltas"""
+    global _report_mirror
+    with _report_mirror_lock:
+        if _report_mirror is None:
+            _report_mirror = ReportMirror(get_reports_changed_since)
+        return _report_mirror
+
+def _mark_mirror_dirty():
+    if _report_mirror is not None:
+        _report_mirror.mark_dirty()
+
+def _update_report_in_transaction(transaction, ref, update_data):
+    current = ref.get(transaction=transaction, **firestore_call_options(retry=False)).to_dict() or {}
+    revision, records = _revision_records(
+        current, dict(current, **update_data), "status", update_data.get('reviewed_by')
+    )
+    transaction.update(ref, dict(update_data, revision=revision))
+    _stage_revisions(transaction, ref, records)
+
+@resilient("update_data_status", serve_stale=False)
+def _update_report(doc_id, update_data):
+    db = get_firestore_client()
+    _run_transaction(db, _update_report_in_transaction, db.collection('monthly_reports').document(doc_id), update_data)
+
+def update_data_status(doc_id, status, remarks=""):
+    """Update approval status of monthly data"""
+    try:
+        update_data = {
+            'status': status,
+            'reviewed_at': firestore.SERVER_TIMESTAMP,
+            'reviewed_by': st.session_state.user_id,
+            'last_modified': firestore.SERVER_TIMESTAMP
+        }
+        
+        if remarks:
+            update_data['review_remarks'] = remarks
+        
+        _update_report(doc_id, update_data)
+        _report_cache.discard(doc_id)
+        _mark_mirror_dirty()
+        return True, f"Status updated to {status}"
+    except Exception as e:
+        return False, f"Error updating status: {str(e)}"
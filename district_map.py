@@ -0,0 +1,150 @@
+# district_map.py
+import json
+import logging
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Bundled boundaries; each feature carries the district name in NAME_PROPERTY
+BOUNDARIES_PATH = os.path.join(BASE_DIR, "geo", "districts.geojson")
+NAME_PROPERTY = "district"
+# Simplified copy served by Streamlit's static file serving, so browsers fetch the geometry once
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+STATIC_FILE = "district_map.geojson"
+STATIC_URL = f"app/static/{STATIC_FILE}"
+# Douglas-Peucker tolerance in degrees (~500 m) and coordinate precision (~10 m)
+SIMPLIFY_TOLERANCE = 0.005
+COORDINATE_DECIMALS = 4
+
+
+def simplify_line(points, tolerance):
+    """Douglas-Peucker simplification of an (n, 2) array, keeping both end points"""
+    if len(points) < 3:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        farthest = int(distances.argmax())
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack += [(start, split), (split, end)]
+    return points[keep]
+
+
+def simplify_ring(ring, tolerance):
+    """Simplified closed ring; never fewer than 4 positions"""
+    points = np.asarray(ring, dtype=float)
+    simplified = simplify_line(points, tolerance)
+    if len(simplified) < 4:
+        return points.round(COORDINATE_DECIMALS).tolist()
+    return simplified.round(COORDINATE_DECIMALS).tolist()
+
+
+def simplify_geometry(geometry, tolerance):
+    if geometry['type'] == 'Polygon':
+        rings = [[simplify_ring(ring, tolerance) for ring in geometry['coordinates']]]
+    elif geometry['type'] == 'MultiPolygon':
+        rings = [[simplify_ring(ring, tolerance) for ring in polygon] for polygon in geometry['coordinates']]
+    else:
+        return geometry
+    return {'type': geometry['type'], 'coordinates': rings[0] if geometry['type'] == 'Polygon' else rings}
+
+
+def _count_positions(geometry):
+    coordinates = geometry['coordinates']
+    if geometry['type'] == 'Polygon':
+        coordinates = [coordinates]
+    return sum(len(ring) for polygon in coordinates for ring in polygon)
+
+
+def discrete_colorscale(colors):
+    """Colorscale giving each integer code 0..len(colors)-1 its own colour (use zmin=-0.5, zmax=len-0.5)"""
+    steps = len(colors)
+    scale = []
+    for code, color in enumerate(colors):
+        scale += [[code / steps, color], [(code + 1) / steps, color]]
+    return scale
+
+
+class DistrictMap:
+    """Simplified district boundaries and choropleth figures that reference them"""
+
+    def __init__(self, geojson, source, positions_before, positions_after):
+        self.geojson = geojson
+        # What figures carry as their geojson: the static file URL, or the geometry itself
+        self.source = source
+        self.districts = [feature['id'] for feature in geojson['features']]
+        self.positions_before = positions_before
+        self.positions_after = positions_after
+
+    def figure(self, values, title, colorscale="Blues", zmin=None, zmax=None, colorbar=None, hover=None):
+        """Choropleth of values (a Series indexed by district); districts without a value stay grey"""
+        values = values.reindex(self.districts)
+        fig = go.Figure(go.Choropleth(
+            geojson=self.source,
+            featureidkey="id",
+            locations=self.districts,
+            z=values.to_numpy(dtype=float),
+            text=hover if hover is not None else values.index,
+            colorscale=colorscale,
+            zmin=zmin,
+            zmax=zmax,
+            colorbar=colorbar or {},
+            marker_line_color="white",
+            marker_line_width=0.8,
+            hovertemplate="%{location}<br>%{text}<extra></extra>" if hover is not None else None,
+        ))
+        fig.update_geos(fitbounds="locations", visible=False)
+        fig.update_layout(title=title, margin={"l": 0, "r": 0, "t": 40, "b": 0}, height=520)
+        return fig
+
+
+def build_district_map(path=BOUNDARIES_PATH, tolerance=SIMPLIFY_TOLERANCE, publish=False):
+    """Load and simplify the boundaries; with publish=True also write them for static serving"""
+    with open(path, encoding='utf-8') as handle:
+        raw = json.load(handle)
+    features = []
+    before = after = 0
+    for feature in raw['features']:
+        geometry = simplify_geometry(feature['geometry'], tolerance)
+        before += _count_positions(feature['geometry'])
+        after += _count_positions(geometry)
+        features.append({'type': 'Feature', 'id': feature['properties'][NAME_PROPERTY],
+                         'properties': {}, 'geometry': geometry})
+    geojson = {'type': 'FeatureCollection', 'features': features}
+
+    source = geojson
+    if publish:
+        try:
+            os.makedirs(STATIC_DIR, exist_ok=True)
+            with open(os.path.join(STATIC_DIR, STATIC_FILE), 'w', encoding='utf-8') as handle:
+                json.dump(geojson, handle, separators=(',', ':'))
+            source = STATIC_URL
+        except OSError as e:
+            logger.warning("Could not publish district map for static serving, embedding it instead: %s", e)
+    return DistrictMap(geojson, source, before, after)
+
+
+@st.cache_resource(show_spinner=False)
+def get_district_map():
+    """Boundaries simplified once per server process; served as a static file when static serving is on"""
+    if not os.path.exists(BOUNDARIES_PATH):
+        return None
+    return build_district_map(publish=bool(st.get_option("server.enableStaticServing")))
@@ -1,40 +1,152 @@
 # firebase_config.py
+import logging
+import threading
+import time
 import firebase_admin
 from firebase_admin import credentials, firestore, auth
+from google.api_core.retry import Retry, if_transient_error
 import streamlit as st
-import json
 
-def initialize_firebase():
-    """Initialize Firebase with graceful fallback for demo mode"""
+from local_store import get_local_store, local_store_enabled
+
+logger = logging.getLogger(__name__)
+
+# Defaults for every Firestore call, overridable under [firestore_options] in secrets
+DEFAULT_OPTIONS = {
+    "timeout": 20.0,           # seconds per RPC attempt
+    "retry_initial": 0.5,      # first backoff delay
+    "retry_maximum": 8.0,      # longest backoff delay
+    "retry_multiplier": 2.0,
+    "retry_deadline": 30.0,    # give up retrying after this many seconds
+    "health_check_interval": 60.0,
+}
+
+
+class FirebaseResources:
+    """Firebase app, Firestore client and connection health, shared by every session in the process"""
+
+    def __init__(self, db=None, error=None, demo_reason=None, options=None):
+        self.db = db
+        self.auth = auth if db is not None else None
+        self.error = error
+        self.demo_reason = demo_reason
+        self.options = options or dict(DEFAULT_OPTIONS)
+        self.retry = Retry(
+            predicate=if_transient_error,
+            initial=self.options["retry_initial"],
+            maximum=self.options["retry_maximum"],
+            multiplier=self.options["retry_multiplier"],
+            timeout=self.options["retry_deadline"],
+        )
+        self.healthy = None
+        self.last_check = 0.0
+        self.last_latency = None
+        self._lock = threading.Lock()
+
+    def call_options(self, retry=True):
+        """retry/timeout keyword arguments for Firestore calls"""
+        return {"retry": self.retry if retry else None, "timeout": self.options["timeout"]}
+
+    def check_health(self, force=False):
+        """Cheap one-document read; result reused for health_check_interval seconds"""
+        if self.db is None:
+            return False
+        with self._lock:
+            if not force and time.time() - self.last_check < self.options["health_check_interval"]:
+                return self.healthy
+            started = time.perf_counter()
+            try:
+                self.db.collection('monthly_reports').limit(1).get(timeout=min(5.0, self.options["timeout"]))
+                self.healthy = True
+                self.last_latency = time.perf_counter() - started
+            except Exception as e:
+                logger.warning("Firestore health check failed: %s", e)
+                self.healthy = False
+                self.last_latency = None
+            self.last_check = time.time()
+            return self.healthy
+
+
+def _load_options():
+    options = dict(DEFAULT_OPTIONS)
+    try:
+        options.update({k: float(v) for k, v in dict(st.secrets.get("firestore_options", {})).items()})
+    except Exception:
+        pass
+    return options
+
+
+@st.cache_resource(show_spinner=False)
+def get_firebase_resources():
+    """Create the Firebase app and Firestore client once per server process"""
+    options = _load_options()
+    if local_store_enabled():
+        return FirebaseResources(db=get_local_store(), options=options)
     if not firebase_admin._apps:
         try:
             # Check if Firebase secrets exist
             if "firebase" not in st.secrets:
-                st.warning("⚠️ Firebase credentials not found. Running in DEMO MODE.")
-                st.info("To enable cloud features, add Firebase credentials in Streamlit Cloud secrets.")
-                return None, None
-            
+                return FirebaseResources(demo_reason="Firebase credentials not found", options=options)
+
             # Get Firebase credentials from Streamlit secrets
             firebase_dict = dict(st.secrets["firebase"])
-            
-            # Initialize Firebase
             cred = credentials.Certificate(firebase_dict)
             firebase_admin.initialize_app(cred)
-            
-            st.success("✅ Cloud Connected")
-            return firestore.client(), auth
-            
         except Exception as e:
-            st.error(f"❌ Firebase Initialization Failed: {str(e)[:100]}...")
-            st.info("Running in DEMO MODE. Data will not be saved to cloud.")
-            return None, None
-    
-    # Already initialized
-    return firestore.client(), auth
+            logger.exception("Firebase initialization failed")
+            return FirebaseResources(error=str(e), options=options)
+
+    resources = FirebaseResources(db=firestore.client(), options=options)
+
+    # Open the gRPC channel in the background so the first data request finds it ready
+    threading.Thread(target=resources.check_health, kwargs={"force": True},
+                     name="firestore-warmup", daemon=True).start()
+    return resources
+
+
+def initialize_firebase():
+    """Initialize Firebase with graceful fallback for demo mode"""
+    resources = get_firebase_resources()
+    return resources.db, resources.auth
+
 
 def get_firestore_client():
     """Get Firestore client or return None for demo mode"""
     try:
-        return firestore.client()
-    except:
-        return None
\ No newline at end of file
+        return get_firebase_resources().db
+    except Exception as e:
+        logger.warning("Firestore client unavailable: %s", e)
+        return None
+
+
+def firestore_call_options(retry=True):
+    """retry/timeout keyword arguments for Firestore calls (retry=False when the caller retries itself)"""
+    return get_firebase_resources().call_options(retry)
+
+
+def auth_settings():
+    """(web API key, project ID) used for Firebase Auth sign-in; None for whatever is not configured"""
+    try:
+        return (dict(st.secrets.get("firebase_auth", {})).get("api_key"),
+                dict(st.secrets.get("firebase", {})).get("project_id"))
+    except Exception:
+        return None, None
+
+
+def show_connection_status():
+    """Connection banner for the sidebar"""
+    resources = get_firebase_resources()
+    if resources.db is not None:
+        healthy = resources.check_health()
+        if healthy is False:
+            st.sidebar.error("❌ Cloud unreachable")
+        elif resources.last_latency is not None:
+            st.sidebar.success(f"✅ Cloud Connected ({resources.last_latency * 1000:.0f} ms)")
+        else:
+            st.sidebar.success("✅ Cloud Connected")
+    elif resources.error:
+        st.sidebar.error(f"❌ Firebase Initialization Failed: {resources.error[:100]}...")
+        st.sidebar.info("Running in DEMO MODE. Data will not be saved to cloud.")
+    else:
+        st.sidebar.warning(f"⚠️ {resources.demo_reason}. Running in DEMO MODE.")
+        st.sidebar.info("To enable cloud features, add Firebase credentials in Streamlit Cloud secrets.")
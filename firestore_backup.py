@@ -0,0 +1,244 @@
+# firestore_backup.py
+"""Backup and restore of Firestore collections as gzipped NDJSON partitions with a SHA-256 manifest.
+
+Reports are read in parallel over document ID ranges. Report IDs are "{district}_{year}_{month}",
+so splitting the ID space at every known "{district}_{year}" gives one partition per district and
+year, while the open-ended first and last ranges still pick up any other document. Revision history
+subcollections are not included. A backup directory without manifest.json is incomplete.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from firebase_config import firestore_call_options
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COLLECTIONS = ('monthly_reports', 'users')
+# Collection split by district and year; the others are read as one partition each
+PARTITIONED_COLLECTION = 'monthly_reports'
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+PAGE_SIZE = 500
+# Firestore accepts at most 500 writes per batch
+BATCH_SIZE = 400
+# Firestore's advice for new write traffic: start at 500 writes/s and ramp up gradually
+DEFAULT_WRITE_RATE = 500
+TIMESTAMP_KEY = "__timestamp__"
+
+
+class BackupError(Exception):
+    """Backup is incomplete, corrupted or does not match its manifest"""
+
+
+def _encode(value):
+    """JSON-safe copy of a document; timestamps are tagged so restores write them back as timestamps"""
+    if isinstance(value, datetime):
+        return {TIMESTAMP_KEY: value.isoformat()}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if len(value) == 1 and TIMESTAMP_KEY in value:
+            return datetime.fromisoformat(value[TIMESTAMP_KEY])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def report_partitions(districts, years):
+    """[start, end) document ID ranges covering every possible ID, split at each district and year"""
+    bounds = sorted({f"{district}_{year}" for district in districts for year in years})
+    edges = [None] + bounds + [None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _read_range(collection, start, end, page_size=PAGE_SIZE):
+    """Documents with start <= ID < end (None = unbounded), one page at a time"""
+    query = collection.order_by(FieldPath.document_id())
+    if start is not None:
+        query = query.start_at({FieldPath.document_id(): start})
+    if end is not None:
+        query = query.end_before({FieldPath.document_id(): end})
+    query = query.limit(page_size)
+
+    last_doc = None
+    while True:
+        page = (query.start_after(last_doc) if last_doc else query).get(**firestore_call_options())
+        yield from page
+        if len(page) < page_size:
+            return
+        last_doc = page[-1]
+
+
+def _write_partition(db, directory, collection, start, end, index):
+    filename = f"{collection}/part-{index:04d}.ndjson.gz"
+    path = os.path.join(directory, filename)
+    count = 0
+    with gzip.open(path + ".part", 'wt', encoding='utf-8') as out:
+        for doc in _read_range(db.collection(collection), start, end):
+            out.write(json.dumps({'id': doc.id, 'data': _encode(doc.to_dict())},
+                                 ensure_ascii=False, separators=(',', ':')) + "\n")
+            count += 1
+    os.replace(path + ".part", path)
+    return {'file': filename, 'start': start, 'end': end, 'documents': count,
+            'bytes': os.path.getsize(path), 'sha256': file_sha256(path)}
+
+
+def backup(db, out_dir, collections=DEFAULT_COLLECTIONS, districts=(), years=(), workers=8):
+    """Snapshot the collections into a new timestamped directory under out_dir; returns (directory, manifest)"""
+    created = datetime.now(timezone.utc)
+    directory = os.path.join(out_dir, f"gwd_backup_{created:%Y%m%dT%H%M%SZ}")
+    jobs = []
+    for collection in collections:
+        os.makedirs(os.path.join(directory, collection), exist_ok=True)
+        ranges = report_partitions(districts, years) if collection == PARTITIONED_COLLECTION else [(None, None)]
+        jobs += [(collection, start, end, index) for index, (start, end) in enumerate(ranges)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="backup") as executor:
+        parts = list(executor.map(lambda job: _write_partition(db, directory, *job), jobs))
+
+    manifest = {'format': FORMAT_VERSION, 'created_at': created.isoformat(), 'collections': {}}
+    for (collection, *_), part in zip(jobs, parts):
+        manifest['collections'].setdefault(collection, []).append(part)
+    # Written last: its presence marks the backup as complete
+    path = os.path.join(directory, MANIFEST_FILE)
+    with open(path + ".part", 'w', encoding='utf-8') as handle:
+        json.dump(manifest, handle, indent=1)
+    os.replace(path + ".part", path)
+    logger.info("%d documents in %d partitions backed up to %s in %.1f s",
+                sum(part['documents'] for part in parts), len(parts), directory, time.perf_counter() - started)
+    return directory, manifest
+
+
+def load_manifest(directory):
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        raise BackupError(f"No {MANIFEST_FILE} in {directory}: the backup is incomplete")
+    with open(path, encoding='utf-8') as handle:
+        manifest = json.load(handle)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise BackupError(f"Unsupported backup format {manifest.get('format')}")
+    return manifest
+
+
+def verify(directory, manifest=None, collections=None):
+    """Problems found comparing the partition files with the manifest checksums (empty if intact)"""
+    manifest = manifest or load_manifest(directory)
+    problems = []
+    for collection, parts in manifest['collections'].items():
+        if collections and collection not in collections:
+            continue
+        for part in parts:
+            path = os.path.join(directory, part['file'])
+            if not os.path.exists(path):
+                problems.append(f"{part['file']}: missing")
+            elif file_sha256(path) != part['sha256']:
+                problems.append(f"{part['file']}: checksum mismatch")
+    return problems
+
+
+def read_documents(path):
+    """(doc_id, document) of one partition file"""
+    with gzip.open(path, 'rt', encoding='utf-8') as handle:
+        for line in handle:
+            record = json.loads(line)
+            yield record['id'], _decode(record['data'])
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class WriteThrottle:
+    """Paces the batches of all restore workers to at most `rate` documents per second"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self, count):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + count * self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _restore_partition(db, directory, collection, part, throttle):
+    reference = db.collection(collection)
+    written = 0
+    for chunk in _chunks(read_documents(os.path.join(directory, part['file'])), BATCH_SIZE):
+        batch = db.batch()
+        for doc_id, document in chunk:
+            batch.set(reference.document(doc_id), document)
+        throttle.wait(len(chunk))
+        # Whole-document sets are idempotent, so retried commits are safe
+        batch.commit(**firestore_call_options())
+        written += len(chunk)
+    if written != part['documents']:
+        raise BackupError(f"{part['file']}: {written} documents, manifest says {part['documents']}")
+    return written
+
+
+def restore(db, directory, collections=None, workers=4, rate=DEFAULT_WRITE_RATE):
+    """Write every document of a verified backup back with batched sets; returns documents written per collection.
+
+    Works against Firestore or the local store (to seed it for testing). Documents not in the
+    backup are left alone.
+    """
+    manifest = load_manifest(directory)
+    problems = verify(directory, manifest, collections)
+    if problems:
+        raise BackupError("; ".join(problems))
+
+    jobs = [
+        (collection, part)
+        for collection, parts in manifest['collections'].items()
+        if not collections or collection in collections
+        for part in parts if part['documents']
+    ]
+    throttle = WriteThrottle(rate)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="restore") as executor:
+        counts = list(executor.map(lambda job: _restore_partition(db, directory, *job, throttle), jobs))
+
+    written = {}
+    for (collection, _), count in zip(jobs, counts):
+        written[collection] = written.get(collection, 0) + count
+    logger.info("Restored %s from %s in %.1f s", written, directory, time.perf_counter() - started)
+    return written
@@ -0,0 +1,64 @@
+# form_schema.py
+# ==================== DATA STRUCTURE ====================
+# Built-in form schema (version 1); newer versions are published to Firestore, see schema_registry.py
+MONTHLY_CATEGORIES = {
+    "Surveys & Investigations": {
+        "description": "Geophysical surveys, hydrogeological studies",
+        "fields": [
+            {"id": "surveys_conducted", "label": "Number of surveys conducted", "type": "number", "unit": "nos"},
+            {"id": "area_covered", "label": "Area covered", "type": "number", "unit": "sq km"},
+            {"id": "surveys_type", "label": "Type of surveys", "type": "dropdown", 
+             "options": ["VES", "GPR", "Electrical", "Magnetic", "Others"]},
+            {"id": "surveys_remarks", "label": "Remarks", "type": "text"}
+        ]
+    },
+    "Drilling Works": {
+        "description": "Borewell drilling, piezometer installation",
+        "fields": [
+            {"id": "borewells_completed", "label": "Bore wells completed", "type": "number", "unit": "nos"},
+            {"id": "average_depth", "label": "Average depth achieved", "type": "number", "unit": "meters"},
+            {"id": "drilling_expenditure", "label": "Expenditure incurred", "type": "number", "unit": "₹"},
+            {"id": "drilling_type", "label": "Type of drilling", "type": "dropdown",
+             "options": ["Rotary", "Percussion", "DTH", "Auger"]},
+            {"id": "drilling_remarks", "label": "Remarks", "type": "text"}
+        ]
+    },
+    "Monitoring Activities": {
+        "description": "Groundwater level monitoring, quality assessment",
+        "fields": [
+            {"id": "obs_wells_monitored", "label": "Observation wells monitored", "type": "number", "unit": "nos"},
+            {"id": "water_level_measurements", "label": "Water level measurements taken", "type": "number", "unit": "nos"},
+            {"id": "avg_water_level", "label": "Average water level", "type": "number", "unit": "meters"},
+            {"id": "water_samples_collected", "label": "Water samples collected", "type": "number", "unit": "nos"},
+            {"id": "monitoring_remarks", "label": "Remarks", "type": "text"}
+        ]
+    },
+    "Recharge Structures": {
+        "description": "Artificial recharge works",
+        "fields": [
+            {"id": "recharge_structures", "label": "Recharge structures completed", "type": "number", "unit": "nos"},
+            {"id": "recharge_capacity", "label": "Total recharge capacity", "type": "number", "unit": "MCM"},
+            {"id": "recharge_expenditure", "label": "Expenditure incurred", "type": "number", "unit": "₹"},
+            {"id": "recharge_type", "label": "Type of structure", "type": "dropdown",
+             "options": ["Percolation Tank", "Check Dam", "Recharge Shaft", "Others"]},
+            {"id": "recharge_remarks", "label": "Remarks", "type": "text"}
+        ]
+    },
+    "Public Awareness": {
+        "description": "Training programs, workshops, campaigns",
+        "fields": [
+            {"id": "training_programs", "label": "Training programs conducted", "type": "number", "unit": "nos"},
+            {"id": "participants_trained", "label": "Participants trained", "type": "number", "unit": "nos"},
+            {"id": "awareness_camps", "label": "Awareness camps organized", "type": "number", "unit": "nos"},
+            {"id": "publications", "label": "Publications distributed", "type": "number", "unit": "nos"},
+            {"id": "awareness_remarks", "label": "Remarks", "type": "text"}
+        ]
+    }
+}
+
+# District list (14 districts)
+DISTRICTS = [
+    "District 1", "District 2", "District 3", "District 4", "District 5",
+    "District 6", "District 7", "District 8", "District 9", "District 10",
+    "District 11", "District 12", "District 13", "District 14"
+]
@@ -0,0 +1,129 @@
+# groundwater.py
+import numpy as np
+import pandas as pd
+
+# Depth to water below ground level in meters: a larger value means a lower water table
+WATER_LEVEL_FIELD = "Monitoring Activities_avg_water_level"
+PRE_MONSOON_MONTHS = (4, 5)
+POST_MONSOON_MONTHS = (10, 11)
+SEASON_LENGTH = 12
+# Trend (m/year) beyond which a district counts as declining or rising rather than stable
+TREND_THRESHOLD = 0.1
+# Fewest monthly readings a trend is fitted on
+MIN_TREND_OBSERVATIONS = 12
+
+
+def water_level_matrix(analytics_df, field=WATER_LEVEL_FIELD):
+    """Approved readings as a months x districts frame on a continuous monthly PeriodIndex.
+
+    Months without a reading are NaN; 0 is the form's default and is treated as not reported.
+    """
+    if field not in analytics_df.columns:
+        return pd.DataFrame(index=pd.PeriodIndex([], freq='M'))
+    rows = analytics_df
+    if 'status' in rows.columns:
+        rows = rows[rows['status'] == 'approved']
+    rows = rows[rows[field] > 0]
+    if rows.empty:
+        return pd.DataFrame(index=pd.PeriodIndex([], freq='M'))
+
+    period = pd.PeriodIndex(pd.to_datetime(dict(year=rows['year'], month=rows['month'], day=1)), freq='M')
+    levels = rows.pivot_table(index=period, columns='district', values=field, aggfunc='mean')
+    levels = levels.reindex(pd.period_range(levels.index.min(), levels.index.max(), freq='M'))
+    levels.columns.name = None
+    return levels
+
+
+def decompose(levels, season_length=SEASON_LENGTH):
+    """Classical additive decomposition of every district at once: (trend, seasonal, residual)
+
+    Trend is the centred 2x12 moving average (tolerating a few missing months), the
+    seasonal component is the mean detrended value of each calendar month.
+    """
+    trailing = levels.rolling(season_length, min_periods=season_length * 3 // 4).mean()
+    trend = trailing.rolling(2).mean().shift(-(season_length // 2))
+
+    month_of_year = levels.index.month
+    profile = (levels - trend).groupby(month_of_year).mean()
+    profile = profile - profile.mean()
+    seasonal = profile.reindex(month_of_year).set_axis(levels.index)
+    return trend, seasonal, levels - trend - seasonal
+
+
+def monsoon_fluctuation(levels):
+    """Mean pre- and post-monsoon depth per district and year; fluctuation > 0 means the monsoon raised the water table"""
+    columns = ['district', 'year', 'pre_monsoon', 'post_monsoon', 'fluctuation']
+    months, years = levels.index.month, levels.index.year
+
+    def season_means(season_months):
+        in_season = np.isin(months, season_months)
+        return levels[in_season].groupby(years[in_season]).mean().stack()
+
+    seasons = pd.concat({'pre_monsoon': season_means(PRE_MONSOON_MONTHS),
+                         'post_monsoon': season_means(POST_MONSOON_MONTHS)}, axis=1)
+    if seasons.empty:
+        return pd.DataFrame(columns=columns)
+    seasons['fluctuation'] = seasons['pre_monsoon'] - seasons['post_monsoon']
+    seasons = seasons.rename_axis(['year', 'district']).reset_index()
+    return seasons[columns].sort_values(['district', 'year']).reset_index(drop=True).round(2)
+
+
+def decline_trends(levels, seasonal=None):
+    """Least-squares trend of every district in one pass (m/year, positive = water table falling)
+
+    Fitted on the deseasonalised series when the seasonal component is given.
+    """
+    columns = ['district', 'trend_m_per_year', 'r2', 'observations', 'first', 'last', 'latest_level', 'status']
+    if levels.empty:
+        return pd.DataFrame(columns=columns)
+    y = levels.to_numpy(dtype=float)
+    if seasonal is not None:
+        y = y - np.nan_to_num(seasonal.to_numpy(dtype=float))
+    observed = ~np.isnan(y)
+    t = (np.arange(len(levels)) / 12.0)[:, None] * observed
+    y0 = np.where(observed, y, 0.0)
+
+    n = observed.sum(axis=0)
+    sum_t, sum_y = t.sum(axis=0), y0.sum(axis=0)
+    sum_tt, sum_ty = (t * t).sum(axis=0), (t * y0).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        denominator = n * sum_tt - sum_t ** 2
+        slope = np.where((n >= MIN_TREND_OBSERVATIONS) & (denominator > 0),
+                         (n * sum_ty - sum_t * sum_y) / denominator, np.nan)
+        intercept = (sum_y - slope * sum_t) / n
+        fitted = intercept + slope * t
+        ss_res = np.where(observed, (y0 - fitted) ** 2, 0.0).sum(axis=0)
+        ss_tot = np.where(observed, (y0 - sum_y / n) ** 2, 0.0).sum(axis=0)
+        r2 = np.where(ss_tot > 0, 1 - ss_res / ss_tot, np.nan)
+
+    periods = levels.index.to_numpy()
+    first_row = np.where(n > 0, observed.argmax(axis=0), 0)
+    last_row = np.where(n > 0, len(levels) - 1 - observed[::-1].argmax(axis=0), 0)
+    status = np.select([np.isnan(slope), slope > TREND_THRESHOLD, slope < -TREND_THRESHOLD],
+                       ['Insufficient data', 'Declining', 'Rising'], default='Stable')
+
+    result = pd.DataFrame({
+        'district': levels.columns,
+        'trend_m_per_year': np.round(slope, 3),
+        'r2': np.round(r2, 2),
+        'observations': n,
+        'first': periods[first_row].astype(str),
+        'last': periods[last_row].astype(str),
+        'latest_level': np.round(levels.to_numpy()[last_row, np.arange(levels.shape[1])], 2),
+        'status': status,
+    })
+    return result.sort_values('trend_m_per_year', ascending=False, na_position='last').reset_index(drop=True)
+
+
+def analyze_water_levels(analytics_df, field=WATER_LEVEL_FIELD):
+    """Level matrix, decomposition, monsoon fluctuation and trends for every district"""
+    levels = water_level_matrix(analytics_df, field)
+    trend, seasonal, residual = decompose(levels)
+    return {
+        'levels': levels,
+        'trend': trend,
+        'seasonal': seasonal,
+        'residual': residual,
+        'fluctuation': monsoon_fluctuation(levels),
+        'trends': decline_trends(levels, seasonal),
+    }
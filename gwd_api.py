@@ -0,0 +1,209 @@
+# gwd_api.py
+"""Read-only JSON API over approved reports, run next to the Streamlit app:
+
+    python gwd_api.py --port 8600
+
+    GET /api/v1/reports?district=District%201&year=2024&month=6
+    GET /api/v1/rollup?year=2024&month=6&level=state
+    GET /api/v1/health
+
+Responses carry an ETag derived from the newest last_modified they cover; send it back
+in If-None-Match to get a 304 without the response being rebuilt or re-sent.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import sys
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from analytics import build_analytics_frame, numeric_field_columns
+from data_store import get_report_mirror
+from gwd_cli import connect
+from org_registry import get_org_registry
+from resilience import StaleCache
+from schema_registry import get_schema_registry
+
+logger = logging.getLogger("gwd_api")
+
+API_PREFIX = "/api/v1"
+# Smaller bodies are sent uncompressed; gzip would barely shrink them
+GZIP_MIN_BYTES = 1024
+ROLLUP_LEVELS = ['district', 'state']
+
+# (path, query) -> (etag, body, gzipped body); entries are replaced when the ETag changes
+_responses = StaleCache(max_entries=1024)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _int_param(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ApiError(400, f"'{name}' must be an integer")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def approved_reports(district=None, year=None, month=None):
+    """Approved reports from the shared mirror matching the filters, keyed by the active schema"""
+    mirror = get_report_mirror()
+    try:
+        mirror.refresh()
+    except Exception as e:
+        if mirror.watermark is None:
+            raise ApiError(503, f"Reports unavailable: {e}")
+        logger.warning("Mirror refresh failed, serving last snapshot: %s", e)
+    reports = [
+        r for r in mirror.snapshot()
+        if r.get('status') == 'approved'
+        and (district is None or r.get('district') == district)
+        and (year is None or r.get('year') == year)
+        and (month is None or r.get('month') == month)
+    ]
+    return get_schema_registry().normalize_reports(reports)
+
+
+def report_etag(key, reports):
+    """Weak ETag from the request, the reports' count and newest last_modified, and the schema version"""
+    newest = max((r['last_modified'] for r in reports if isinstance(r.get('last_modified'), datetime)),
+                 default=None)
+    seed = f"{key}|{len(reports)}|{newest.isoformat() if newest else ''}|{get_schema_registry().active.version}"
+    return f'W/"{hashlib.sha1(seed.encode()).hexdigest()[:20]}"'
+
+
+# ==================== ENDPOINTS ====================
+def reports_payload(reports, params):
+    return {
+        'count': len(reports),
+        'reports': [
+            {field: r.get(field) for field in ('district', 'year', 'month', 'last_modified', 'data')}
+            for r in reports
+        ],
+    }
+
+
+def rollup_payload(reports, params):
+    """Totals of every numeric field per district or per state"""
+    level = params.get('level', 'district')
+    if level not in ROLLUP_LEVELS:
+        raise ApiError(400, f"'level' must be one of {', '.join(ROLLUP_LEVELS)}")
+    df = build_analytics_frame(reports)
+    fields = [c for c in numeric_field_columns(get_schema_registry().active.categories) if c in df.columns]
+    df = df.assign(reports=1)
+    if level == 'state':
+        totals = get_org_registry().rollup(df, ['reports'] + fields)
+    else:
+        totals = df.groupby('district')[['reports'] + fields].sum()
+    rows = [dict(name=name, **{k: (v.item() if hasattr(v, 'item') else v) for k, v in row.items()})
+            for name, row in totals.iterrows()]
+    return {'level': level, 'year': params.get('year'), 'month': params.get('month'), 'rows': rows}
+
+
+ENDPOINTS = {
+    f"{API_PREFIX}/reports": reports_payload,
+    f"{API_PREFIX}/rollup": rollup_payload,
+}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    server_version = "GWD-API/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            if url.path == f"{API_PREFIX}/health":
+                mirror = get_report_mirror()
+                self._send_json(200, {'status': 'ok', 'reports': len(mirror.reports),
+                                      'watermark': mirror.watermark})
+                return
+            endpoint = ENDPOINTS.get(url.path)
+            if endpoint is None:
+                raise ApiError(404, f"Unknown endpoint: {url.path}")
+
+            reports = approved_reports(params.get('district'), _int_param(params, 'year'),
+                                       _int_param(params, 'month'))
+            key = (url.path, tuple(sorted(params.items())))
+            etag = report_etag(key, reports)
+            if etag in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+                self._send(304, etag=etag)
+                return
+
+            cached = _responses.get(key)
+            if cached and cached[1][0] == etag:
+                _, body, gzipped = cached[1]
+            else:
+                body = json.dumps(endpoint(reports, params), default=_json_default).encode('utf-8')
+                gzipped = gzip.compress(body) if len(body) >= GZIP_MIN_BYTES else None
+                _responses.put(key, (etag, body, gzipped))
+            self._send(200, body, gzipped, etag)
+        except ApiError as e:
+            self._send_json(e.status, {'error': str(e)})
+        except Exception as e:
+            logger.exception("Request failed: %s", self.path)
+            self._send_json(500, {'error': str(e)})
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload, default=_json_default).encode('utf-8'))
+
+    def _send(self, status, body=b"", gzipped=None, etag=None):
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Vary', 'Accept-Encoding')
+        if status != 304:
+            if gzipped is not None and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzipped
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read-only JSON API over approved reports")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--credentials', help="service account JSON (default: .streamlit/secrets.toml)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if connect(args.credentials) is None:
+        return 1
+    # Load every report once before accepting requests
+    get_report_mirror().refresh(force=True)
+    server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+    logger.info("Serving on http://%s:%d%s", args.host, args.port, API_PREFIX)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,280 @@
+# gwd_cli.py
+"""Headless batch reporting and exports, e.g. for a nightly cron job:
+
+    python gwd_cli.py reports --from 2024-04 --to 2025-03 --per-district --out reports/
+    python gwd_cli.py export --year-from 2024 --format parquet --out exports/
+    python gwd_cli.py backup --out backups/
+    python gwd_cli.py restore backups/gwd_backup_20250101T020000Z --max-writes-per-second 200
+
+Firebase credentials come from .streamlit/secrets.toml like the app, or from --credentials.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import firebase_admin
+from firebase_admin import credentials
+
+from data_store import iter_all_reports
+from firebase_config import get_firebase_resources
+from firestore_backup import (
+    DEFAULT_COLLECTIONS, DEFAULT_WRITE_RATE, PARTITIONED_COLLECTION, BackupError, backup, restore, verify
+)
+from org_registry import get_org_registry
+from report_builder import render_report_files
+from report_export import EXPORT_WRITERS, iter_report_frames
+from schema_registry import get_schema_registry
+
+logger = logging.getLogger("gwd_cli")
+
+FORMATS = ['xlsx', 'csv', 'pdf']
+# Fields the report builders read; the rest of each report is not sent to worker processes
+REPORT_FIELDS = ('district', 'year', 'month', 'status', 'data')
+STATE_TITLE = "State Consolidated Progress Report"
+# --format value -> report_export.EXPORT_WRITERS key
+EXPORT_FORMATS = {'csv': 'CSV', 'parquet': 'Parquet'}
+# First year the app accepts reports for; backups are partitioned by year from here on
+FIRST_REPORT_YEAR = 2020
+
+
+def parse_period(value):
+    """'YYYY-MM' -> (year, month)"""
+    try:
+        period = datetime.strptime(value, '%Y-%m')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM, got '{value}'")
+    return period.year, period.month
+
+
+def parse_formats(value):
+    formats = [f.strip().lower() for f in value.split(',') if f.strip()]
+    unknown = [f for f in formats if f not in FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"formats must be a comma-separated subset of {','.join(FORMATS)}")
+    return formats
+
+
+def parse_collections(value):
+    collections = [c.strip() for c in value.split(',') if c.strip()]
+    if not collections:
+        raise argparse.ArgumentTypeError("expected a comma-separated list of collections")
+    return collections
+
+
+def month_range(start, end):
+    """Every (year, month) from start to end inclusive"""
+    year, month = start
+    while (year, month) <= end:
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def connect(credentials_path=None):
+    """Initialize Firebase outside Streamlit; returns the Firestore client or None"""
+    # Caches and st.* calls work without a running app but log a warning each time
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    if credentials_path:
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(credentials.Certificate(credentials_path))
+    resources = get_firebase_resources()
+    if resources.db is None:
+        logger.error("Firestore not connected: %s", resources.error or resources.demo_reason)
+    return resources.db
+
+
+def load_approved(start, end, districts=None):
+    """Approved reports of the period range (plus earlier months of the first year, for trends)"""
+    registry = get_schema_registry()
+    wanted = set(districts) if districts else None
+    district = districts[0] if districts and len(districts) == 1 else None
+    reports = []
+    for _, report in iter_all_reports(district=district, year_from=start[0], year_to=end[0]):
+        if report.get('status') != 'approved' or (wanted and report.get('district') not in wanted):
+            continue
+        if (report.get('year', 0), report.get('month', 0)) > end:
+            continue
+        report = registry.normalize_report(report)
+        reports.append({field: report.get(field) for field in REPORT_FIELDS})
+    return reports, registry.active.categories
+
+
+def report_jobs(reports, start, end, per_district=False):
+    """(file stem, title, period label, entries, year entries, year, month) per report to build"""
+    by_year = {}
+    for report in reports:
+        by_year.setdefault(report['year'], []).append(report)
+
+    for year, month in month_range(start, end):
+        year_entries = [r for r in by_year.get(year, []) if r['month'] <= month]
+        entries = sorted((r for r in year_entries if r['month'] == month), key=lambda r: r['district'])
+        if not entries:
+            logger.info("No approved reports for %d-%02d", year, month)
+            continue
+        stem = f"GWD_Report_{year}_{month:02d}"
+        period_label = datetime(year, month, 1).strftime('%B %Y')
+        yield stem, STATE_TITLE, period_label, entries, year_entries, year, month
+
+        if per_district:
+            for district in sorted({r['district'] for r in entries}):
+                yield (
+                    f"{stem}_{district.replace(' ', '_')}",
+                    f"District Progress Report - {district}",
+                    period_label,
+                    [r for r in entries if r['district'] == district],
+                    [r for r in year_entries if r['district'] == district],
+                    year, month,
+                )
+
+
+def run_reports(args):
+    if connect(args.credentials) is None:
+        return 1
+    reports, categories = load_approved(args.start, args.end, args.district)
+    jobs = list(report_jobs(reports, args.start, args.end, args.per_district))
+    if not jobs:
+        logger.warning("Nothing to build")
+        return 0
+
+    os.makedirs(args.out, exist_ok=True)
+    workers = max(1, min(args.workers, len(jobs)))
+    stems = [job[0] for job in jobs]
+    # One argument list per render_report_files parameter
+    job_args = list(zip(*(job[1:] for job in jobs)))
+    job_args += [[args.formats] * len(jobs), [categories] * len(jobs)]
+    written = 0
+    if workers > 1:
+        # spawn: workers never inherit the Firestore client's gRPC threads
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results = list(executor.map(render_report_files, *job_args))
+    else:
+        results = list(map(render_report_files, *job_args))
+
+    for stem, files in zip(stems, results):
+        for extension, content in files.items():
+            with open(os.path.join(args.out, f"{stem}.{extension}"), 'wb') as handle:
+                handle.write(content)
+            written += 1
+    logger.info("%d reports, %d files written to %s", len(stems), written, args.out)
+    return 0
+
+
+def run_export(args):
+    if connect(args.credentials) is None:
+        return 1
+
+    registry = get_schema_registry()
+    categories = registry.active.categories
+    writer, extension, _ = EXPORT_WRITERS[EXPORT_FORMATS[args.format]]
+    reports = ((doc_id, registry.normalize_report(report)) for doc_id, report in
+               iter_all_reports(district=args.district, year_from=args.year_from, year_to=args.year_to))
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"gwd_reports_{datetime.now():%Y%m%d}{extension}")
+    # Written under a temporary name so a reader never sees a half-finished export
+    with open(path + ".part", 'wb') as sink:
+        rows = writer(iter_report_frames(reports, categories=categories), sink, categories)
+    os.replace(path + ".part", path)
+    logger.info("%d reports exported to %s", rows, path)
+    return 0
+
+
+def run_backup(args):
+    db = connect(args.credentials)
+    if db is None:
+        return 1
+    districts = get_org_registry().district_names() if PARTITIONED_COLLECTION in args.collections else []
+    years = range(args.year_from, datetime.now().year + 1)
+    os.makedirs(args.out, exist_ok=True)
+    directory, _ = backup(db, args.out, args.collections, districts, years, args.workers)
+    print(directory)
+    return 0
+
+
+def run_restore(args):
+    db = connect(args.credentials)
+    if db is None:
+        return 1
+    try:
+        restore(db, args.backup, args.collections, args.workers, args.max_writes_per_second)
+    except BackupError as e:
+        logger.error("Not restored: %s", e)
+        return 1
+    return 0
+
+
+def run_verify(args):
+    try:
+        problems = verify(args.backup)
+    except BackupError as e:
+        problems = [str(e)]
+    for problem in problems:
+        logger.error(problem)
+    if not problems:
+        logger.info("%s matches its manifest", args.backup)
+    return 1 if problems else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Ground Water Department batch reports and exports")
+    parser.add_argument('--credentials', help="service account JSON (default: .streamlit/secrets.toml)")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    reports = commands.add_parser('reports', help="monthly Excel/CSV/PDF reports for a period range")
+    reports.add_argument('--from', dest='start', type=parse_period, required=True, metavar='YYYY-MM')
+    reports.add_argument('--to', dest='end', type=parse_period, metavar='YYYY-MM', help="default: --from")
+    reports.add_argument('--district', action='append', help="repeat for several districts (default: all)")
+    reports.add_argument('--per-district', action='store_true', help="also build one report per district")
+    reports.add_argument('--formats', type=parse_formats, default=FORMATS, metavar='xlsx,csv,pdf')
+    reports.add_argument('--out', default='reports')
+    reports.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    reports.set_defaults(func=run_reports)
+
+    export = commands.add_parser('export', help="every report as one CSV or Parquet file")
+    export.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv')
+    export.add_argument('--district')
+    export.add_argument('--year-from', type=int)
+    export.add_argument('--year-to', type=int)
+    export.add_argument('--out', default='exports')
+    export.set_defaults(func=run_export)
+
+    backup_cmd = commands.add_parser('backup', help="snapshot collections as gzipped NDJSON with checksums")
+    backup_cmd.add_argument('--collections', type=parse_collections, default=list(DEFAULT_COLLECTIONS),
+                            metavar='monthly_reports,users')
+    backup_cmd.add_argument('--year-from', type=int, default=FIRST_REPORT_YEAR,
+                            help="first year reports are partitioned by (earlier reports are still included)")
+    backup_cmd.add_argument('--out', default='backups')
+    backup_cmd.add_argument('--workers', type=int, default=8, help="partitions read at the same time")
+    backup_cmd.set_defaults(func=run_backup)
+
+    restore_cmd = commands.add_parser('restore', help="write a verified backup back to Firestore")
+    restore_cmd.add_argument('backup', help="backup directory (with manifest.json)")
+    restore_cmd.add_argument('--collections', type=parse_collections, help="default: every collection in the backup")
+    restore_cmd.add_argument('--workers', type=int, default=4, help="batches committed at the same time")
+    restore_cmd.add_argument('--max-writes-per-second', type=float, default=DEFAULT_WRITE_RATE)
+    restore_cmd.set_defaults(func=run_restore)
+
+    verify_cmd = commands.add_parser('verify', help="check a backup's files against its manifest")
+    verify_cmd.add_argument('backup')
+    verify_cmd.set_defaults(func=run_verify)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == 'reports':
+        args.end = args.end or args.start
+        if args.end < args.start:
+            logger.error("--to is before --from")
+            return 2
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+# load_test.py
+"""Month-end rerun profile: simulated sessions drive monthly_progress_app.py through
+streamlit.testing.v1.AppTest against the in-memory local store, one rerun at a time.
+
+    python load_test.py --officers 50
+    python load_test.py --seed-backup backups/gwd_backup_20250101T020000Z
+
+Without --seed-backup each district gets synthetic approved history; with it the reports of
+a gwd_cli.py backup are loaded instead.
+
+Each officer logs in, fills the New Entry form and submits; then an admin approves
+everything. AppTest swaps process-wide runtime state on every run, so reruns cannot overlap
+and the sessions run one after another. The numbers are the cost of each rerun (time, store
+calls, memory) with the app's process-wide caches warmed by earlier sessions, not latency
+under concurrent load.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest, app_test, local_script_runner
+
+from firestore_backup import restore
+from form_schema import DISTRICTS
+from local_store import LOCAL_STORE_ENV, get_local_store
+from schema_registry import get_active_schema
+from session_stats import deep_sizeof
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "monthly_progress_app.py")
+ADMIN_EMAIL = "admin@load.test"
+# Form fields each simulated officer fills in (the rest keep their defaults)
+FILLED_FIELDS = 6
+
+
+class StepTimings:
+    """Run time of every AppTest run by step name, failures and final session_state sizes"""
+
+    def __init__(self):
+        self.samples = []
+        self.failures = []
+        self.session_bytes = []
+
+    def run(self, at, step):
+        started = time.perf_counter()
+        at.run()
+        self.samples.append((step, time.perf_counter() - started))
+        if at.exception:
+            self.failures.append((step, str(at.exception[0].value)))
+        return at
+
+    def record_session(self, at):
+        self.session_bytes.append(deep_sizeof(at.session_state.to_dict()))
+
+    def fail(self, step, message):
+        self.failures.append((step, message))
+
+    def summary(self):
+        """Rerun time percentiles in milliseconds per step"""
+        df = pd.DataFrame(self.samples, columns=['step', 'run'])
+        rows = []
+        for step, group in df.groupby('step', sort=False):
+            run_ms = group['run'].to_numpy() * 1000
+            p50, p95, p99 = np.percentile(run_ms, [50, 95, 99])
+            rows.append({'step': step, 'runs': len(run_ms), 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99,
+                         'max_ms': run_ms.max()})
+        return pd.DataFrame(rows).round(1)
+
+
+def use_shared_script_cache():
+    """Compile the app once for every session, as the server does.
+
+    AppTest compiles the script again on every run with a fresh ScriptCache, which would
+    add the compile time to every rerun.
+    """
+    cache = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: cache
+
+
+def officer_district(index):
+    return DISTRICTS[index] if index < len(DISTRICTS) else f"Load District {index + 1:03d}"
+
+
+def seed_store(store, officers, history_years, period, seed=0):
+    """Users for every officer and an admin, plus approved history for each district"""
+    # Imported here: the write queue reads GWD_DATA_DIR at import time
+    from data_store import build_report_document, report_doc_id
+
+    rng = random.Random(seed)
+    users = store.collection('users')
+    users.document("load_admin").set({'email': ADMIN_EMAIL, 'role': 'state_admin', 'district': None})
+    numeric_keys = get_active_schema().numeric_keys
+    reports = store.collection('monthly_reports')
+    year, month = period
+    for i in range(officers):
+        district = officer_district(i)
+        users.document(f"load_officer_{i:03d}").set(
+            {'email': f"officer{i:03d}@load.test", 'role': 'district_user', 'district': district})
+        for months_back in range(1, history_years * 12 + 1):
+            y, m = divmod(year * 12 + month - 1 - months_back, 12)
+            data = {key: rng.randint(0, 50) for key in numeric_keys}
+            document = build_report_document(district, m + 1, y, data, status="approved")
+            document['submitted_by'] = f"load_officer_{i:03d}"
+            reports.document(report_doc_id(district, y, m + 1)).set(document)
+
+
+def _widget(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+
+def login(at, timings, email):
+    timings.run(at, "open")
+    _widget(at.text_input, "Email").input(email)
+    _widget(at.text_input, "Password").input("load-test")
+    _widget(at.button, "Login").click()
+    timings.run(at, "login")
+    if not at.session_state["authenticated"]:
+        raise RuntimeError(f"Login failed for {email}")
+
+
+def officer_session(index, period, timings, seed=0):
+    """Log in, open the month's New Entry form, fill it and submit for approval"""
+    rng = random.Random(seed + index)
+    try:
+        at = AppTest.from_file(APP_PATH, default_timeout=300)
+        login(at, timings, f"officer{index:03d}@load.test")
+        year, month = period
+        _widget(at.selectbox, "Month").select(month)
+        _widget(at.selectbox, "Year").select(year)
+        timings.run(at, "open_form")
+        for key in rng.sample(get_active_schema().numeric_keys, FILLED_FIELDS):
+            at.number_input(key=key).set_value(rng.randint(1, 50))
+        _widget(at.button, "📤 Submit for Approval").click()
+        timings.run(at, "submit")
+        if not any("Submitted" in s.value for s in at.success):
+            timings.fail("submit", "; ".join(e.value for e in at.error) or "no confirmation shown")
+        timings.record_session(at)
+    except Exception as e:
+        timings.fail("officer", f"{type(e).__name__}: {e}")
+
+
+def admin_session(period, timings):
+    """Log in as state admin and approve every submission of the period"""
+    try:
+        at = AppTest.from_file(APP_PATH, default_timeout=300)
+        login(at, timings, ADMIN_EMAIL)
+        year, month = period
+        at.selectbox(key="approval_year").select(year)
+        timings.run(at, "open_approvals")
+        at.selectbox(key="approval_month").select(month)
+        timings.run(at, "open_approvals")
+        bulk = [b for b in at.button if b.label.startswith("✅ Approve")]
+        if bulk:
+            bulk[0].click()
+            timings.run(at, "approve_bulk")
+        # Flagged submissions are left out of the bulk approval
+        for _ in range(len(at.button)):
+            single = [b for b in at.button if b.key and b.key.startswith("approve_")]
+            if not single:
+                break
+            single[0].click()
+            timings.run(at, "approve_one")
+        else:
+            timings.fail("admin", "submissions still pending after approving each one")
+        timings.record_session(at)
+    except Exception as e:
+        timings.fail("admin", f"{type(e).__name__}: {e}")
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_load_test(officers, history_years, period, seed=0, backup_dir=None):
+    store = get_local_store()
+    seed_store(store, officers, 0 if backup_dir else history_years, period, seed)
+    if backup_dir:
+        restore(store, backup_dir, collections=['monthly_reports'], rate=0)
+    use_shared_script_cache()
+    # One untimed run first so module imports and process-wide caches are not part of the numbers
+    AppTest.from_file(APP_PATH, default_timeout=300).run()
+    store.reset_stats()
+    timings = StepTimings()
+    rss_before = peak_rss_mb()
+
+    started = time.perf_counter()
+    for i in range(officers):
+        officer_session(i, period, timings, seed)
+    officers_elapsed = time.perf_counter() - started
+    officer_calls = store.stats()
+
+    admin_session(period, timings)
+    approved = sum(
+        1 for doc in store.data.get('monthly_reports', {}).values()
+        if (doc.get('year'), doc.get('month')) == period and doc.get('status') == 'approved'
+    )
+    session_kb = pd.Series(timings.session_bytes, dtype=float) / 1024
+    return {
+        'officers': officers,
+        'period': f"{period[0]}-{period[1]:02d}",
+        'officer_phase_seconds': round(officers_elapsed, 2),
+        'approved': approved,
+        'failures': timings.failures,
+        'steps': timings.summary(),
+        'store_calls_officer_phase': officer_calls,
+        'store_calls_total': store.stats(),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'rss_growth_mb': round(peak_rss_mb() - rss_before, 1),
+        'session_state_kb': session_kb.describe().round(1).to_dict(),
+    }
+
+
+def print_results(results):
+    print(f"\n{results['officers']} officers, one rerun at a time, period {results['period']}")
+    print(f"Officer phase: {results['officer_phase_seconds']} s; approved: {results['approved']}")
+    print("\nRerun time (ms):")
+    print(results['steps'].to_string(index=False))
+    print("\nStore calls (officer phase):", results['store_calls_officer_phase'])
+    print("Store calls (total):", results['store_calls_total'])
+    print(f"Peak RSS: {results['peak_rss_mb']} MB (+{results['rss_growth_mb']} MB during the run)")
+    print("Session state (KB):", results['session_state_kb'])
+    if results['failures']:
+        print(f"\n{len(results['failures'])} failures:")
+        for step, message in results['failures'][:20]:
+            print(f"  {step}: {message}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serial per-rerun profile of a simulated month-end on the Streamlit app")
+    parser.add_argument('--officers', type=int, default=50)
+    parser.add_argument('--history-years', type=int, default=2, help="approved history seeded per district")
+    parser.add_argument('--period', help="YYYY-MM submitted by every officer (default: last month)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--seed-backup', metavar='DIR', help="load report history from a gwd_cli.py backup")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    if args.period:
+        period = datetime.strptime(args.period, '%Y-%m')
+        period = (period.year, period.month)
+    else:
+        now = datetime.now()
+        period = (now.year, now.month - 1) if now.month > 1 else (now.year - 1, 12)
+    if period[0] < datetime.now().year - 5:
+        parser.error("--period must be within the New Entry form's year range (last 5 years)")
+
+    # Must be set before the app modules are imported
+    os.environ[LOCAL_STORE_ENV] = "1"
+    os.environ.setdefault("GWD_DATA_DIR", tempfile.mkdtemp(prefix="gwd_load_"))
+
+    results = run_load_test(args.officers, args.history_years, period, args.seed, args.seed_backup)
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(dict(results, steps=results['steps'].to_dict('records')), handle, indent=2, default=str)
+    return 1 if results['failures'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
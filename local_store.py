@@ -0,0 +1,323 @@
+# local_store.py
+"""In-memory stand-in for the Firestore client, for load tests and offline development.
+
+Enabled by setting GWD_LOCAL_STORE=1 before the app starts; GWD_LOCAL_STORE_LATENCY_MS
+adds a fixed delay to every call to imitate the network round trip.
+Only the parts of the client API this app uses are implemented.
+"""
+import copy
+import itertools
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+LOCAL_STORE_ENV = "GWD_LOCAL_STORE"
+LATENCY_ENV = "GWD_LOCAL_STORE_LATENCY_MS"
+DOCUMENT_ID = "__name__"
+
+_OPERATORS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    'in': lambda a, b: a in b,
+}
+
+
+def local_store_enabled():
+    return os.environ.get(LOCAL_STORE_ENV, "").lower() in ("1", "true", "yes")
+
+
+def _resolve(value, now):
+    """Replace SERVER_TIMESTAMP sentinels (also inside maps) with the commit time"""
+    if value is SERVER_TIMESTAMP:
+        return now
+    if isinstance(value, dict):
+        return {k: _resolve(v, now) for k, v in value.items()}
+    return value
+
+
+class LocalSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class LocalDocument:
+    def __init__(self, store, path, doc_id):
+        self._store = store
+        self.path = path
+        self.id = doc_id
+
+    def collection(self, name):
+        return LocalCollection(self._store, f"{self.path}/{self.id}/{name}")
+
+    def get(self, **kwargs):
+        return self._store._call('get', lambda: self._snapshot())
+
+    def _snapshot(self):
+        self._store.docs_read += 1
+        return LocalSnapshot(self, copy.deepcopy(self._store.data.get(self.path, {}).get(self.id)))
+
+    def set(self, data, merge=False, **kwargs):
+        self._store._call('set', lambda: self._apply_set(data, merge))
+
+    def create(self, data, **kwargs):
+        self._store._call('create', lambda: self._apply_create(data))
+
+    def update(self, data, **kwargs):
+        self._store._call('update', lambda: self._apply_update(data))
+
+    def delete(self, **kwargs):
+        self._store._call('delete', lambda: self._apply_delete())
+
+    # Applied under the store lock, also by batches
+    def _apply_set(self, data, merge=False):
+        collection = self._store.data.setdefault(self.path, {})
+        data = _resolve(copy.deepcopy(data), datetime.now(timezone.utc))
+        if merge and self.id in collection:
+            collection[self.id].update(data)
+        else:
+            collection[self.id] = data
+        self._store.docs_written += 1
+
+    def _apply_create(self, data):
+        if self.id in self._store.data.get(self.path, {}):
+            raise AlreadyExists(f"Document already exists: {self.path}/{self.id}")
+        self._apply_set(data)
+
+    def _apply_update(self, data):
+        collection = self._store.data.get(self.path, {})
+        if self.id not in collection:
+            raise KeyError(f"No document to update: {self.path}/{self.id}")
+        collection[self.id].update(_resolve(copy.deepcopy(data), datetime.now(timezone.utc)))
+        self._store.docs_written += 1
+
+    def _apply_delete(self):
+        self._store.data.get(self.path, {}).pop(self.id, None)
+
+
+class LocalQuery:
+    def __init__(self, store, path, filters=(), orders=(), limit=None, after=None, fields=None,
+                 start_id=None, end_id=None):
+        self._store = store
+        self.path = path
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._limit = limit
+        self._after = after
+        self._fields = fields
+        self._start_id = start_id
+        self._end_id = end_id
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, limit=self._limit,
+                     after=self._after, fields=self._fields, start_id=self._start_id, end_id=self._end_id)
+        state.update(changes)
+        return LocalQuery(self._store, self.path, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(orders=self._orders + [(str(field_path), direction)])
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot):
+        return self._copy(after=snapshot)
+
+    # Only document ID cursors ({"__name__": id}, with the query ordered by document ID)
+    def start_at(self, values):
+        return self._copy(start_id=values[DOCUMENT_ID])
+
+    def end_before(self, values):
+        return self._copy(end_id=values[DOCUMENT_ID])
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def get(self, **kwargs):
+        return self._store._call('query', self._run)
+
+    def stream(self, **kwargs):
+        return iter(self.get())
+
+    def _run(self):
+        items = [
+            (doc_id, data) for doc_id, data in self._store.data.get(self.path, {}).items()
+            if all(_OPERATORS[op](data.get(field), value) for field, op, value in self._filters)
+            and (self._start_id is None or doc_id >= self._start_id)
+            and (self._end_id is None or doc_id < self._end_id)
+        ]
+        items.sort(key=lambda item: item[0])
+        for field, direction in reversed(self._orders):
+            if field == DOCUMENT_ID:
+                key = lambda item: item[0]
+            else:
+                key = lambda item, field=field: (item[1].get(field) is None, item[1].get(field))
+            items.sort(key=key, reverse=str(direction).upper().startswith("DESC"))
+        if self._after is not None:
+            ids = [doc_id for doc_id, _ in items]
+            if self._after.id in ids:
+                items = items[ids.index(self._after.id) + 1:]
+        if self._limit is not None:
+            items = items[:self._limit]
+
+        snapshots = []
+        for doc_id, data in items:
+            data = copy.deepcopy(data)
+            if self._fields is not None:
+                data = {k: v for k, v in data.items() if k in self._fields}
+            snapshots.append(LocalSnapshot(LocalDocument(self._store, self.path, doc_id), data))
+        # Firestore bills at least one read per query
+        self._store.docs_read += max(1, len(snapshots))
+        return snapshots
+
+
+class LocalCollection(LocalQuery):
+    _auto_ids = itertools.count()
+
+    def __init__(self, store, path):
+        super().__init__(store, path)
+
+    def document(self, doc_id=None):
+        return LocalDocument(self._store, self.path, doc_id or f"local{next(self._auto_ids):012d}")
+
+    def add(self, data, **kwargs):
+        ref = self.document()
+        ref.set(data)
+        return datetime.now(timezone.utc), ref
+
+
+class LocalBatch:
+    def __init__(self, store):
+        self._store = store
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append(lambda: reference._apply_set(data, merge))
+
+    def create(self, reference, data):
+        self._writes.append(lambda: reference._apply_create(data))
+
+    def update(self, reference, data):
+        self._writes.append(lambda: reference._apply_update(data))
+
+    def delete(self, reference):
+        self._writes.append(reference._apply_delete)
+
+    def commit(self, **kwargs):
+        def apply():
+            for write in self._writes:
+                write()
+        self._store._call('commit', apply)
+
+
+class LocalTransaction(LocalBatch):
+    """Transaction for firestore.transactional: holds the store lock from begin to commit, so it never conflicts"""
+
+    _read_only = False
+    _max_attempts = 1
+
+    def __init__(self, store):
+        super().__init__(store)
+        self._id = None
+        self._locked = False
+
+    def _clean_up(self):
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        # Reads inside the transaction re-enter the (reentrant) store lock
+        self._store._lock.acquire()
+        self._locked = True
+        self._id = id(self)
+
+    def _release(self):
+        if self._locked:
+            self._locked = False
+            self._store._lock.release()
+
+    def _commit(self):
+        try:
+            self.commit()
+        finally:
+            self._release()
+        return []
+
+    def _rollback(self):
+        self._writes = []
+        self._release()
+
+
+class LocalStore:
+    """Thread-safe in-memory document store with per-operation call counts"""
+
+    def __init__(self, latency=0.0):
+        self.data = {}
+        self.latency = latency
+        self.calls = Counter()
+        self.docs_read = 0
+        self.docs_written = 0
+        self._lock = threading.RLock()
+
+    def _call(self, operation, apply):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[operation] += 1
+            return apply()
+
+    def collection(self, name):
+        return LocalCollection(self, name)
+
+    def batch(self):
+        return LocalBatch(self)
+
+    def transaction(self, **kwargs):
+        return LocalTransaction(self)
+
+    def get_all(self, references, **kwargs):
+        return self._call('get_all', lambda: [reference._snapshot() for reference in references])
+
+    def stats(self):
+        with self._lock:
+            return dict(self.calls, docs_read=self.docs_read, docs_written=self.docs_written)
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.docs_read = self.docs_written = 0
+
+
+_local_store = None
+_local_store_lock = threading.Lock()
+
+
+def get_local_store():
+    """Process-wide local store"""
+    global _local_store
+    with _local_store_lock:
+        if _local_store is None:
+            _local_store = LocalStore(latency=float(os.environ.get(LATENCY_ENV, 0)) / 1000)
+        return _local_store
@@ -6,10 +6,42 @@ from datetime import datetime, date
 import json
 import plotly.express as px
 import plotly.graph_objects as go
-from firebase_config import initialize_firebase, get_firestore_client
+from firebase_config import initialize_firebase, get_firestore_client, show_connection_status, firestore_call_options
+from schema_registry import get_active_schema, get_schema_registry, publish_schema, categories_to_list, categories_from_list
+from targets import (
+    CUMULATIVE_UNITS, financial_year, fy_label, target_fields, load_targets, save_targets, compute_achievement,
+    rank_laggards, targets_fingerprint
+)
+from org_registry import get_org_registry, save_org_unit, LEVELS, PARENT_LEVEL
+from data_store import (
+    create_user, authenticate_user, validate_session, sign_out, update_user_permissions, save_monthly_data,
+    get_district_data, get_all_districts_data, update_data_status, get_report_status_summary,
+    get_write_queue, pending_sync_count, sync_pending_writes, failed_sync_writes, resubmit_failed_write,
+    discard_failed_write, load_all_reports_for_user,
+    report_doc_id, get_report_revisions, reconstruct_report, get_report_mirror, get_report, report_cache_size,
+    get_reports_by_ids
+)
+from session_stats import SESSION_FOOTPRINTS, record_session_footprint
+from resilience import FIRESTORE_BREAKER, METRICS
+from coalesce import SINGLE_FLIGHT
+from analytics import (
+    build_analytics_frame, score_submissions, build_status_matrix, comparison_periods, build_review_comparison,
+    STATUS_LABELS, STATUS_COLORS, STATUS_MISSING, STATUS_APPROVED, STATUS_NOT_DUE, SUBMISSION_DEADLINE_DAY
+)
+from district_map import get_district_map, discrete_colorscale
+from groundwater import analyze_water_levels, PRE_MONSOON_MONTHS, POST_MONSOON_MONTHS
+from remarks_index import get_remarks_index, remark_fields
+from report_builder import (
+    ReportRenderPool, build_summary_frame, build_raw_frame, build_trend_frame,
+    compute_kpis, build_excel_report, build_pdf_report, build_district_workbooks_zip, data_version
+)
 import firebase_admin
 from firebase_admin import firestore, auth
 import base64
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 # Page configuration
 st.set_page_config(
@@ -93,12 +125,17 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize Firebase
+# Initialize Firebase (created once per server process, reused across reruns)
 try:
     db, auth_module = initialize_firebase()
 except:
     st.warning("Firebase not initialized. Running in demo mode.")
     db = None
+show_connection_status()
+
+# Start replaying any saves still queued on local disk
+if db is not None:
+    get_write_queue()
 
 # ==================== SESSION STATE ====================
 if 'authenticated' not in st.session_state:
@@ -111,203 +148,172 @@ if 'authenticated' not in st.session_state:
 if 'form_data' not in st.session_state:
     st.session_state.form_data = {}
 
-if 'active_entry' not in st.session_state:
-    st.session_state.active_entry = None
+# Doc ID of the report open for edit/view; the report itself lives in the shared report cache
+if 'active_entry_id' not in st.session_state:
+    st.session_state.active_entry_id = None
 
 if 'entry_mode' not in st.session_state:
     st.session_state.entry_mode = None  # "edit" or "view"
     
 
-# ==================== DATA STRUCTURE ====================
-# This structure can be easily replaced later
-MONTHLY_CATEGORIES = {
-    "Surveys & Investigations": {
-        "description": "Geophysical surveys, hydrogeological studies",
-        "fields": [
-            {"id": "surveys_conducted", "label": "Number of surveys conducted", "type": "number", "unit": "nos"},
-            {"id": "area_covered", "label": "Area covered", "type": "number", "unit": "sq km"},
-            {"id": "surveys_type", "label": "Type of surveys", "type": "dropdown", 
-             "options": ["VES", "GPR", "Electrical", "Magnetic", "Others"]},
-            {"id": "surveys_remarks", "label": "Remarks", "type": "text"}
-        ]
-    },
-    "Drilling Works": {
-        "description": "Borewell drilling, piezometer installation",
-        "fields": [
-            {"id": "borewells_completed", "label": "Bore wells completed", "type": "number", "unit": "nos"},
-            {"id": "average_depth", "label": "Average depth achieved", "type": "number", "unit": "meters"},
-            {"id": "drilling_expenditure", "label": "Expenditure incurred", "type": "number", "unit": "₹"},
-            {"id": "drilling_type", "label": "Type of drilling", "type": "dropdown",
-             "options": ["Rotary", "Percussion", "DTH", "Auger"]},
-            {"id": "drilling_remarks", "label": "Remarks", "type": "text"}
-        ]
-    },
-    "Monitoring Activities": {
-        "description": "Groundwater level monitoring, quality assessment",
-        "fields": [
-            {"id": "obs_wells_monitored", "label": "Observation wells monitored", "type": "number", "unit": "nos"},
-            {"id": "water_level_measurements", "label": "Water level measurements taken", "type": "number", "unit": "nos"},
-            {"id": "avg_water_level", "label": "Average water level", "type": "number", "unit": "meters"},
-            {"id": "water_samples_collected", "label": "Water samples collected", "type": "number", "unit": "nos"},
-            {"id": "monitoring_remarks", "label": "Remarks", "type": "text"}
-        ]
-    },
-    "Recharge Structures": {
-        "description": "Artificial recharge works",
-        "fields": [
-            {"id": "recharge_structures", "label": "Recharge structures completed", "type": "number", "unit": "nos"},
-            {"id": "recharge_capacity", "label": "Total recharge capacity", "type": "number", "unit": "MCM"},
-            {"id": "recharge_expenditure", "label": "Expenditure incurred", "type": "number", "unit": "₹"},
-            {"id": "recharge_type", "label": "Type of structure", "type": "dropdown",
-             "options": ["Percolation Tank", "Check Dam", "Recharge Shaft", "Others"]},
-            {"id": "recharge_remarks", "label": "Remarks", "type": "text"}
-        ]
-    },
-    "Public Awareness": {
-        "description": "Training programs, workshops, campaigns",
-        "fields": [
-            {"id": "training_programs", "label": "Training programs conducted", "type": "number", "unit": "nos"},
-            {"id": "participants_trained", "label": "Participants trained", "type": "number", "unit": "nos"},
-            {"id": "awareness_camps", "label": "Awareness camps organized", "type": "number", "unit": "nos"},
-            {"id": "publications", "label": "Publications distributed", "type": "number", "unit": "nos"},
-            {"id": "awareness_remarks", "label": "Remarks", "type": "text"}
-        ]
-    }
-}
+# ==================== REPORT HELPERS ====================
+ALL_DISTRICTS_ZIP = "All Districts (ZIP)"
 
-# District list (14 districts)
-DISTRICTS = [
-    "District 1", "District 2", "District 3", "District 4", "District 5",
-    "District 6", "District 7", "District 8", "District 9", "District 10",
-    "District 11", "District 12", "District 13", "District 14"
-]
+@st.cache_resource
+def get_report_render_pool():
+    """Process-wide pool that renders PDFs off the request thread"""
+    return ReportRenderPool(max_workers=2)
 
-# ==================== FIREBASE FUNCTIONS ====================
-def create_user(email, password, district, role="district_user"):
-    """Create new user in Firebase Authentication"""
-    try:
-        user = auth_module.create_user(
-            email=email,
-            password=password,
-            display_name=district
-        )
-        
-        # Store user details in Firestore
-        user_ref = db.collection('users').document(user.uid)
-        user_ref.set({
-            'email': email,
-            'district': district,
-            'role': role,
-            'created_at': firestore.SERVER_TIMESTAMP,
-            'is_active': True,
-            'can_edit': True if role == "district_user" else True
-        })
-        
-        return True, f"User created successfully: {email}"
-    except Exception as e:
-        return False, f"Error creating user: {str(e)}"
+@st.cache_resource
+def get_report_process_pool():
+    """Worker processes for CPU-bound batch exports (spawned once, reused across reruns)"""
+    return ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                               mp_context=multiprocessing.get_context("spawn"))
 
-def authenticate_user(email, password):
-    """Authenticate user (simplified - in production use Firebase Auth directly)"""
-    # In production, use Firebase Auth SDK
-    # For demo, we'll use a simplified approach
-    if db:
-        users_ref = db.collection('users')
-        query = users_ref.where('email', '==', email).limit(1).get()
-        
-        if len(query) > 0:
-            user_data = query[0].to_dict()
-            # In production: verify password with Firebase Auth
-            st.session_state.authenticated = True
-            st.session_state.user_id = query[0].id
-            st.session_state.user_role = user_data.get('role', 'district_user')
-            st.session_state.user_district = user_data.get('district', 'Unknown')
-            return True
-    return False
+def render_report_pdf(report_type, district, period_label, kpis, summary_df, trend_df):
+    """Render a State Consolidated or District-wise PDF"""
+    if report_type == "District-wise Report" and district:
+        title = f"District Progress Report - {district}"
+    else:
+        title = "State Consolidated Progress Report"
+    return build_pdf_report(title, f"Reporting period: {period_label}", kpis, summary_df, trend_df)
 
-def save_monthly_data(district, month, year, data, status="draft"):
-    """Save monthly data to Firestore"""
-    if db is None:
-        return False, "Firestore not connected (db is None)"
-    try:
-        doc_id = f"{district}_{year}_{month:02d}"
-        
-        monthly_data = {
-            'district': district,
-            'month': month,
-            'year': year,
-            'data': data,
-            'status': status,
-            'submitted_by': st.session_state.user_id,
-            'submitted_at': firestore.SERVER_TIMESTAMP,
-            'last_modified': firestore.SERVER_TIMESTAMP
-        }
-        
-        # Add approval fields if submitted
-        if status == "submitted":
-            monthly_data['submission_date'] = firestore.SERVER_TIMESTAMP
-        
-        db.collection('monthly_reports').document(doc_id).set(monthly_data)
-        return True, "Data saved successfully"
-    except Exception as e:
-        return False, f"Error saving data: {str(e)}"
+@st.cache_data(ttl=300, show_spinner=False)
+def load_status_matrix(year, districts):
+    """Status matrix for a year, from one status-only query"""
+    return build_status_matrix(get_report_status_summary(year), list(districts), year)
 
-def get_district_data(district, month=None, year=None):
-    """Get monthly data for a district"""
-    try:
-        reports_ref = db.collection('monthly_reports')
-        
-        if month and year:
-            # Get specific month
-            doc_id = f"{district}_{year}_{month:02d}"
-            doc = reports_ref.document(doc_id).get()
-            if doc.exists:
-                return [doc.to_dict()]
-        else:
-            # Get all data for district
-            query = reports_ref.where('district', '==', district).order_by('year').order_by('month')
-            docs = query.get()
-            return [doc.to_dict() for doc in docs]
-    
-    except Exception as e:
-        st.error(f"Error fetching data: {e}")
-        return []
+@st.cache_data(ttl=300, show_spinner=False)
+def load_fy_targets(fy, district=None):
+    return load_targets(fy, district)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def load_achievement(version, targets_key, fy, as_of_month, _analytics_df, _targets_df):
+    """Achievement and laggard tables, recomputed only when reports, targets or the month change"""
+    achievement = compute_achievement(_analytics_df, _targets_df, fy, as_of=as_of_month)
+    return achievement, rank_laggards(achievement)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_water_level_analysis(version, _analytics_df):
+    """Groundwater level decomposition, monsoon fluctuation and trends, recomputed only when reports change"""
+    return analyze_water_levels(_analytics_df)
 
-def get_all_districts_data(year=None, month=None):
-    """Get data for all districts (State Admin only)"""
-    try:
-        reports_ref = db.collection('monthly_reports')
+def fy_options():
+    current_fy = int(financial_year(datetime.now().year, datetime.now().month))
+    return list(range(2020, current_fy + 2)), current_fy
+
+def show_target_progress(entries, analytics_df, fy, form_categories, district=None):
+    """Target vs achievement tables for one financial year (one district, or all with a laggard ranking)"""
+    targets_df = load_fy_targets(fy, district)
+    if targets_df.empty:
+        st.info(f"No targets set for FY {fy_label(fy)}")
+        return
+    
+    as_of_month = datetime.now().strftime('%Y-%m')
+    achievement, laggards = load_achievement(
+        data_version(entries), targets_fingerprint(targets_df), fy, as_of_month, analytics_df, targets_df
+    )
+    kinds = target_fields(form_categories)
+    achievement = achievement.assign(type=achievement['field'].map(kinds).fillna('Physical'))
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Expected by Now", f"{achievement['expected_pct'].iloc[0]:.0f}%")
+    col2.metric("On Track", f"{int(achievement['on_track'].sum())}/{len(achievement)}")
+    financial = achievement[achievement['type'] == 'Financial']
+    if not financial.empty:
+        col3.metric("Financial Achievement", f"{financial['achieved'].sum() / financial['target'].sum() * 100:.1f}%")
+    
+    if district is None:
+        st.markdown("**Laggards** (lowest average achievement first)")
+        st.dataframe(laggards.rename(columns={
+            'district': 'District', 'avg_achievement_pct': 'Avg Achievement %',
+            'fields_on_track': 'Fields On Track', 'fields': 'Fields With Targets', 'rank': 'Rank'
+        }), use_container_width=True, hide_index=True)
         
-        if year and month:
-            query = reports_ref.where('year', '==', year).where('month', '==', month)
-        elif year:
-            query = reports_ref.where('year', '==', year)
+        matrix = achievement.pivot(index='district', columns='field', values='achievement_pct')
+        fig = px.imshow(matrix, zmin=0, zmax=100, color_continuous_scale='RdYlGn', text_auto='.0f',
+                        aspect='auto', title="Achievement % by District and Field")
+        fig.update_layout(height=max(350, 28 * len(matrix)), xaxis_title=None, yaxis_title=None)
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.dataframe(achievement.drop(columns=['district', 'rank']).rename(columns={
+            'field': 'Field', 'type': 'Type', 'target': 'Target', 'achieved': 'Achieved',
+            'achievement_pct': 'Achievement %', 'expected_pct': 'Expected %', 'projected': 'Projected',
+            'projected_pct': 'Projected %', 'on_track': 'On Track'
+        }), use_container_width=True, hide_index=True)
+
+def show_failed_writes(failed, key):
+    """Saves the cloud kept rejecting, each with resubmit and discard buttons"""
+    st.error(f"❌ {len(failed)} saved entr{'y was' if len(failed) == 1 else 'ies were'} rejected by the cloud. "
+             "Resubmit to try again or discard to drop the change.")
+    for write in failed:
+        col1, col2, col3 = st.columns([4, 1, 1])
+        with col1:
+            st.caption(f"**{write['doc_id']}**: failed {write['attempts']} times at "
+                       f"{datetime.fromtimestamp(write['failed_at']):%Y-%m-%d %H:%M} ({write['last_error']})")
+        with col2:
+            if st.button("🔁 Resubmit", key=f"{key}_resubmit_{write['seq']}", use_container_width=True):
+                success, message = resubmit_failed_write(write['seq'])
+                (st.toast if success else st.warning)(message)
+                st.rerun()
+        with col3:
+            if st.button("🗑️ Discard", key=f"{key}_discard_{write['seq']}", use_container_width=True):
+                success, message = discard_failed_write(write['seq'])
+                (st.toast if success else st.warning)(message)
+                st.rerun()
+
+def show_data_layer_health():
+    """Retry and circuit-breaker counters for admins"""
+    with st.sidebar.expander("🛡️ Data Layer Health"):
+        st.caption(f"Circuit breaker: {FIRESTORE_BREAKER.state} | Queued writes: {pending_sync_count()}")
+        failed = failed_sync_writes()
+        if failed:
+            show_failed_writes(failed, key="admin_failed")
+        mirror = get_report_mirror()
+        if mirror.watermark is not None:
+            st.caption(f"Report mirror: {len(mirror.reports)} reports | last refresh pulled {mirror.last_pulled}")
+        metrics = METRICS.snapshot()
+        if metrics:
+            st.dataframe(pd.DataFrame(metrics).T, use_container_width=True)
         else:
-            query = reports_ref
-        
-        docs = query.get()
-        return [doc.to_dict() for doc in docs]
-    
-    except Exception as e:
-        st.error(f"Error fetching data: {e}")
-        return []
+            st.caption("No Firestore calls yet")
+        st.caption(f"Shared report cache: {report_cache_size()} reports")
+        sessions = SESSION_FOOTPRINTS.snapshot()
+        if sessions:
+            st.caption(f"Session memory ({len(sessions)} sessions, {sum(s['bytes'] for s in sessions) / 1024:.0f} KB)")
+            st.dataframe(
+                pd.DataFrame(sessions, columns=['session', 'user', 'role', 'keys', 'bytes', 'largest_key', 'largest_bytes']),
+                use_container_width=True, hide_index=True
+            )
+        coalescing = SINGLE_FLIGHT.snapshot()
+        if coalescing:
+            st.caption("Shared in-flight queries")
+            st.dataframe(pd.DataFrame(coalescing).T, use_container_width=True)
 
-def update_data_status(doc_id, status, remarks=""):
-    """Update approval status of monthly data"""
-    try:
-        update_data = {
-            'status': status,
-            'reviewed_at': firestore.SERVER_TIMESTAMP,
-            'reviewed_by': st.session_state.user_id
-        }
+def show_report_history(doc_id):
+    """Revision list of a report with the changes in each, and the report as of any revision"""
+    with st.expander("🕘 Change History"):
+        revisions = get_report_revisions(doc_id)
+        if not revisions:
+            st.caption("No changes recorded yet")
+            return
         
-        if remarks:
-            update_data['review_remarks'] = remarks
+        history = pd.DataFrame([{
+            'Revision': r['revision'],
+            'Action': r.get('action'),
+            'Status': r.get('status'),
+            'Changed By': r.get('changed_by'),
+            'Changed At': r.get('changed_at'),
+            'Fields Changed': len(r.get('changes', [])),
+        } for r in revisions])
+        st.dataframe(history, use_container_width=True, hide_index=True)
         
-        db.collection('monthly_reports').document(doc_id).update(update_data)
-        return True, f"Status updated to {status}"
-    except Exception as e:
-        return False, f"Error updating status: {str(e)}"
+        selected = st.selectbox("Revision", history['Revision'][::-1], key=f"history_rev_{doc_id}")
+        record = next(r for r in revisions if r['revision'] == selected)
+        changes = pd.DataFrame(record.get('changes', [])).reindex(columns=['field', 'old', 'new'])
+        st.dataframe(changes.astype(str), use_container_width=True, hide_index=True)
+        if st.checkbox("Show full report at this revision", key=f"history_full_{doc_id}"):
+            st.json(reconstruct_report(doc_id, selected, revisions))
 
 # ==================== PAGE: LOGIN ====================
 def login_page():
@@ -331,7 +337,7 @@ def login_page():
             
             if demo_mode:
                 role = st.selectbox("Select Role", ["District User", "State Admin"])
-                district = st.selectbox("Select District", DISTRICTS) if role == "District User" else None
+                district = st.selectbox("Select District", get_org_registry().district_names()) if role == "District User" else None
                 
                 if st.button("Login with Demo", use_container_width=True):
                     st.session_state.authenticated = True
@@ -348,12 +354,12 @@ def login_page():
                     if authenticate_user(email, password):
                         st.success(f"Welcome {st.session_state.user_district}!")
                         st.rerun()
-                    else:
-                        st.error("Invalid credentials")
 
 # ==================== PAGE: DISTRICT USER DASHBOARD ====================
 def district_dashboard():
     """Dashboard for district users"""
+    form_categories = get_active_schema().categories
+    
     # Header
     col1, col2, col3 = st.columns([2, 1, 1])
     with col1:
@@ -361,9 +367,26 @@ def district_dashboard():
         st.caption(f"Monthly Progress Monitoring | User: {st.session_state.user_id}")
     with col3:
         if st.button("🚪 Logout", use_container_width=True):
-            st.session_state.authenticated = False
+            sign_out()
             st.rerun()
     
+    # Saves still waiting for the cloud
+    pending_sync = pending_sync_count(st.session_state.user_district)
+    failed = failed_sync_writes(st.session_state.user_district) if pending_sync else []
+    waiting = pending_sync - len(failed)
+    if waiting:
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            st.info(f"⏳ {waiting} saved entr{'y is' if waiting == 1 else 'ies are'} waiting to sync to the cloud. "
+                    "They are safe on this server and will upload automatically.")
+        with col2:
+            if st.button("🔄 Sync Now", use_container_width=True):
+                synced = sync_pending_writes()
+                st.toast(f"Synced {synced} entries")
+                st.rerun()
+    if failed:
+        show_failed_writes(failed, key="district_failed")
+    
     # Tabs for different functionalities
     tab1, tab2, tab3, tab4 = st.tabs([
         "📝 New Entry", 
@@ -398,8 +421,7 @@ def district_dashboard():
                 f"⚠️ Entry for {datetime(year, month, 1).strftime('%B %Y')} already exists"
             )
         else:
-            # ================= FORM SHOULD APPEAR ONLY HERE =================
-        
+            # Form appears only when there is no entry for this month yet
             with st.container(border=True):
                 st.subheader("Reporting Officer Details")
                 col1, col2 = st.columns(2)
@@ -410,105 +432,88 @@ def district_dashboard():
                     contact = st.text_input("Contact Number")
                     email = st.text_input("Email")
         
+            # Main data entry form
             st.subheader("Monthly Progress Data")
         
             form_data = {}
-            for category, details in MONTHLY_CATEGORIES.items():
-                with st.expander(f"📁 {category} - {details['description']}", expanded=True):
-                    ...
-
-        
-        # Form header
-        with st.container(border=True):
-            st.subheader("Reporting Officer Details")
-            col1, col2 = st.columns(2)
-            with col1:
-                officer_name = st.text_input("Name of Reporting Officer")
-                designation = st.text_input("Designation")
-            with col2:
-                contact = st.text_input("Contact Number")
-                email = st.text_input("Email")
-        
-        # Main data entry form
-        st.subheader("Monthly Progress Data")
-        
-        form_data = {}
-        for category, details in MONTHLY_CATEGORIES.items():
-            with st.expander(f"📁 {category} - {details['description']}", expanded=True):
-                st.caption(details['description'])
+            for category, details in form_categories.items():
+                description = details.get('description', '')
+                with st.expander(f"📁 {category} - {description}" if description else f"📁 {category}", expanded=True):
+                    if description:
+                        st.caption(description)
                 
-                cols = st.columns(2)
-                col_index = 0
+                    cols = st.columns(2)
+                    col_index = 0
                 
-                for field in details['fields']:
-                    with cols[col_index % 2]:
-                        field_id = f"{category}_{field['id']}"
+                    for field in details['fields']:
+                        with cols[col_index % 2]:
+                            field_id = f"{category}_{field['id']}"
                         
-                        if field['type'] == 'number':
-                            value = st.number_input(
-                                f"{field['label']} ({field.get('unit', '')})",
-                                min_value=0,
-                                value=0,
-                                key=field_id
-                            )
-                        elif field['type'] == 'dropdown':
-                            value = st.selectbox(
-                                field['label'],
-                                options=field['options'],
-                                key=field_id
-                            )
-                        elif field['type'] == 'text':
-                            value = st.text_area(
-                                field['label'],
-                                key=field_id,
-                                height=100
-                            )
+                            if field['type'] == 'number':
+                                value = st.number_input(
+                                    f"{field['label']} ({field.get('unit', '')})",
+                                    min_value=0,
+                                    value=0,
+                                    key=field_id
+                                )
+                            elif field['type'] == 'dropdown':
+                                value = st.selectbox(
+                                    field['label'],
+                                    options=field['options'],
+                                    key=field_id
+                                )
+                            elif field['type'] == 'text':
+                                value = st.text_area(
+                                    field['label'],
+                                    key=field_id,
+                                    height=100
+                                )
                         
-                        form_data[field_id] = value
-                    col_index += 1
+                            form_data[field_id] = value
+                        col_index += 1
         
-        # Submission buttons
-        col1, col2, col3 = st.columns([1, 1, 2])
-        with col1:
-            if st.button("💾 Save Draft", use_container_width=True):
-                success, message = save_monthly_data(
-                    st.session_state.user_district,
-                    month,
-                    year,
-                    form_data,
-                    status="draft"
-                )
-                if success:
-                    st.success("Draft saved successfully!")
-                else:
-                    st.error(message)
+            # Submission buttons
+            col1, col2, col3 = st.columns([1, 1, 2])
+            with col1:
+                if st.button("💾 Save Draft", use_container_width=True):
+                    success, message = save_monthly_data(
+                        st.session_state.user_district,
+                        month,
+                        year,
+                        form_data,
+                        status="draft"
+                    )
+                    if success:
+                        st.success("Draft saved successfully!")
+                    else:
+                        st.error(message)
         
-        with col2:
-            if st.button("📤 Submit for Approval", use_container_width=True):
-                success, message = save_monthly_data(
-                    st.session_state.user_district,
-                    month,
-                    year,
-                    form_data,
-                    status="submitted"
-                )
-                if success:
-                    st.success("Submitted for approval!")
-                    st.balloons()
-                else:
-                    st.error(message)
+            with col2:
+                if st.button("📤 Submit for Approval", use_container_width=True):
+                    success, message = save_monthly_data(
+                        st.session_state.user_district,
+                        month,
+                        year,
+                        form_data,
+                        status="submitted"
+                    )
+                    if success:
+                        st.success("Submitted for approval!")
+                        st.balloons()
+                    else:
+                        st.error(message)
         
-        with col3:
-            if st.button("🔄 Reset Form", use_container_width=True):
-                st.rerun()
+            with col3:
+                if st.button("🔄 Reset Form", use_container_width=True):
+                    st.rerun()
     
     # ===== TAB 2: VIEW SUBMISSIONS =====
     with tab2:
         st.header("Previous Submissions")
     
         # ---------- Session state ----------
-        if 'active_entry' not in st.session_state:
-            st.session_state.active_entry = None
+        if 'active_entry_id' not in st.session_state:
+            st.session_state.active_entry_id = None
     
         if 'entry_mode' not in st.session_state:
             st.session_state.entry_mode = None  # "edit" or "view"
@@ -584,7 +589,7 @@ def district_dashboard():
                         c1, c2, c3, c4, c5 = st.columns([2, 1.2, 2, 2, 1])
     
                         c1.write(month_year)
-                        c2.write(status.upper())
+                        c2.write(status.upper() + (" ⏳" if entry.get('pending_sync') else ""))
                         c3.write(entry.get('submitted_at', '—'))
                         c4.write(entry.get('review_remarks', '—'))
     
@@ -593,7 +598,7 @@ def district_dashboard():
                                 "✏️ Edit",
                                 key=f"edit_{entry['year']}_{entry['month']}"
                             ):
-                                st.session_state.active_entry = entry
+                                st.session_state.active_entry_id = report_doc_id(entry['district'], entry['year'], entry['month'])
                                 st.session_state.entry_mode = "edit"
                                 st.session_state.collapse_table = True
                                 st.rerun()
@@ -603,16 +608,16 @@ def district_dashboard():
                                 "👁️ View",
                                 key=f"view_{entry['year']}_{entry['month']}"
                             ):
-                                st.session_state.active_entry = entry
+                                st.session_state.active_entry_id = report_doc_id(entry['district'], entry['year'], entry['month'])
                                 st.session_state.entry_mode = "view"
                                 st.session_state.collapse_table = True
                                 st.rerun()
     
         # ---------- Edit / View form ----------
-        if st.session_state.active_entry:
+        entry = get_report(st.session_state.active_entry_id) if st.session_state.active_entry_id else None
+        if entry:
             st.divider()
     
-            entry = st.session_state.active_entry
             mode = st.session_state.entry_mode
             readonly = (mode == "view")
     
@@ -621,10 +626,11 @@ def district_dashboard():
             st.subheader(
                 f"{'✏️ Editing' if mode == 'edit' else '👁️ Viewing'} Report – {month_year}"
             )
+            show_report_history(report_doc_id(entry['district'], entry['year'], entry['month']))
     
             form_data = {}
     
-            for category, details in MONTHLY_CATEGORIES.items():
+            for category, details in form_categories.items():
                 with st.expander(category, expanded=True):
                     for field in details['fields']:
                         field_key = f"{category}_{field['id']}"
@@ -665,12 +671,12 @@ def district_dashboard():
                         status=entry['status']
                     )
                     st.success("Report updated successfully")
-                    st.session_state.active_entry = None
+                    st.session_state.active_entry_id = None
                     st.session_state.collapse_table = False
                     st.rerun()
     
             if st.button("❌ Close"):
-                st.session_state.active_entry = None
+                st.session_state.active_entry_id = None
                 st.session_state.collapse_table = False
                 st.rerun()
 
@@ -755,9 +761,9 @@ def district_dashboard():
                         categories = []
                         values = []
                         
-                        for cat in MONTHLY_CATEGORIES.keys():
+                        for cat in form_categories.keys():
                             # Find a numeric field in each category
-                            for field in MONTHLY_CATEGORIES[cat]['fields']:
+                            for field in form_categories[cat]['fields']:
                                 col_name = f"{cat}_{field['id']}"
                                 if col_name in df.columns and pd.notna(latest[col_name]):
                                     categories.append(cat)
@@ -770,6 +776,14 @@ def district_dashboard():
                             st.plotly_chart(fig, use_container_width=True)
             else:
                 st.info("No approved data available for analysis")
+            
+            # Annual targets set by the state office
+            st.subheader("🎯 Target vs Achievement")
+            fys, current_fy = fy_options()
+            target_fy = st.selectbox("Financial Year", fys, index=fys.index(current_fy),
+                                     format_func=fy_label, key="district_target_fy")
+            show_target_progress(all_data, build_analytics_frame(all_data), target_fy, form_categories,
+                                 district=st.session_state.user_district)
     
     # ===== TAB 4: PROFILE =====
     with tab4:
@@ -800,14 +814,18 @@ def district_dashboard():
 # ==================== PAGE: STATE ADMIN DASHBOARD ====================
 def state_admin_dashboard():
     """Dashboard for State Admin/Super Admin"""
+    show_data_layer_health()
+    
     # Header
     col1, col2, col3 = st.columns([2, 1, 1])
     with col1:
         st.title("🏛️ State Administration")
         st.caption("Ground Water Department | Super Admin Panel")
+    with col2:
+        refresh = st.button("🔄 Refresh Data", use_container_width=True)
     with col3:
         if st.button("🚪 Logout", use_container_width=True):
-            st.session_state.authenticated = False
+            sign_out()
             st.rerun()
     
     # Tabs
@@ -819,11 +837,27 @@ def state_admin_dashboard():
         "📄 Reports"
     ])
     
+    # Full collection as one analytics frame, shared by the Approvals and Analytics tabs
+    all_reports = load_all_reports_for_user(st.session_state.user_id, force=refresh)
+    analytics_df = build_analytics_frame(all_reports)
+    
+    # Org hierarchy; the state selector only appears once more than one state is registered
+    registry = get_org_registry()
+    form_categories = get_active_schema().categories
+    analytics_df['state'] = registry.state_column(analytics_df['district'])
+    
     # ===== TAB 1: DASHBOARD =====
     with tab1:
         st.header("State Overview Dashboard")
         
         # Filters
+        states = registry.states()
+        if len(states) > 1:
+            selected_state = st.selectbox("State", ["All"] + states, key="state_filter")
+        else:
+            selected_state = "All"
+        scope_districts = registry.district_names(None if selected_state == "All" else selected_state)
+        
         col1, col2, col3 = st.columns(3)
         with col1:
             selected_year = st.selectbox("Year", 
@@ -835,11 +869,12 @@ def state_admin_dashboard():
                                          format_func=lambda x: datetime(2024, x, 1).strftime('%B'),
                                          key="state_month")
         with col3:
-            selected_district = st.selectbox("District", ["All"] + DISTRICTS)
+            selected_district = st.selectbox("District", ["All"] + scope_districts)
         
         # Get data
         if selected_district == "All":
-            data = get_all_districts_data(selected_year, selected_month)
+            in_scope = set(scope_districts)
+            data = [d for d in get_all_districts_data(selected_year, selected_month) if d.get('district') in in_scope]
         else:
             data = get_district_data(selected_district, selected_month, selected_year)
         
@@ -848,7 +883,7 @@ def state_admin_dashboard():
         
         with col1:
             districts_submitted = len(set([d['district'] for d in data if d.get('status') == 'submitted']))
-            total_districts = len(DISTRICTS)
+            total_districts = len(scope_districts) if selected_district == "All" else 1
             submission_rate = (districts_submitted / total_districts) * 100
             st.metric("Submission Rate", f"{submission_rate:.1f}%", 
                      f"{districts_submitted}/{total_districts} districts")
@@ -870,24 +905,15 @@ def state_admin_dashboard():
         # District-wise status
         st.subheader("District-wise Submission Status")
         
-        status_data = []
-        for district in DISTRICTS:
-            district_data = [d for d in data if d.get('district') == district]
-            if district_data:
-                latest = district_data[0]
-                status_data.append({
-                    'District': district,
-                    'Status': latest.get('status', 'Not Submitted'),
-                    'Last Updated': latest.get('last_modified', 'N/A')
-                })
-            else:
-                status_data.append({
-                    'District': district,
-                    'Status': 'Not Submitted',
-                    'Last Updated': 'N/A'
-                })
-        
-        status_df = pd.DataFrame(status_data)
+        # First report per district, joined onto the full district list
+        reports_df = pd.DataFrame(data, columns=['district', 'status', 'last_modified'])
+        status_df = (
+            pd.DataFrame({'District': scope_districts})
+            .merge(reports_df.drop_duplicates('district'), how='left', left_on='District', right_on='district')
+            .rename(columns={'status': 'Status', 'last_modified': 'Last Updated'})
+            [['District', 'Status', 'Last Updated']]
+            .fillna({'Status': 'Not Submitted', 'Last Updated': 'N/A'})
+        )
         
         # Color coding
         def color_status(val):
@@ -902,6 +928,112 @@ def state_admin_dashboard():
         
         st.dataframe(status_df.style.applymap(color_status, subset=['Status']), 
                     use_container_width=True)
+        
+        if len(states) > 1 and selected_state == "All":
+            st.subheader("State Roll-up")
+            rollup = pd.crosstab(registry.state_column(status_df['District']), status_df['Status'])
+            rollup['Reported %'] = (
+                rollup.drop(columns='Not Submitted', errors='ignore').sum(axis=1) / rollup.sum(axis=1) * 100
+            ).round(1)
+            st.dataframe(rollup.rename_axis('State'), use_container_width=True)
+        
+        # District x month completeness across years
+        st.subheader("Submission Completeness")
+        
+        year_options = list(range(2020, datetime.now().year + 1))
+        col1, col2 = st.columns(2)
+        with col1:
+            matrix_from = st.selectbox("From Year", year_options, index=len(year_options) - 1, key="matrix_from")
+        with col2:
+            matrix_to = st.selectbox("To Year", year_options, index=len(year_options) - 1, key="matrix_to")
+        
+        matrix_years = list(range(matrix_from, max(matrix_from, matrix_to) + 1))
+        matrices = [load_status_matrix(year, tuple(scope_districts)) for year in matrix_years]
+        codes = np.hstack([m[0] for m in matrices])
+        late = np.hstack([m[1] for m in matrices])
+        
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Missing Reports", int((codes == STATUS_MISSING).sum()))
+        col2.metric("Late Submissions", int(late.sum()))
+        col3.metric("Approved", f"{(codes == STATUS_APPROVED).sum() / max(1, (codes != STATUS_NOT_DUE).sum()) * 100:.1f}%")
+        
+        # Discrete colour scale: one flat band per status code
+        n_codes = len(STATUS_LABELS)
+        colorscale = []
+        for code, color in enumerate(STATUS_COLORS):
+            colorscale += [[code / n_codes, color], [(code + 1) / n_codes, color]]
+        
+        month_labels = [f"{datetime(2024, m, 1).strftime('%b')} {year}" for year in matrix_years for m in range(1, 13)]
+        fig = go.Figure(go.Heatmap(
+            z=codes,
+            x=month_labels,
+            y=scope_districts,
+            zmin=-0.5, zmax=n_codes - 0.5,
+            colorscale=colorscale,
+            customdata=np.array(STATUS_LABELS, dtype=object)[codes],
+            text=np.where(late, "⏰", ""),
+            texttemplate="%{text}",
+            hovertemplate="%{y} · %{x}<br>%{customdata}<extra></extra>",
+            colorbar=dict(tickvals=list(range(n_codes)), ticktext=STATUS_LABELS),
+            xgap=1, ygap=1
+        ))
+        fig.update_layout(height=max(350, 28 * len(scope_districts)), yaxis=dict(autorange="reversed"))
+        st.plotly_chart(fig, use_container_width=True)
+        st.caption(f"⏰ submitted after the {SUBMISSION_DEADLINE_DAY}th of the following month")
+        
+        # Annual physical and financial targets per district
+        st.subheader("🎯 Target vs Achievement")
+        fys, current_fy = fy_options()
+        target_fy = st.selectbox("Financial Year", fys, index=fys.index(current_fy),
+                                 format_func=fy_label, key="target_fy")
+        show_target_progress(all_reports, analytics_df, target_fy, form_categories)
+        
+        with st.expander("✏️ Set Targets"):
+            fields = list(target_fields(form_categories))
+            grid = (
+                load_fy_targets(target_fy)
+                .pivot(index='district', columns='field', values='target')
+                .reindex(index=scope_districts, columns=fields)
+                .astype(float)
+            )
+            edited = st.data_editor(grid, use_container_width=True, key=f"targets_editor_{target_fy}")
+            if st.button("💾 Save Targets"):
+                # Keep blank cells so cleared targets are removed too
+                long = edited.rename_axis(index='district', columns='field').stack(future_stack=True)
+                success, message = save_targets(target_fy, long.rename('target').reset_index(), st.session_state.user_id)
+                if success:
+                    load_fy_targets.clear()
+                    st.success(message)
+                    st.rerun()
+                else:
+                    st.error(message)
+        
+        # Full-text search over form remarks and review comments
+        st.subheader("🔎 Search Remarks")
+        search_text = st.text_input("Search remarks and review comments", key="remarks_search",
+                                    placeholder="e.g. pump failure, site not accessible")
+        if search_text:
+            try:
+                remarks_index = get_remarks_index()
+                # Only saved reports; queued local writes are indexed once they reach Firestore
+                remarks_index.update([r for r in all_reports if not r.get('pending_sync')], remark_fields(get_active_schema()))
+                started = time.perf_counter()
+                matches = remarks_index.search(search_text, None if selected_state == "All" else scope_districts)
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if matches:
+                    results_df = pd.DataFrame(matches)
+                    results_df['Period'] = [datetime(int(y), int(m), 1).strftime('%b %Y')
+                                            for y, m in zip(results_df['year'], results_df['month'])]
+                    results_df = results_df.rename(columns={'district': 'District', 'field': 'Field',
+                                                            'status': 'Status', 'snippet': 'Match'})
+                    st.dataframe(results_df[['District', 'Period', 'Field', 'Status', 'Match']],
+                                 use_container_width=True, hide_index=True)
+                    st.caption(f"{len(matches)} matches in {elapsed_ms:.1f} ms · "
+                               f"{remarks_index.entry_count()} remarks indexed")
+                else:
+                    st.info(f"No remarks match '{search_text}'")
+            except Exception as e:
+                st.error(f"Error searching remarks: {e}")
     
     # ===== TAB 2: USER MANAGEMENT =====
     with tab2:
@@ -914,7 +1046,7 @@ def state_admin_dashboard():
                 new_email = st.text_input("Email")
                 new_password = st.text_input("Password", type="password")
             with col2:
-                new_district = st.selectbox("Assign District", DISTRICTS)
+                new_district = st.selectbox("Assign District", registry.district_names())
                 new_role = st.selectbox("Role", ["district_user", "state_admin"])
             
             if st.button("Create User", type="primary"):
@@ -927,12 +1059,95 @@ def state_admin_dashboard():
                 else:
                     st.warning("Please fill all fields")
         
+        # State -> district -> block hierarchy
+        with st.expander("🏢 Organisation Units"):
+            unit_action = st.radio("Action", ["Add", "Rename"], horizontal=True, key="unit_action")
+            col1, col2 = st.columns(2)
+            with col1:
+                unit_level = st.selectbox("Level", LEVELS, key="unit_level")
+                unit_name = st.text_input("New name" if unit_action == "Rename" else "Name", key="unit_name")
+            with col2:
+                parent_level = PARENT_LEVEL.get(unit_level)
+                if unit_action == "Rename":
+                    unit_current = st.selectbox(f"{unit_level.title()} to rename", registry.unit_names(unit_level),
+                                                key="unit_current")
+                elif parent_level:
+                    parent_options = {
+                        'state': registry.states(),
+                        'district': registry.district_names(),
+                    }.get(parent_level, [])
+                    unit_parent = st.selectbox(f"Parent {parent_level}", parent_options, key="unit_parent")
+            if unit_action == "Rename" and unit_level == 'district':
+                st.caption("⚠️ Reports and users refer to districts by name and keep the old name")
+            
+            if st.button("Save Unit"):
+                unit_name = unit_name.strip()
+                if not unit_name:
+                    st.warning("Please enter a name")
+                elif registry.unit_id(unit_level, unit_name):
+                    st.error(f"A {unit_level} named '{unit_name}' already exists")
+                elif unit_action == "Rename" and not unit_current:
+                    st.warning(f"No {unit_level} to rename")
+                else:
+                    if unit_action == "Rename":
+                        unit_id = registry.unit_id(unit_level, unit_current)
+                        parent_id = registry.units[unit_id].get('parent_id')
+                    else:
+                        parent_id = registry.unit_id(parent_level, unit_parent) if parent_level else None
+                        unit_id = registry.new_unit_id(unit_name, parent_id)
+                    success, message = save_org_unit(unit_id, unit_name, unit_level, parent_id)
+                    if success:
+                        st.success(message)
+                        st.rerun()
+                    else:
+                        st.error(message)
+            
+            st.caption(f"{len(registry.states())} states · {len(registry.district_names())} districts")
+        
+        # Versioned form schema; publishing a new version needs no redeploy
+        with st.expander("🧩 Form Schema"):
+            schemas = get_schema_registry()
+            st.caption(f"Active version: {schemas.active.version}")
+            st.dataframe(pd.DataFrame([{
+                'Version': schema.version,
+                'Categories': len(schema.categories),
+                'Fields': len(schema.field_keys),
+                'Renamed Fields': len(schema.renamed),
+            } for schema in schemas.versions.values()]).sort_values('Version'), use_container_width=True, hide_index=True)
+            
+            schema_json = st.text_area(
+                "Categories (JSON)",
+                json.dumps(categories_to_list(schemas.active.categories), indent=2, ensure_ascii=False),
+                height=300, key="schema_json"
+            )
+            renamed_text = st.text_area(
+                "Renamed fields (one 'old_key -> new_key' per line)", key="schema_renamed",
+                help="Data keys are '<Category>_<field id>'. Reports saved with the old key are shown under the new one."
+            )
+            
+            if st.button("Publish New Version"):
+                try:
+                    new_categories = categories_from_list(json.loads(schema_json))
+                    renamed = dict(
+                        (part.strip() for part in line.split('->', 1))
+                        for line in renamed_text.splitlines() if '->' in line
+                    )
+                except Exception as e:
+                    st.error(f"Invalid schema: {e}")
+                else:
+                    success, message = publish_schema(new_categories, renamed, st.session_state.user_id)
+                    if success:
+                        st.success(message)
+                        st.rerun()
+                    else:
+                        st.error(message)
+        
         # View existing users
         st.subheader("Existing Users")
         
         try:
             users_ref = db.collection('users')
-            users = users_ref.get()
+            users = users_ref.get(**firestore_call_options())
             
             user_list = []
             for user in users:
@@ -958,17 +1173,27 @@ def state_admin_dashboard():
                             options=["Yes", "No"]
                         )
                     },
+                    # Role and district are fixed at creation; they are also the user's token claims
+                    disabled=['ID', 'Email', 'District', 'Role'],
                     use_container_width=True
                 )
                 
                 if st.button("Update Users"):
-                    for index, row in edited_df.iterrows():
-                        user_ref = users_ref.document(row['ID'])
-                        user_ref.update({
-                            'is_active': row['Status'] == 'Active',
-                            'can_edit': row['Can Edit'] == 'Yes'
-                        })
-                    st.success("User permissions updated!")
+                    # Only rows whose permissions changed
+                    changed = edited_df[(edited_df['Status'] != users_df['Status']) |
+                                        (edited_df['Can Edit'] != users_df['Can Edit'])]
+                    failures = []
+                    for _, row in changed.iterrows():
+                        success, message = update_user_permissions(
+                            row['ID'], row['Role'], row['District'],
+                            row['Status'] == 'Active', row['Can Edit'] == 'Yes'
+                        )
+                        if not success:
+                            failures.append(message)
+                    if failures:
+                        st.error("\n".join(failures))
+                    else:
+                        st.success(f"Permissions updated for {len(changed)} user(s)")
             else:
                 st.info("No users found")
                 
@@ -992,25 +1217,85 @@ def state_admin_dashboard():
                                          key="approval_month")
         
         # Get pending submissions
-        all_data = get_all_districts_data(approval_year, approval_month)
-        pending_data = [d for d in all_data if d.get('status') == 'submitted']
+        pending_data = [
+            d for d in all_reports
+            if d.get('year') == approval_year and d.get('month') == approval_month and d.get('status') == 'submitted'
+        ]
         
         if not pending_data:
             st.success("✅ No pending submissions for this period")
         else:
-            st.info(f"📋 {len(pending_data)} submissions pending approval")
+            # Score every pending submission against district history and the state-wide distribution
+            anomaly_summary, anomaly_flags = score_submissions(
+                analytics_df[analytics_df['status'] == 'approved'],
+                build_analytics_frame(pending_data),
+                categories=form_categories
+            )
+            scores = anomaly_summary.set_index('district')
+            pending_data.sort(key=lambda d: scores['anomaly_score'].get(d['district'], 0), reverse=True)
+            # Only submissions that were scored and came out normal; unscored ones need a human look
+            unflagged = [d for d in pending_data if scores['scored'].get(d['district'], False)
+                         and scores['flag_count'].get(d['district'], 0) == 0]
+            
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.info(f"📋 {len(pending_data)} submissions pending approval, "
+                        f"{len(pending_data) - len(unflagged)} flagged or unscored for review")
+            with col2:
+                if unflagged and st.button(f"✅ Approve {len(unflagged)} unflagged", use_container_width=True):
+                    failures = []
+                    for entry in unflagged:
+                        success, message = update_data_status(
+                            f"{entry['district']}_{entry['year']}_{entry['month']:02d}",
+                            "approved", "Approved by State Admin"
+                        )
+                        if not success:
+                            failures.append(f"{entry['district']}: {message}")
+                    if failures:
+                        # No rerun, so the errors stay on screen
+                        st.error(f"Approved {len(unflagged) - len(failures)} of {len(unflagged)} submissions\n\n"
+                                 + "\n\n".join(failures))
+                    else:
+                        st.success(f"Approved {len(unflagged)} submissions")
+                        st.rerun()
+            
+            only_flagged = st.checkbox("Show only flagged submissions", value=False)
+            
+            # Previous month and same month last year for every pending district, in one batch
+            (prev_year, prev_month), (ly_year, ly_month) = comparison_periods(approval_year, approval_month)
+            context = get_reports_by_ids(
+                [report_doc_id(d['district'], prev_year, prev_month) for d in pending_data] +
+                [report_doc_id(d['district'], ly_year, ly_month) for d in pending_data]
+            )
+            prev_label = datetime(prev_year, prev_month, 1).strftime('%b %Y')
+            ly_label = datetime(ly_year, ly_month, 1).strftime('%b %Y')
             
             for entry in pending_data:
+                entry_id = report_doc_id(entry['district'], entry['year'], entry['month'])
+                flag_count = int(scores['flag_count'].get(entry['district'], 0))
+                scored = bool(scores['scored'].get(entry['district'], False))
+                if only_flagged and flag_count == 0 and scored:
+                    continue
+                
                 with st.container(border=True):
                     col1, col2, col3 = st.columns([3, 1, 1])
                     with col1:
                         st.subheader(f"{entry['district']} - {datetime(entry['year'], entry['month'], 1).strftime('%B %Y')}")
                         st.caption(f"Submitted on: {entry.get('submitted_at', 'N/A')}")
+                        if flag_count:
+                            st.warning(
+                                f"⚠️ {flag_count} unusual field(s), anomaly score "
+                                f"{scores['anomaly_score'].get(entry['district'], 0):.1f}"
+                            )
+                        elif not scored:
+                            st.warning("⚠️ Not enough history to score, review manually")
+                        else:
+                            st.caption("✔️ Within normal range")
                     
                     with col2:
                         # Quick view button
                         if st.button(f"👁️ View", key=f"view_{entry['district']}"):
-                            st.session_state.view_entry = entry
+                            st.session_state.view_entry_id = entry_id
                     
                     with col3:
                         # Action buttons
@@ -1042,43 +1327,43 @@ def state_admin_dashboard():
                                         st.rerun()
                     
                     # Show entry details if viewing
-                    if st.session_state.get('view_entry') == entry:
+                    if st.session_state.get('view_entry_id') == entry_id:
                         st.divider()
-                        st.json(entry.get('data', {}))
+                        entry_flags = anomaly_flags[anomaly_flags['district'] == entry['district']]
+                        if not entry_flags.empty:
+                            st.dataframe(
+                                entry_flags.drop(columns=['district', 'year', 'month']),
+                                use_container_width=True, hide_index=True
+                            )
+                        comparison = build_review_comparison(
+                            entry,
+                            context.get(report_doc_id(entry['district'], prev_year, prev_month)),
+                            context.get(report_doc_id(entry['district'], ly_year, ly_month)),
+                            form_categories
+                        )
+                        st.dataframe(
+                            comparison.rename(columns={
+                                'Previous Month': prev_label, 'Δ Prev': f"Δ {prev_label}", 'Δ Prev %': f"Δ% {prev_label}",
+                                'Last Year': ly_label, 'Δ LY': f"Δ {ly_label}", 'Δ LY %': f"Δ% {ly_label}",
+                            }),
+                            use_container_width=True, hide_index=True
+                        )
+                        show_report_history(report_doc_id(entry['district'], entry['year'], entry['month']))
     
     # ===== TAB 4: ANALYTICS =====
     with tab4:
         st.header("Data Analytics")
         
         # Get all approved data
-        all_data = get_all_districts_data()
-        approved_data = [d for d in all_data if d.get('status') == 'approved']
+        df = analytics_df[analytics_df['status'] == 'approved'].drop(columns='status')
         
-        if not approved_data:
+        if df.empty:
             st.info("No approved data available for analysis")
         else:
-            # Convert to DataFrame
-            analysis_rows = []
-            for entry in approved_data:
-                row = {
-                    'district': entry['district'],
-                    'year': entry['year'],
-                    'month': entry['month'],
-                    'month_year': f"{entry['year']}-{entry['month']:02d}"
-                }
-                
-                # Add all numeric fields
-                for key, value in entry.get('data', {}).items():
-                    if isinstance(value, (int, float)):
-                        row[key] = value
-                
-                analysis_rows.append(row)
-            
-            df = pd.DataFrame(analysis_rows)
-            
             # Analysis options
             analysis_type = st.selectbox("Select Analysis", 
-                                        ["District Comparison", "Monthly Trends", "Category Performance"])
+                                        ["District Comparison", "Monthly Trends", "Category Performance",
+                                         "Groundwater Levels", "District Map"])
             
             if analysis_type == "District Comparison":
                 st.subheader("District-wise Comparison")
@@ -1087,9 +1372,13 @@ def state_admin_dashboard():
                 numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
                 metric = st.selectbox("Select Metric", numeric_cols)
                 
+                group_by = 'state' if len(registry.states()) > 1 and st.radio(
+                    "Level", ["District", "State"], horizontal=True, key="comparison_level"
+                ) == "State" else 'district'
+                
                 if metric:
-                    # Group by district
-                    district_stats = df.groupby('district')[metric].agg(['sum', 'mean', 'max']).round(2)
+                    # Group by district (or roll up to state)
+                    district_stats = df.groupby(group_by)[metric].agg(['sum', 'mean', 'max']).round(2)
                     district_stats = district_stats.sort_values('sum', ascending=False)
                     
                     col1, col2 = st.columns(2)
@@ -1099,8 +1388,8 @@ def state_admin_dashboard():
                     
                     with col2:
                         fig = px.bar(district_stats.reset_index(), 
-                                    x='district', y='sum',
-                                    title=f"Total {metric} by District")
+                                    x=group_by, y='sum',
+                                    title=f"Total {metric} by {group_by.title()}")
                         st.plotly_chart(fig, use_container_width=True)
             
             elif analysis_type == "Monthly Trends":
@@ -1124,10 +1413,10 @@ def state_admin_dashboard():
                 
                 # Aggregate by category
                 category_data = []
-                for category in MONTHLY_CATEGORIES.keys():
+                for category in form_categories.keys():
                     # Find main numeric field for each category
                     main_field = None
-                    for field in MONTHLY_CATEGORIES[category]['fields']:
+                    for field in form_categories[category]['fields']:
                         col_name = f"{category}_{field['id']}"
                         if col_name in df.columns:
                             main_field = col_name
@@ -1147,6 +1436,110 @@ def state_admin_dashboard():
                     fig = px.pie(cat_df, values='Total', names='Category',
                                 title="Contribution by Category")
                     st.plotly_chart(fig, use_container_width=True)
+            
+            elif analysis_type == "Groundwater Levels":
+                st.subheader("💧 Groundwater Levels")
+                st.caption("Depth to water below ground level (m); a rising depth means a falling water table")
+                
+                water = load_water_level_analysis(data_version(all_reports), analytics_df)
+                levels, trends = water['levels'], water['trends']
+                if levels.empty:
+                    st.info("No approved water level readings yet")
+                else:
+                    # Long-term trend of every district
+                    col1, col2, col3 = st.columns(3)
+                    col1.metric("Declining Districts", int((trends['status'] == 'Declining').sum()))
+                    col2.metric("Rising Districts", int((trends['status'] == 'Rising').sum()))
+                    col3.metric("Readings", int(levels.notna().sum().sum()))
+                    st.write("#### Long-term Trend (deseasonalised, m/year)")
+                    st.dataframe(trends, use_container_width=True, hide_index=True)
+                    
+                    # Pre- vs post-monsoon
+                    fluctuation = water['fluctuation']
+                    if not fluctuation.empty:
+                        pre_label = "/".join(datetime(2024, m, 1).strftime('%b') for m in PRE_MONSOON_MONTHS)
+                        post_label = "/".join(datetime(2024, m, 1).strftime('%b') for m in POST_MONSOON_MONTHS)
+                        st.write(f"#### Pre-monsoon ({pre_label}) vs Post-monsoon ({post_label})")
+                        fluctuation_years = sorted(fluctuation['year'].unique(), reverse=True)
+                        fluctuation_year = st.selectbox("Year", fluctuation_years, key="fluctuation_year")
+                        year_fluctuation = fluctuation[fluctuation['year'] == fluctuation_year]
+                        fig = px.bar(
+                            year_fluctuation.melt(id_vars='district', value_vars=['pre_monsoon', 'post_monsoon'],
+                                                  var_name='Season', value_name='Depth (m)'),
+                            x='district', y='Depth (m)', color='Season', barmode='group',
+                            title=f"Seasonal Water Levels {fluctuation_year}"
+                        )
+                        st.plotly_chart(fig, use_container_width=True)
+                        st.dataframe(year_fluctuation.drop(columns='year'), use_container_width=True, hide_index=True)
+                    
+                    # Decomposition of one district
+                    st.write("#### Seasonal Decomposition")
+                    water_district = st.selectbox("District", list(levels.columns), key="water_district")
+                    dates = levels.index.to_timestamp()
+                    components = pd.DataFrame({
+                        'Observed': levels[water_district].to_numpy(),
+                        'Trend': water['trend'][water_district].to_numpy(),
+                        'Trend + Seasonal': (water['trend'][water_district] + water['seasonal'][water_district]).to_numpy(),
+                    }, index=dates)
+                    fig = px.line(components, title=f"Water Level - {water_district}",
+                                  labels={'index': 'Month', 'value': 'Depth (m)', 'variable': ''})
+                    fig.update_yaxes(autorange="reversed")
+                    st.plotly_chart(fig, use_container_width=True)
+            
+            elif analysis_type == "District Map":
+                st.subheader("🗺️ District Map")
+                
+                district_map = get_district_map()
+                if district_map is None:
+                    st.info("No district boundaries bundled (geo/districts.geojson)")
+                else:
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        color_by = st.radio("Colour by", ["Metric", "Submission Status"], horizontal=True, key="map_color_by")
+                    with col2:
+                        map_years = sorted(analytics_df['year'].dropna().astype(int).unique(), reverse=True) or [datetime.now().year]
+                        map_year = st.selectbox("Year", map_years, key="map_year")
+                    with col3:
+                        month_options = list(range(1, 13)) if color_by == "Submission Status" else [0] + list(range(1, 13))
+                        map_month = st.selectbox(
+                            "Month", month_options, key="map_month",
+                            format_func=lambda x: "All months" if x == 0 else datetime(2024, x, 1).strftime('%B')
+                        )
+                    
+                    if color_by == "Submission Status":
+                        map_districts = tuple(scope_districts)
+                        codes, _ = load_status_matrix(map_year, map_districts)
+                        statuses = pd.Series(codes[:, map_month - 1], index=list(map_districts))
+                        fig = district_map.figure(
+                            statuses,
+                            f"Submission Status - {datetime(map_year, map_month, 1).strftime('%B %Y')}",
+                            colorscale=discrete_colorscale(STATUS_COLORS),
+                            zmin=-0.5, zmax=len(STATUS_COLORS) - 0.5,
+                            colorbar={'tickvals': list(range(len(STATUS_LABELS))), 'ticktext': STATUS_LABELS},
+                            hover=statuses.reindex(district_map.districts).map(
+                                lambda code: STATUS_LABELS[int(code)] if pd.notna(code) else "Not in registry"
+                            ),
+                        )
+                    else:
+                        schema = get_active_schema()
+                        map_metrics = [key for key in schema.numeric_keys if key in df.columns]
+                        map_metric = st.selectbox("Metric", map_metrics, key="map_metric")
+                        period_rows = df[df['year'] == map_year]
+                        if map_month:
+                            period_rows = period_rows[period_rows['month'] == map_month]
+                        # Counts and amounts add up over months; levels and depths are averaged
+                        cumulative = schema.fields[map_metric].get('unit') in CUMULATIVE_UNITS
+                        values = period_rows.groupby('district')[map_metric].agg('sum' if cumulative else 'mean')
+                        period_label = str(map_year) if not map_month else datetime(map_year, map_month, 1).strftime('%B %Y')
+                        fig = district_map.figure(
+                            values, f"{map_metric} - {period_label}",
+                            hover=values.reindex(district_map.districts).map(
+                                lambda v: f"{v:,.2f}" if pd.notna(v) else "No approved data"
+                            ),
+                        )
+                    st.plotly_chart(fig, use_container_width=True)
+                    st.caption(f"Boundaries simplified once per server start: {district_map.positions_before:,} → "
+                               f"{district_map.positions_after:,} points")
     
     # ===== TAB 5: REPORTS =====
     with tab5:
@@ -1167,58 +1560,62 @@ def state_admin_dashboard():
         report_type = st.radio("Report Type", 
                               ["State Consolidated Report", "District-wise Report"])
         
+        selected_district = None
         if report_type == "District-wise Report":
-            selected_district = st.selectbox("Select District", DISTRICTS)
+            selected_district = st.selectbox("Select District", registry.district_names() + [ALL_DISTRICTS_ZIP])
         
         # Generate report
-        if st.button("📄 Generate Report"):
-            with st.spinner("Generating report..."):
-                # Get data
+        generate = st.button("📄 Generate Report")
+        
+        if generate and selected_district == ALL_DISTRICTS_ZIP:
+            with st.spinner("Generating district workbooks..."):
+                # One fetch for the month, then one workbook per district in worker processes
                 data = get_all_districts_data(report_year, report_month)
                 approved_data = [d for d in data if d.get('status') == 'approved']
                 
+                if not approved_data:
+                    st.warning("No approved data available for this period")
+                else:
+                    folder_name = f"GWD_Report_{report_year}_{report_month:02d}"
+                    zip_bytes = build_district_workbooks_zip(
+                        approved_data, folder_name, executor=get_report_process_pool(),
+                        categories=form_categories
+                    )
+                    district_count = len(set(d['district'] for d in approved_data))
+                    st.success(f"Generated {district_count} district workbooks")
+                    st.download_button(
+                        label="📥 Download All Districts (ZIP)",
+                        data=zip_bytes,
+                        file_name=f"{folder_name}_districts.zip",
+                        mime="application/zip"
+                    )
+        
+        elif generate:
+            with st.spinner("Generating report..."):
+                # Get data for the whole year so the PDF can show the trend up to this month
+                if selected_district:
+                    year_data = [d for d in get_district_data(selected_district) if d.get('year') == report_year]
+                else:
+                    year_data = get_all_districts_data(report_year)
+                year_approved = [d for d in year_data if d.get('status') == 'approved']
+                approved_data = [d for d in year_approved if d.get('month') == report_month]
+                
                 if not approved_data:
                     st.warning("No approved data available for this period")
                 else:
                     # Create summary DataFrame
-                    summary_rows = []
-                    for entry in approved_data:
-                        row = {'District': entry['district']}
-                        
-                        # Add key metrics from each category
-                        for category in MONTHLY_CATEGORIES.keys():
-                            # Get first numeric field as representative
-                            for field in MONTHLY_CATEGORIES[category]['fields']:
-                                col_name = f"{category}_{field['id']}"
-                                value = entry.get('data', {}).get(col_name, 0)
-                                if isinstance(value, (int, float)):
-                                    row[category] = value
-                                    break
-                        
-                        summary_rows.append(row)
-                    
-                    summary_df = pd.DataFrame(summary_rows)
+                    summary_df = build_summary_frame(approved_data, form_categories)
+                    kpis = compute_kpis(approved_data, summary_df)
+                    period_label = datetime(report_year, report_month, 1).strftime('%B %Y')
                     
                     # Display report
-                    st.subheader(f"Monthly Progress Report - {datetime(report_year, report_month, 1).strftime('%B %Y')}")
+                    st.subheader(f"Monthly Progress Report - {period_label}")
                     
                     # Summary statistics
                     st.write("### Summary Statistics")
-                    col1, col2, col3, col4 = st.columns(4)
-                    
-                    with col1:
-                        st.metric("Districts Reported", len(approved_data))
-                    with col2:
-                        total_surveys = summary_df.get('Surveys & Investigations', pd.Series([0])).sum()
-                        st.metric("Total Surveys", int(total_surveys))
-                    with col3:
-                        total_borewells = summary_df.get('Drilling Works', pd.Series([0])).sum()
-                        st.metric("Borewells Drilled", int(total_borewells))
-                    with col4:
-                        total_expenditure = sum([d.get('data', {}).get('Drilling Works_drilling_expenditure', 0) + 
-                                                d.get('data', {}).get('Recharge Structures_recharge_expenditure', 0) 
-                                                for d in approved_data])
-                        st.metric("Total Expenditure", f"₹{total_expenditure:,.0f}")
+                    kpi_cols = st.columns(len(kpis))
+                    for kpi_col, (label, value) in zip(kpi_cols, kpis.items()):
+                        kpi_col.metric(label, value)
                     
                     # Detailed table
                     st.write("### Detailed District Data")
@@ -1228,42 +1625,44 @@ def state_admin_dashboard():
                     st.divider()
                     col1, col2 = st.columns(2)
                     
+                    # Start the PDF render first so it runs while the Excel file is built
+                    version = data_version(year_approved)
+                    pdf_future = get_report_render_pool().submit(
+                        (report_year, report_month, report_type, selected_district, version),
+                        render_report_pdf,
+                        report_type, selected_district, period_label,
+                        kpis, summary_df, build_trend_frame(year_approved, report_year, report_month)
+                    )
+                    
+                    suffix = f"_{selected_district.replace(' ', '_')}" if selected_district else ""
+                    
                     with col1:
                         # Export to Excel
-                        excel_buffer = io.BytesIO()
-                        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                            summary_df.to_excel(writer, sheet_name='Summary', index=False)
-                            
-                            # Add raw data sheet
-                            raw_data = []
-                            for entry in approved_data:
-                                raw_row = {
-                                    'District': entry['district'],
-                                    'Month': entry['month'],
-                                    'Year': entry['year']
-                                }
-                                raw_row.update(entry.get('data', {}))
-                                raw_data.append(raw_row)
-                            
-                            raw_df = pd.DataFrame(raw_data)
-                            raw_df.to_excel(writer, sheet_name='Raw Data', index=False)
-                        
-                        excel_buffer.seek(0)
+                        excel_bytes = build_excel_report(summary_df, build_raw_frame(approved_data))
                         
                         st.download_button(
                             label="📥 Download Excel Report",
-                            data=excel_buffer,
-                            file_name=f"GWD_Report_{report_year}_{report_month:02d}.xlsx",
+                            data=excel_bytes,
+                            file_name=f"GWD_Report_{report_year}_{report_month:02d}{suffix}.xlsx",
                             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                         )
                     
                     with col2:
-                        # Generate PDF (simplified)
-                        if st.button("📥 Generate PDF Report"):
-                            st.info("PDF generation would be implemented with ReportLab or similar library")
+                        try:
+                            pdf_bytes = pdf_future.result(timeout=120)
+                            st.download_button(
+                                label="📥 Download PDF Report",
+                                data=pdf_bytes,
+                                file_name=f"GWD_Report_{report_year}_{report_month:02d}{suffix}.pdf",
+                                mime="application/pdf"
+                            )
+                        except Exception as e:
+                            st.error(f"Error generating PDF: {e}")
 
 # ==================== MAIN APP ROUTING ====================
 def main():
+    if st.session_state.authenticated and not validate_session():
+        st.warning("Your session has expired. Please log in again.")
     if not st.session_state.authenticated:
         login_page()
     else:
@@ -1271,6 +1670,7 @@ def main():
             state_admin_dashboard()
         else:
             district_dashboard()
+        record_session_footprint(st.session_state)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
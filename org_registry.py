@@ -0,0 +1,165 @@
+# org_registry.py
+import logging
+
+import pandas as pd
+import streamlit as st
+from google.api_core.exceptions import AlreadyExists
+
+from firebase_config import get_firestore_client, firestore_call_options
+from form_schema import DISTRICTS
+from resilience import resilient
+
+logger = logging.getLogger(__name__)
+
+LEVELS = ['state', 'district', 'block']
+PARENT_LEVEL = {'district': 'state', 'block': 'district'}
+# State used when no registry has been set up in Firestore yet
+DEFAULT_STATE = "State"
+
+
+def default_units():
+    """Single state holding the built-in DISTRICTS list"""
+    units = [{'id': 'state', 'name': DEFAULT_STATE, 'level': 'state', 'parent_id': None, 'order': 0}]
+    units += [{'id': f"district_{i + 1}", 'name': name, 'level': 'district', 'parent_id': 'state', 'order': i}
+              for i, name in enumerate(DISTRICTS)]
+    return units
+
+
+class OrgRegistry:
+    """State -> district -> block hierarchy with indexed lookups by ID and by name.
+
+    Reports refer to districts by name, so district names must be unique across states.
+    """
+
+    def __init__(self, units):
+        self.units = {}
+        self._children = {}
+        for unit in units:
+            if unit.get('level') not in LEVELS or not unit.get('active', True):
+                continue
+            self.units[unit['id']] = unit
+            self._children.setdefault(unit.get('parent_id'), []).append(unit['id'])
+        # Explicit 'order' first, then alphabetical
+        for ids in self._children.values():
+            ids.sort(key=lambda i: (self.units[i].get('order', float('inf')), self.units[i]['name']))
+
+        self._by_name = {level: {} for level in LEVELS}
+        for unit_id, unit in self.units.items():
+            names = self._by_name[unit['level']]
+            if unit['name'] in names:
+                logger.warning("Duplicate %s name in org registry: %s", unit['level'], unit['name'])
+            names.setdefault(unit['name'], unit_id)
+
+        # District -> state lookup table used by every roll-up
+        districts = [u for u in self.units.values() if u['level'] == 'district']
+        self.district_frame = pd.DataFrame({
+            'district': [u['name'] for u in districts],
+            'state': [self.units.get(u.get('parent_id'), {}).get('name', DEFAULT_STATE) for u in districts],
+        }).set_index('district')
+
+    def _names(self, ids):
+        return [self.units[i]['name'] for i in ids]
+
+    def _children_at(self, level, parent_id):
+        return [i for i in self._children.get(parent_id, []) if self.units[i]['level'] == level]
+
+    def unit_id(self, level, name):
+        return self._by_name[level].get(name)
+
+    def unit_names(self, level):
+        return sorted(self._by_name[level])
+
+    def new_unit_id(self, name, parent_id=None):
+        """Unused document ID for a new unit, derived from its parent and name"""
+        base = (f"{parent_id}.{name}" if parent_id else name).lower().replace(' ', '_')
+        unit_id, n = base, 2
+        while unit_id in self.units:
+            unit_id, n = f"{base}_{n}", n + 1
+        return unit_id
+
+    def states(self):
+        return self._names(self._children_at('state', None))
+
+    def district_names(self, state=None):
+        """Districts of one state, or of every state in registry order"""
+        if state is not None:
+            state_id = self._by_name['state'].get(state)
+            return self._names(self._children_at('district', state_id)) if state_id else []
+        return [name for s in self.states() for name in self.district_names(s)]
+
+    def blocks(self, district):
+        district_id = self._by_name['district'].get(district)
+        return self._names(self._children_at('block', district_id)) if district_id else []
+
+    def state_of(self, district):
+        return self.district_frame['state'].get(district)
+
+    def state_column(self, districts):
+        """State of each district in a Series (vectorised lookup)"""
+        return districts.map(self.district_frame['state'])
+
+    def rollup(self, df, values, agg='sum', district_col='district'):
+        """Aggregate district-level rows up to states"""
+        return df.assign(state=self.state_column(df[district_col])).groupby('state')[values].agg(agg)
+
+
+# ==================== FIRESTORE ====================
+@resilient("get_org_units")
+def _fetch_org_units():
+    docs = get_firestore_client().collection('org_units').get(**firestore_call_options(retry=False))
+    return [dict(doc.to_dict(), id=doc.id) for doc in docs]
+
+
+def load_org_units():
+    """Every unit in the org_units collection (empty in demo mode or on error)"""
+    if get_firestore_client() is None:
+        return []
+    try:
+        return _fetch_org_units()
+    except Exception as e:
+        logger.warning("Could not load org registry: %s", e)
+        return []
+
+
+def save_org_unit(unit_id, name, level, parent_id=None):
+    """Create or rename a state, district or block"""
+    db = get_firestore_client()
+    if db is None:
+        return False, "Firestore not connected (db is None)"
+    if level not in LEVELS:
+        return False, f"Unknown level: {level}"
+    if level in PARENT_LEVEL and not parent_id:
+        return False, f"A {level} needs a parent {PARENT_LEVEL[level]}"
+    try:
+        units_ref = db.collection('org_units')
+        # Read directly, not via load_org_units(): a failed read must not look like an empty registry
+        if not _fetch_org_units():
+            # First edit: store the built-in districts so they stay in the registry.
+            # create() never overwrites a unit another admin stored in the meantime
+            for unit in default_units():
+                try:
+                    units_ref.document(unit['id']).create(dict(unit, active=True), **firestore_call_options())
+                except AlreadyExists:
+                    pass
+        # Merged so a rename keeps the unit's other fields, such as its order
+        units_ref.document(unit_id).set({
+            'name': name,
+            'level': level,
+            'parent_id': parent_id,
+            'active': True,
+        }, merge=True, **firestore_call_options())
+        get_org_registry.clear()
+        return True, f"{level.title()} '{name}' saved"
+    except Exception as e:
+        return False, f"Error saving unit: {str(e)}"
+
+
+def build_registry(units):
+    """Registry from Firestore org units, or the built-in district list if there are none"""
+    return OrgRegistry(units or default_units())
+
+
+@st.cache_resource(ttl=600, show_spinner=False)
+def get_org_registry():
+    """Registry shared by all sessions, reloaded from Firestore every 10 minutes"""
+    return build_registry(load_org_units())
@@ -0,0 +1,152 @@
+# data_export
+import os
+import tempfile
+import streamlit as st
+from datetime import datetime
+from firebase_config import initialize_firebase
+from org_registry import get_org_registry
+from schema_registry import get_schema_registry
+from data_store import save_monthly_data_batch, get_existing_report_ids, report_doc_id, iter_all_reports
+from report_export import EXPORT_WRITERS, EXPORT_DIR, iter_report_frames, remove_stale_exports
+from data_import import import_template, read_import_file, validate_import_frame, frame_to_reports
+
+# Initialize Firebase
+try:
+    initialize_firebase()
+except:
+    st.warning("Firebase not initialized. Running in demo mode.")
+
+if not st.session_state.get('authenticated'):
+    st.warning("Please log in from the main page first.")
+    st.stop()
+
+is_admin = st.session_state.user_role == "state_admin"
+schema_registry = get_schema_registry()
+categories = schema_registry.active.categories
+
+st.title("📦 Data Import & Export")
+
+# ==================== IMPORT ====================
+st.header("Bulk Import")
+st.caption(
+    "Upload a CSV or Excel file with one row per district and month. "
+    "Columns are District, Year, Month and one column per form field "
+    "(the same layout as the Raw Data sheet of the Excel report)."
+)
+
+st.download_button(
+    "📄 Download Import Template",
+    data=import_template(categories).to_csv(index=False).encode("utf-8"),
+    file_name="GWD_Import_Template.csv",
+    mime="text/csv"
+)
+
+uploaded = st.file_uploader("Upload file", type=["csv", "xlsx"])
+
+if uploaded is not None:
+    try:
+        raw_df = read_import_file(uploaded)
+    except Exception as e:
+        st.error(f"Could not read file: {e}")
+        st.stop()
+
+    allowed = get_org_registry().district_names() if is_admin else [st.session_state.user_district]
+    clean_df, errors_df = validate_import_frame(raw_df, allowed_districts=allowed, categories=categories)
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Rows in File", len(raw_df))
+    col2.metric("Valid Rows", len(clean_df))
+    col3.metric("Rows with Errors", errors_df['Row'].nunique())
+
+    if not errors_df.empty:
+        with st.expander(f"⚠️ {len(errors_df)} validation errors", expanded=True):
+            st.dataframe(errors_df, use_container_width=True, hide_index=True)
+
+    if not clean_df.empty:
+        with st.expander("Preview valid rows"):
+            st.dataframe(clean_df.head(100), use_container_width=True)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            status_options = ["draft", "submitted", "approved"] if is_admin else ["draft", "submitted"]
+            import_status = st.selectbox("Import as status", status_options)
+        with col2:
+            overwrite = st.checkbox("Overwrite reports that already exist", value=False)
+
+        if st.button("📥 Import Valid Rows", type="primary"):
+            with st.spinner("Importing..."):
+                reports = frame_to_reports(clean_df, categories)
+
+                if not overwrite:
+                    existing = get_existing_report_ids(
+                        [report_doc_id(district, year, month) for district, month, year, _ in reports]
+                    )
+                    reports = [r for r in reports if report_doc_id(r[0], r[2], r[1]) not in existing]
+                    if existing:
+                        st.info(f"Skipped {len(existing)} months that already have a report")
+
+                if reports:
+                    success, message = save_monthly_data_batch(reports, status=import_status)
+                    if success:
+                        st.success(message)
+                    else:
+                        st.error(message)
+                else:
+                    st.warning("Nothing to import")
+
+# ==================== EXPORT ====================
+st.divider()
+st.header("Full History Export")
+st.caption("Streams every report page by page into a file on the server, so years of data export without loading it all at once.")
+remove_stale_exports()
+
+col1, col2, col3 = st.columns(3)
+with col1:
+    export_format = st.selectbox("Format", list(EXPORT_WRITERS.keys()))
+with col2:
+    years = list(range(2020, datetime.now().year + 1))
+    year_from = st.selectbox("From Year", years, index=0)
+with col3:
+    year_to = st.selectbox("To Year", years, index=len(years) - 1)
+
+if st.button("📤 Export History", type="primary"):
+    writer, extension, _ = EXPORT_WRITERS[export_format]
+    district = None if is_admin else st.session_state.user_district
+
+    # Generator pipeline: Firestore pages -> DataFrame chunks -> file
+    reports = iter_all_reports(district=district, year_from=year_from, year_to=year_to)
+    # Older schema versions are mapped onto the current columns
+    reports = ((doc_id, schema_registry.normalize_report(r)) for doc_id, r in reports)
+
+    previous = st.session_state.get('export_file')
+    if previous and os.path.exists(previous['path']):
+        os.remove(previous['path'])
+
+    with st.spinner("Exporting..."):
+        path = None
+        try:
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            handle, path = tempfile.mkstemp(prefix="gwd_export_", suffix=extension, dir=EXPORT_DIR)
+            with os.fdopen(handle, 'wb') as sink:
+                row_count = writer(iter_report_frames(reports, categories=categories), sink, categories)
+            st.session_state.export_file = {
+                'path': path,
+                'name': f"GWD_Reports_{year_from}_{year_to}{extension}",
+                'format': export_format,
+                'rows': row_count,
+            }
+        except Exception as e:
+            if path and os.path.exists(path):
+                os.remove(path)
+            st.error(f"Export failed: {e}")
+
+export_file = st.session_state.get('export_file')
+if export_file and os.path.exists(export_file['path']):
+    st.success(f"{export_file['rows']} reports exported")
+    with open(export_file['path'], 'rb') as exported:
+        st.download_button(
+            f"📥 Download {export_file['name']}",
+            data=exported,
+            file_name=export_file['name'],
+            mime=EXPORT_WRITERS[export_file['format']][2]
+        )
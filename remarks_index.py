@@ -0,0 +1,153 @@
+# remarks_index.py
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from write_queue import DATA_DIR
+
+REVIEW_REMARKS_FIELD = "review_remarks"
+REVIEW_REMARKS_LABEL = "Review remarks"
+# Re-index this far behind the watermark, like the report mirror, for writes committed out of timestamp order
+WATERMARK_OVERLAP = timedelta(seconds=60)
+# Bumped when the table layout or tokenizer changes; an index built by another version is rebuilt
+INDEX_VERSION = "1"
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def remark_fields(schema):
+    """{data key: label} of the form's free-text remarks fields"""
+    return {
+        f"{category}_{field['id']}": f"{category} remarks"
+        for category, details in schema.categories.items()
+        for field in details['fields']
+        if field['type'] == 'text' and field['id'].endswith('remarks')
+    }
+
+
+def match_expression(text):
+    """FTS5 query matching every word of the search text, the last one as a prefix (search as you type)"""
+    tokens = _TOKEN.findall(text.lower())
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class RemarksIndex:
+    """SQLite FTS5 inverted index of report remarks, updated from reports changed since its watermark"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DATA_DIR, "remarks_index.sqlite3")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value TEXT)")
+            row = conn.execute("SELECT value FROM index_meta WHERE key = 'version'").fetchone()
+            if row is None or row[0] != INDEX_VERSION:
+                conn.execute("DROP TABLE IF EXISTS remarks")
+                conn.execute("DELETE FROM index_meta")
+                conn.execute("INSERT INTO index_meta VALUES ('version', ?)", (INDEX_VERSION,))
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS remarks USING fts5(
+                    text,
+                    doc_id UNINDEXED, district UNINDEXED, year UNINDEXED, month UNINDEXED,
+                    field UNINDEXED, status UNINDEXED,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            """)
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @property
+    def watermark(self):
+        with self._connection() as conn:
+            row = conn.execute("SELECT value FROM index_meta WHERE key = 'watermark'").fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def entry_count(self):
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM remarks").fetchone()[0]
+
+    def update(self, reports, fields):
+        """Re-index the remarks of reports changed since the watermark; returns how many reports were indexed.
+
+        fields is {data key: label}; reports must be normalized to the schema the keys come from.
+        """
+        with self._lock, self._connection() as conn:
+            row = conn.execute("SELECT value FROM index_meta WHERE key = 'watermark'").fetchone()
+            watermark = datetime.fromisoformat(row[0]) if row else None
+            since = watermark - WATERMARK_OVERLAP if watermark is not None else None
+            changed = [
+                report for report in reports
+                if since is None or (isinstance(report.get('last_modified'), datetime) and report['last_modified'] > since)
+            ]
+            if not changed:
+                return 0
+
+            conn.execute("BEGIN")
+            try:
+                for report in changed:
+                    doc_id = f"{report['district']}_{report['year']}_{report['month']:02d}"
+                    conn.execute("DELETE FROM remarks WHERE doc_id = ?", (doc_id,))
+                    texts = [(label, report.get('data', {}).get(key)) for key, label in fields.items()]
+                    texts.append((REVIEW_REMARKS_LABEL, report.get(REVIEW_REMARKS_FIELD)))
+                    conn.executemany(
+                        "INSERT INTO remarks (text, doc_id, district, year, month, field, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(text.strip(), doc_id, report['district'], report['year'], report['month'], label,
+                          report.get('status')) for label, text in texts if isinstance(text, str) and text.strip()]
+                    )
+                    modified = report.get('last_modified')
+                    if isinstance(modified, datetime) and (watermark is None or modified > watermark):
+                        watermark = modified
+                if watermark is not None:
+                    conn.execute("INSERT OR REPLACE INTO index_meta VALUES ('watermark', ?)", (watermark.isoformat(),))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return len(changed)
+
+    def search(self, text, districts=None, limit=100):
+        """Best matches first: dicts with doc_id, district, year, month, field, status and a highlighted snippet"""
+        expression = match_expression(text)
+        if expression is None or (districts is not None and not districts):
+            return []
+        query = """
+            SELECT doc_id, district, year, month, field, status,
+                   snippet(remarks, 0, '[', ']', ' … ', 16)
+            FROM remarks WHERE remarks MATCH ?
+        """
+        params = [expression]
+        if districts is not None:
+            query += f" AND district IN ({', '.join('?' * len(districts))})"
+            params += list(districts)
+        query += " ORDER BY bm25(remarks) LIMIT ?"
+        params.append(limit)
+        with self._connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        columns = ['doc_id', 'district', 'year', 'month', 'field', 'status', 'snippet']
+        return [dict(zip(columns, row)) for row in rows]
+
+
+_remarks_index = None
+_remarks_index_lock = threading.Lock()
+
+
+def get_remarks_index():
+    """Process-wide remarks index in the local data directory"""
+    global _remarks_index
+    with _remarks_index_lock:
+        if _remarks_index is None:
+            _remarks_index = RemarksIndex()
+        return _remarks_index
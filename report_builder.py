@@ -0,0 +1,299 @@
+# report_builder.py
+import io
+import hashlib
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.graphics.shapes import Drawing, String
+from reportlab.graphics.charts.linecharts import HorizontalLineChart
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+
+from form_schema import MONTHLY_CATEGORIES
+
+# Metrics plotted in the PDF trend charts
+TREND_METRICS = {
+    "Surveys Conducted": "Surveys & Investigations_surveys_conducted",
+    "Borewells Completed": "Drilling Works_borewells_completed",
+    "Obs. Wells Monitored": "Monitoring Activities_obs_wells_monitored",
+    "Recharge Structures": "Recharge Structures_recharge_structures",
+}
+
+EXPENDITURE_FIELDS = [
+    "Drilling Works_drilling_expenditure",
+    "Recharge Structures_recharge_expenditure",
+]
+
+
+# ==================== DATA PREPARATION ====================
+def data_version(entries):
+    """Short fingerprint of a set of reports, changes whenever any report changes"""
+    digest = hashlib.sha1()
+    for entry in sorted(entries, key=lambda e: (e.get('district', ''), e.get('year', 0), e.get('month', 0))):
+        digest.update(
+            f"{entry.get('district')}|{entry.get('year')}|{entry.get('month')}|"
+            f"{entry.get('status')}|{entry.get('last_modified')}\n".encode("utf-8")
+        )
+    return digest.hexdigest()[:16]
+
+
+def build_summary_frame(entries, categories=None):
+    """One row per district with the first numeric field of each category"""
+    categories = categories or MONTHLY_CATEGORIES
+    summary_rows = []
+    for entry in entries:
+        row = {'District': entry['district']}
+
+        for category in categories.keys():
+            # Get first numeric field as representative
+            for field in categories[category]['fields']:
+                col_name = f"{category}_{field['id']}"
+                value = entry.get('data', {}).get(col_name, 0)
+                if isinstance(value, (int, float)):
+                    row[category] = value
+                    break
+
+        summary_rows.append(row)
+
+    return pd.DataFrame(summary_rows)
+
+
+def build_raw_frame(entries):
+    """Flat table of every field of every report"""
+    raw_data = []
+    for entry in entries:
+        raw_row = {
+            'District': entry['district'],
+            'Month': entry['month'],
+            'Year': entry['year']
+        }
+        raw_row.update(entry.get('data', {}))
+        raw_data.append(raw_row)
+
+    return pd.DataFrame(raw_data)
+
+
+def compute_kpis(entries, summary_df):
+    """Headline numbers shown at the top of a report"""
+    total_expenditure = sum(
+        sum(entry.get('data', {}).get(field, 0) or 0 for field in EXPENDITURE_FIELDS)
+        for entry in entries
+    )
+    return {
+        "Districts Reported": len(entries),
+        "Total Surveys": int(summary_df.get('Surveys & Investigations', pd.Series([0])).sum()),
+        "Borewells Drilled": int(summary_df.get('Drilling Works', pd.Series([0])).sum()),
+        "Total Expenditure": f"₹{total_expenditure:,.0f}",
+    }
+
+
+def build_trend_frame(entries, year, last_month):
+    """Monthly totals of the trend metrics for months 1..last_month of a year"""
+    months = list(range(1, last_month + 1))
+    trend = pd.DataFrame(0.0, index=months, columns=list(TREND_METRICS.keys()))
+
+    for entry in entries:
+        if entry.get('year') != year or entry.get('month') not in trend.index:
+            continue
+        data = entry.get('data', {})
+        for label, col_name in TREND_METRICS.items():
+            value = data.get(col_name, 0)
+            if isinstance(value, (int, float)):
+                trend.loc[entry['month'], label] += value
+
+    return trend
+
+
+# ==================== EXCEL ====================
+def build_excel_report(summary_df, raw_df):
+    """Excel workbook with Summary and Raw Data sheets, as bytes"""
+    excel_buffer = io.BytesIO()
+    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
+        summary_df.to_excel(writer, sheet_name='Summary', index=False)
+        raw_df.to_excel(writer, sheet_name='Raw Data', index=False)
+    return excel_buffer.getvalue()
+
+
+def _district_workbook_job(district, entries, categories=None):
+    """Worker entry point: one district's workbook as (filename, bytes)"""
+    summary_df = build_summary_frame(entries, categories)
+    raw_df = build_raw_frame(entries)
+    return f"{district.replace(' ', '_')}.xlsx", build_excel_report(summary_df, raw_df)
+
+
+def build_district_workbooks_zip(entries, folder_name, executor=None, categories=None):
+    """ZIP with one workbook per district, built in parallel when an executor is given"""
+    by_district = {}
+    for entry in entries:
+        by_district.setdefault(entry['district'], []).append(entry)
+
+    districts = sorted(by_district)
+    groups = [by_district[d] for d in districts]
+    schemas = [categories] * len(districts)
+    if executor is not None and len(districts) > 1:
+        results = executor.map(_district_workbook_job, districts, groups, schemas)
+    else:
+        results = map(_district_workbook_job, districts, groups, schemas)
+
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for file_name, workbook in results:
+            archive.writestr(f"{folder_name}/{file_name}", workbook)
+    return zip_buffer.getvalue()
+
+
+def render_report_files(title, period_label, entries, year_entries, year, month, formats, categories=None):
+    """Worker entry point: one report's files as {extension: bytes} for 'xlsx', 'csv' and/or 'pdf'"""
+    summary_df = build_summary_frame(entries, categories)
+    raw_df = build_raw_frame(entries)
+    files = {}
+    if 'xlsx' in formats:
+        files['xlsx'] = build_excel_report(summary_df, raw_df)
+    if 'csv' in formats:
+        files['csv'] = raw_df.to_csv(index=False).encode('utf-8')
+    if 'pdf' in formats:
+        files['pdf'] = build_pdf_report(
+            title, f"Reporting period: {period_label}", compute_kpis(entries, summary_df),
+            summary_df, build_trend_frame(year_entries, year, month),
+        )
+    return files
+
+
+# ==================== PDF ====================
+def _trend_chart(trend_df, title):
+    """Line chart of monthly totals as a static drawing"""
+    drawing = Drawing(250 * mm, 70 * mm)
+    drawing.add(String(0, 65 * mm, title, fontName="Helvetica-Bold", fontSize=10))
+
+    chart = HorizontalLineChart()
+    chart.x, chart.y = 15 * mm, 10 * mm
+    chart.width, chart.height = 170 * mm, 48 * mm
+    chart.data = [tuple(float(v) for v in trend_df[label]) for label in trend_df.columns]
+    chart.categoryAxis.categoryNames = [datetime(2024, m, 1).strftime('%b') for m in trend_df.index]
+    chart.valueAxis.valueMin = 0
+    palette = [colors.HexColor(c) for c in ("#1e5799", "#28a745", "#ffc107", "#dc3545")]
+    for i, label in enumerate(trend_df.columns):
+        chart.lines[i].strokeColor = palette[i % len(palette)]
+        chart.lines[i].strokeWidth = 1.5
+    drawing.add(chart)
+
+    # Legend
+    for i, label in enumerate(trend_df.columns):
+        y = 55 * mm - i * 6 * mm
+        drawing.add(String(195 * mm, y, f"— {label}", fontSize=8, fillColor=palette[i % len(palette)]))
+    return drawing
+
+
+def _district_bar_chart(summary_df, category):
+    """Bar chart of one summary column by district"""
+    drawing = Drawing(250 * mm, 70 * mm)
+    drawing.add(String(0, 65 * mm, f"{category} by District", fontName="Helvetica-Bold", fontSize=10))
+
+    chart = VerticalBarChart()
+    chart.x, chart.y = 15 * mm, 15 * mm
+    chart.width, chart.height = 220 * mm, 45 * mm
+    chart.data = [tuple(float(v) for v in summary_df[category].fillna(0))]
+    chart.categoryAxis.categoryNames = list(summary_df['District'])
+    chart.categoryAxis.labels.angle = 30
+    chart.categoryAxis.labels.boxAnchor = 'ne'
+    chart.valueAxis.valueMin = 0
+    chart.bars[0].fillColor = colors.HexColor("#1e5799")
+    drawing.add(chart)
+    return drawing
+
+
+def build_pdf_report(title, subtitle, kpis, summary_df, trend_df=None):
+    """Render a consolidated/district report to PDF bytes"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=landscape(A4),
+        leftMargin=15 * mm, rightMargin=15 * mm,
+        topMargin=15 * mm, bottomMargin=15 * mm,
+        title=title,
+    )
+    styles = getSampleStyleSheet()
+    story = [
+        Paragraph("Ground Water Department", styles['Heading3']),
+        Paragraph(title, styles['Title']),
+        Paragraph(subtitle, styles['Normal']),
+        Spacer(1, 6 * mm),
+    ]
+
+    # Summary KPIs
+    story.append(Paragraph("Summary Statistics", styles['Heading2']))
+    # Core PDF fonts have no rupee glyph
+    kpi_table = Table([list(kpis.keys()), [str(v).replace("₹", "Rs. ") for v in kpis.values()]])
+    kpi_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1e5799")),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 1), (-1, 1), 14),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('TOPPADDING', (0, 1), (-1, 1), 6),
+        ('BOTTOMPADDING', (0, 1), (-1, 1), 6),
+    ]))
+    story += [kpi_table, Spacer(1, 6 * mm)]
+
+    # District table
+    story.append(Paragraph("Detailed District Data", styles['Heading2']))
+    table_rows = [list(summary_df.columns)]
+    for _, row in summary_df.iterrows():
+        table_rows.append([f"{v:,.0f}" if isinstance(v, (int, float)) else str(v) for v in row])
+    district_table = Table(table_rows, repeatRows=1)
+    district_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#207cca")),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f0f8ff")]),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+    ]))
+    story += [district_table, Spacer(1, 6 * mm)]
+
+    # Charts
+    if len(summary_df) > 1 and 'Surveys & Investigations' in summary_df.columns:
+        story.append(_district_bar_chart(summary_df, 'Surveys & Investigations'))
+    if trend_df is not None and not trend_df.empty:
+        story.append(_trend_chart(trend_df, "Monthly Trend (Year to Date)"))
+
+    story.append(Spacer(1, 4 * mm))
+    story.append(Paragraph(f"Generated on {datetime.now().strftime('%d %b %Y %H:%M')}", styles['Italic']))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+# ==================== BACKGROUND RENDERING ====================
+class ReportRenderPool:
+    """Renders reports on worker threads and keeps finished results by key"""
+
+    def __init__(self, max_workers=2, max_cached=64):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-render")
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_cached = max_cached
+
+    def submit(self, key, fn, *args, **kwargs):
+        """Return the future for key, starting a render only if none exists"""
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None and not (future.done() and future.exception()):
+                self._futures.move_to_end(key)
+                return future
+
+            future = self._executor.submit(fn, *args, **kwargs)
+            self._futures[key] = future
+            while len(self._futures) > self._max_cached:
+                self._futures.popitem(last=False)
+            return future
@@ -0,0 +1,125 @@
+# report_export.py
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_import import field_columns
+from write_queue import DATA_DIR
+
+# Export files live here until downloaded; ones older than EXPORT_TTL are swept on the next page load
+EXPORT_DIR = os.path.join(DATA_DIR, "exports")
+EXPORT_TTL = 6 * 3600
+
+META_COLUMNS = ['Status', 'Submitted By', 'Submitted At', 'Last Modified', 'Review Remarks', 'Schema Version']
+META_FIELDS = {
+    'Status': 'status',
+    'Submitted By': 'submitted_by',
+    'Submitted At': 'submitted_at',
+    'Last Modified': 'last_modified',
+    'Review Remarks': 'review_remarks',
+    'Schema Version': 'schema_version',
+}
+
+
+def export_schema(categories=None):
+    """Arrow schema of the export, derived from the form categories (MONTHLY_CATEGORIES by default)"""
+    fields = [
+        pa.field('Doc ID', pa.string()),
+        pa.field('District', pa.string()),
+        pa.field('Year', pa.int64()),
+        pa.field('Month', pa.int64()),
+    ]
+    fields += [pa.field(col, pa.string()) for col in META_COLUMNS]
+    for col, field in field_columns(categories):
+        fields.append(pa.field(col, pa.float64() if field['type'] == 'number' else pa.string()))
+    return pa.schema(fields)
+
+
+def _export_row(doc_id, report):
+    row = {
+        'Doc ID': doc_id,
+        'District': report.get('district'),
+        'Year': report.get('year'),
+        'Month': report.get('month'),
+    }
+    for col, key in META_FIELDS.items():
+        value = report.get(key)
+        row[col] = None if value is None else str(value)
+    row.update(report.get('data', {}))
+    return row
+
+
+def iter_report_frames(reports, chunk_rows=1000, categories=None):
+    """Group (doc_id, report) pairs into DataFrames with a fixed column layout"""
+    schema = export_schema(categories)
+    columns = schema.names
+    number_cols = [f.name for f in schema if pa.types.is_floating(f.type)]
+    int_cols = [f.name for f in schema if pa.types.is_integer(f.type)]
+    string_cols = [f.name for f in schema if pa.types.is_string(f.type)]
+
+    def to_frame(rows):
+        frame = pd.DataFrame(rows).reindex(columns=columns)
+        frame[number_cols] = frame[number_cols].apply(pd.to_numeric, errors='coerce')
+        frame[int_cols] = frame[int_cols].apply(pd.to_numeric, errors='coerce').astype('Int64')
+        frame[string_cols] = frame[string_cols].astype('string')
+        return frame
+
+    rows = []
+    for doc_id, report in reports:
+        rows.append(_export_row(doc_id, report))
+        if len(rows) >= chunk_rows:
+            yield to_frame(rows)
+            rows = []
+    if rows:
+        yield to_frame(rows)
+
+
+def write_csv(frames, sink, categories=None):
+    """Stream frames to a binary file object as CSV; returns rows written"""
+    rows = 0
+    for frame in frames:
+        sink.write(frame.to_csv(index=False, header=(rows == 0)).encode('utf-8'))
+        rows += len(frame)
+    if rows == 0:
+        sink.write(pd.DataFrame(columns=export_schema(categories).names).to_csv(index=False).encode('utf-8'))
+    return rows
+
+
+def write_parquet(frames, sink, categories=None):
+    """Stream frames to a binary file object as Parquet row groups; returns rows written
+
+    categories must be the ones the frames were built with (iter_report_frames), so the columns match.
+    """
+    schema = export_schema(categories)
+    rows = 0
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        for frame in frames:
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            rows += len(frame)
+    return rows
+
+
+EXPORT_WRITERS = {
+    'CSV': (write_csv, '.csv', 'text/csv'),
+    'Parquet': (write_parquet, '.parquet', 'application/octet-stream'),
+}
+
+
+def remove_stale_exports(max_age=EXPORT_TTL):
+    """Delete export files older than max_age seconds; returns how many were removed"""
+    if not os.path.isdir(EXPORT_DIR):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(EXPORT_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            # Another session swept it first
+            continue
+    return removed
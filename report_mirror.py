@@ -0,0 +1,56 @@
+# report_mirror.py
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Re-read this far behind the watermark so writes committed slightly out of timestamp order are not missed
+WATERMARK_OVERLAP = timedelta(seconds=60)
+
+
+class ReportMirror:
+    """In-memory copy of every report, kept current by pulling only documents changed since the last refresh"""
+
+    def __init__(self, fetch_changes, min_interval=15.0):
+        self._fetch_changes = fetch_changes
+        self.min_interval = min_interval
+        self.reports = {}
+        self.watermark = None
+        self.last_refresh = None
+        self.last_pulled = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    @property
+    def dirty(self):
+        return self._dirty
+
+    def mark_dirty(self):
+        """Make the next refresh run even inside min_interval (after a write from this process)"""
+        self._dirty = True
+
+    def refresh(self, force=False):
+        """Merge documents changed since the watermark; returns how many were pulled"""
+        with self._lock:
+            if (not force and not self._dirty and self.last_refresh is not None
+                    and time.monotonic() - self.last_refresh < self.min_interval):
+                return 0
+            self._dirty = False
+            since = self.watermark - WATERMARK_OVERLAP if self.watermark is not None else None
+            changes = self._fetch_changes(since)
+            watermark = self.watermark or EPOCH
+            for doc_id, report in changes:
+                self.reports[doc_id] = report
+                modified = report.get('last_modified')
+                if isinstance(modified, datetime) and modified > watermark:
+                    watermark = modified
+            self.watermark = watermark
+            self.last_refresh = time.monotonic()
+            self.last_pulled = len(changes)
+            return self.last_pulled
+
+    def snapshot(self):
+        """All mirrored reports ordered by district, year and month"""
+        with self._lock:
+            reports = list(self.reports.values())
+        return sorted(reports, key=lambda r: (r.get('district', ''), r.get('year', 0), r.get('month', 0)))
@@ -0,0 +1,199 @@
+# resilience.py
+import functools
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from google.api_core import exceptions as gexc
+
+logger = logging.getLogger(__name__)
+
+# gRPC codes worth retrying: DEADLINE_EXCEEDED, UNAVAILABLE, RESOURCE_EXHAUSTED, ABORTED, INTERNAL
+RETRYABLE_ERRORS = (
+    gexc.DeadlineExceeded,
+    gexc.ServiceUnavailable,
+    gexc.ResourceExhausted,
+    gexc.Aborted,
+    gexc.InternalServerError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Firestore while the circuit breaker is open"""
+
+
+# ==================== CIRCUIT BREAKER ====================
+class CircuitBreaker:
+    """Opens after repeated failures, lets one trial call through after reset_timeout"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """True if a call may go to the backend now"""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """End a call that says nothing about availability, leaving the state unchanged"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """Returns True if this failure opened the breaker"""
+        with self._lock:
+            self._trial_in_flight = False
+            self._failures += 1
+            was_open = self._opened_at is not None
+            if was_open or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                return not was_open
+            return False
+
+
+# ==================== METRICS ====================
+class ResilienceMetrics:
+    """Per-operation counters, shared by every session in the process"""
+
+    FIELDS = ("calls", "retries", "failures", "stale_served", "short_circuited", "breaker_opened")
+
+    def __init__(self):
+        self._counts = defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+        self._lock = threading.Lock()
+
+    def incr(self, operation, field, amount=1):
+        with self._lock:
+            self._counts[operation][field] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return {op: dict(counts) for op, counts in self._counts.items()}
+
+
+class StaleCache:
+    """Last good result per call, served when the backend is unavailable"""
+
+    def __init__(self, max_entries=512):
+        self._entries = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+FIRESTORE_BREAKER = CircuitBreaker()
+METRICS = ResilienceMetrics()
+STALE_CACHE = StaleCache()
+
+
+def backoff_delays(attempts, base=0.25, cap=4.0):
+    """Full-jitter exponential backoff delays between attempts"""
+    for attempt in range(attempts - 1):
+        yield random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def resilient(operation, attempts=4, serve_stale=True, on_stale=None, breaker=FIRESTORE_BREAKER):
+    """Retry retryable Firestore errors with jittered backoff behind a circuit breaker.
+
+    Reads (serve_stale=True) fall back to the last good result for the same arguments
+    when retries are exhausted or the breaker is open; on_stale(saved_at) is called
+    when that happens. Anything else is re-raised to the caller.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (operation, args, tuple(sorted(kwargs.items())))
+            METRICS.incr(operation, "calls")
+
+            def fallback(error):
+                cached = STALE_CACHE.get(key) if serve_stale else None
+                if cached is None:
+                    raise error
+                METRICS.incr(operation, "stale_served")
+                if on_stale is not None:
+                    on_stale(cached[0])
+                return cached[1]
+
+            if not breaker.allow():
+                METRICS.incr(operation, "short_circuited")
+                return fallback(CircuitOpenError("Cloud service temporarily unavailable, please try again shortly"))
+
+            delays = backoff_delays(attempts)
+            while True:
+                try:
+                    result = fn(*args, **kwargs)
+                except RETRYABLE_ERRORS as e:
+                    delay = next(delays, None)
+                    if delay is None:
+                        METRICS.incr(operation, "failures")
+                        if breaker.record_failure():
+                            METRICS.incr(operation, "breaker_opened")
+                            logger.warning("Circuit breaker opened after %s failed", operation)
+                        return fallback(e)
+                    METRICS.incr(operation, "retries")
+                    logger.info("Retrying %s in %.2fs after %s", operation, delay, type(e).__name__)
+                    time.sleep(delay)
+                    continue
+                except Exception:
+                    # Not an availability problem (bad request, permissions): neither trip nor reset the breaker
+                    METRICS.incr(operation, "failures")
+                    breaker.release_trial()
+                    raise
+
+                breaker.record_success()
+                if serve_stale:
+                    STALE_CACHE.put(key, result)
+                return result
+        return wrapper
+    return decorator
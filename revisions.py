@@ -0,0 +1,56 @@
+# revisions.py
+import copy
+
+# Top-level report fields whose changes are recorded; every key under 'data' is recorded too
+TRACKED_FIELDS = ['status', 'review_remarks', 'submitted_by', 'reviewed_by', 'schema_version']
+DATA_PREFIX = "data."
+
+
+def flatten_report(report):
+    """Tracked fields of a report as {field_path: value}, with form fields as 'data.<key>'"""
+    if not report:
+        return {}
+    flat = {field: report[field] for field in TRACKED_FIELDS if field in report}
+    for key, value in (report.get('data') or {}).items():
+        flat[DATA_PREFIX + key] = value
+    return flat
+
+
+def compute_delta(before, after):
+    """Field-level changes from one report version to the next (empty list if nothing changed)"""
+    old, new = flatten_report(before), flatten_report(after)
+    changes = []
+    for field in sorted(old.keys() | new.keys()):
+        if field not in new:
+            changes.append({'field': field, 'old': old[field], 'new': None, 'removed': True})
+        elif old.get(field) != new[field] or field not in old:
+            changes.append({'field': field, 'old': old.get(field), 'new': new[field]})
+    return changes
+
+
+def apply_delta(flat, changes):
+    """Apply one revision's changes to a flattened report in place"""
+    for change in changes:
+        if change.get('removed'):
+            flat.pop(change['field'], None)
+        else:
+            flat[change['field']] = copy.deepcopy(change['new'])
+    return flat
+
+
+def unflatten_report(flat):
+    """Inverse of flatten_report"""
+    report = {field: value for field, value in flat.items() if not field.startswith(DATA_PREFIX)}
+    report['data'] = {field[len(DATA_PREFIX):]: value for field, value in flat.items()
+                      if field.startswith(DATA_PREFIX)}
+    return report
+
+
+def reconstruct_at_revision(revisions, revision):
+    """Tracked fields of a report as they were after `revision`, replaying deltas from the first"""
+    flat = {}
+    for record in sorted(revisions, key=lambda r: r['revision']):
+        if record['revision'] > revision:
+            break
+        apply_delta(flat, record.get('changes', []))
+    return unflatten_report(flat)
@@ -0,0 +1,182 @@
+# schema_registry.py
+import logging
+
+import streamlit as st
+from firebase_admin import firestore
+
+from firebase_config import get_firestore_client, firestore_call_options
+from form_schema import MONTHLY_CATEGORIES
+from resilience import resilient
+
+logger = logging.getLogger(__name__)
+
+# Version of the built-in MONTHLY_CATEGORIES; reports without a schema_version were written with it
+BUILTIN_SCHEMA_VERSION = 1
+# Field types the New Entry form can render
+FIELD_TYPES = ('number', 'dropdown', 'text')
+
+
+def categories_to_list(categories):
+    """Firestore-safe form of a categories dict (maps don't keep key order)"""
+    return [dict(details, name=name) for name, details in categories.items()]
+
+
+def categories_from_list(items):
+    """Inverse of categories_to_list"""
+    return {item['name']: {k: v for k, v in item.items() if k != 'name'} for item in items}
+
+
+def schema_problems(categories):
+    """Reasons a categories dict cannot be rendered by the form (empty if it is valid)"""
+    problems = []
+    for category, details in categories.items():
+        if not isinstance(details, dict):
+            problems.append(f"{category}: not a category definition")
+            continue
+        if not isinstance(details.get('description'), str) or not details['description'].strip():
+            problems.append(f"{category}: missing description")
+        fields = details.get('fields')
+        if not isinstance(fields, list) or not fields:
+            problems.append(f"{category}: no fields")
+            continue
+        seen = set()
+        for position, field in enumerate(fields, 1):
+            name = f"{category} field {position}"
+            if not isinstance(field, dict):
+                problems.append(f"{name}: not a field definition")
+                continue
+            missing = [key for key in ('id', 'label', 'type') if not field.get(key)]
+            if missing:
+                problems.append(f"{name}: missing {', '.join(missing)}")
+                continue
+            if field['id'] in seen:
+                problems.append(f"{category}: duplicate field id '{field['id']}'")
+            seen.add(field['id'])
+            if field['type'] not in FIELD_TYPES:
+                problems.append(f"{category}.{field['id']}: unknown type '{field['type']}'")
+            elif field['type'] == 'dropdown':
+                options = field.get('options')
+                # A plain string would be offered one character per option
+                if (not isinstance(options, list) or not options
+                        or not all(isinstance(option, str) and option for option in options)):
+                    problems.append(f"{category}.{field['id']}: dropdown options must be a non-empty list of text")
+    return problems
+
+
+class CompiledSchema:
+    """One form schema version with its field keys precomputed"""
+
+    def __init__(self, version, categories, renamed=None):
+        self.version = version
+        self.categories = categories
+        # {key in the previous version: key in this version}
+        self.renamed = renamed or {}
+        self.fields = {
+            f"{category}_{field['id']}": field
+            for category, details in categories.items()
+            for field in details['fields']
+        }
+        self.field_keys = list(self.fields)
+        self.numeric_keys = [key for key, field in self.fields.items() if field['type'] == 'number']
+
+
+class SchemaRegistry:
+    """Every schema version, the active (newest) one, and a key mapping table per older version"""
+
+    def __init__(self, schemas):
+        self.versions = {schema.version: schema for schema in schemas}
+        ordered = sorted(self.versions)
+        self.active = self.versions[ordered[-1]]
+
+        # Walk back from the active version composing each version's renames
+        self._mappings = {}
+        to_active = {key: key for key in self.active.field_keys}
+        for previous, current in zip(reversed(ordered[:-1]), reversed(ordered[1:])):
+            renamed = self.versions[current].renamed
+            to_active = {
+                key: to_active[renamed.get(key, key)]
+                for key in self.versions[previous].field_keys
+                if renamed.get(key, key) in to_active
+            }
+            self._mappings[previous] = {old: new for old, new in to_active.items() if old != new}
+
+    def mapping(self, version):
+        """{old key: active key} for fields renamed since `version`"""
+        return self._mappings.get(version, {})
+
+    def normalize_report(self, report):
+        """Report with its data keyed by the active schema (returned as is if already current)"""
+        version = report.get('schema_version', BUILTIN_SCHEMA_VERSION)
+        mapping = self._mappings.get(version)
+        if version == self.active.version or not mapping:
+            return report
+        data = {mapping.get(key, key): value for key, value in report.get('data', {}).items()}
+        return dict(report, data=data)
+
+    def normalize_reports(self, reports):
+        return [self.normalize_report(report) for report in reports]
+
+
+# ==================== FIRESTORE ====================
+@resilient("get_form_schemas")
+def _fetch_schema_documents():
+    docs = get_firestore_client().collection('form_schemas').get(**firestore_call_options(retry=False))
+    return [doc.to_dict() for doc in docs]
+
+
+def _compile(doc):
+    renamed = {pair['from']: pair['to'] for pair in doc.get('renamed', [])}
+    return CompiledSchema(doc['version'], categories_from_list(doc['categories']), renamed)
+
+
+def load_schemas():
+    """Built-in schema plus every version stored in Firestore"""
+    schemas = {BUILTIN_SCHEMA_VERSION: CompiledSchema(BUILTIN_SCHEMA_VERSION, MONTHLY_CATEGORIES)}
+    if get_firestore_client() is not None:
+        try:
+            for doc in _fetch_schema_documents():
+                schemas[doc['version']] = _compile(doc)
+        except Exception as e:
+            logger.warning("Could not load form schemas, using built-in schema: %s", e)
+    return list(schemas.values())
+
+
+@st.cache_resource(ttl=600, show_spinner=False)
+def get_schema_registry():
+    """Compiled schema versions shared by all sessions, reloaded from Firestore every 10 minutes"""
+    return SchemaRegistry(load_schemas())
+
+
+def get_active_schema():
+    return get_schema_registry().active
+
+
+def publish_schema(categories, renamed=None, created_by=None):
+    """Store `categories` as the next schema version; renamed maps previous-version keys to new ones"""
+    db = get_firestore_client()
+    if db is None:
+        return False, "Firestore not connected (db is None)"
+    try:
+        # Published versions are immutable, so a field the form cannot render must never get in
+        problems = schema_problems(categories)
+        if problems:
+            return False, "Invalid schema: " + "; ".join(problems)
+        schema = CompiledSchema(0, categories, renamed)
+        unknown = [new for new in schema.renamed.values() if new not in schema.fields]
+        if unknown:
+            return False, f"Renamed to unknown field(s): {', '.join(unknown)}"
+
+        # Fresh read, not the cached registry: another server may have published since
+        version = max(loaded.version for loaded in load_schemas()) + 1
+        # create() fails instead of overwriting if two admins publish at once
+        db.collection('form_schemas').document(f"v{version:04d}").create({
+            'version': version,
+            'categories': categories_to_list(categories),
+            'renamed': [{'from': old, 'to': new} for old, new in schema.renamed.items()],
+            'created_by': created_by,
+            'created_at': firestore.SERVER_TIMESTAMP,
+        }, **firestore_call_options())
+        get_schema_registry.clear()
+        return True, f"Form schema version {version} published"
+    except Exception as e:
+        return False, f"Error publishing schema: {str(e)}"
@@ -0,0 +1,74 @@
+# session_stats.py
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate bytes held by an object and everything it references (each object counted once)"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+class SessionFootprints:
+    """Approximate session_state size of every live session in this process"""
+
+    def __init__(self, expire_after=1800):
+        self.expire_after = expire_after
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def record(self, session_id, user, role, state):
+        sizes = {}
+        for key in list(state.keys()):
+            try:
+                sizes[key] = deep_sizeof(state[key])
+            except Exception:
+                continue
+        largest = max(sizes, key=sizes.get) if sizes else None
+        with self._lock:
+            self._sessions[session_id] = {
+                'user': user,
+                'role': role,
+                'keys': len(sizes),
+                'bytes': sum(sizes.values()),
+                'largest_key': largest,
+                'largest_bytes': sizes.get(largest, 0),
+                'seen_at': time.time(),
+            }
+
+    def snapshot(self):
+        """Live sessions, largest first (sessions idle longer than expire_after are dropped)"""
+        cutoff = time.time() - self.expire_after
+        with self._lock:
+            for session_id in [s for s, info in self._sessions.items() if info['seen_at'] < cutoff]:
+                del self._sessions[session_id]
+            rows = [dict(info, session=session_id[:8]) for session_id, info in self._sessions.items()]
+        return sorted(rows, key=lambda row: row['bytes'], reverse=True)
+
+
+SESSION_FOOTPRINTS = SessionFootprints()
+
+
+def record_session_footprint(state):
+    """Record the calling session's state size (no-op outside a Streamlit script run)"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None:
+        SESSION_FOOTPRINTS.record(ctx.session_id, state.get('user_id'), state.get('user_role'), state)
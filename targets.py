@@ -0,0 +1,159 @@
+# targets.py
+import logging
+
+import numpy as np
+import pandas as pd
+from firebase_admin import firestore
+
+from data_store import BATCH_WRITE_LIMIT
+from firebase_config import get_firestore_client, firestore_call_options
+from form_schema import MONTHLY_CATEGORIES
+from resilience import resilient
+
+logger = logging.getLogger(__name__)
+
+# Financial year runs April to March and is named by the year it starts in
+FY_START_MONTH = 4
+# Units of fields that add up over the year; levels and depths (meters) get no target
+CUMULATIVE_UNITS = {'nos', 'sq km', 'MCM', '₹'}
+FINANCIAL_UNIT = '₹'
+TARGET_COLUMNS = ['district', 'field', 'target']
+
+
+def financial_year(year, month):
+    """Start year of the financial year a calendar month falls in (scalars or arrays)"""
+    return year - (np.asarray(month) < FY_START_MONTH).astype(int)
+
+
+def fy_label(fy):
+    return f"{fy}-{(fy + 1) % 100:02d}"
+
+
+def target_fields(categories=None):
+    """{data key: 'Physical' or 'Financial'} for every numeric field that can carry an annual target"""
+    return {
+        f"{category}_{field['id']}": 'Financial' if field.get('unit') == FINANCIAL_UNIT else 'Physical'
+        for category, details in (categories or MONTHLY_CATEGORIES).items()
+        for field in details['fields']
+        if field['type'] == 'number' and field.get('unit') in CUMULATIVE_UNITS
+    }
+
+
+def months_elapsed(fy, as_of):
+    """Completed months of a financial year at `as_of` (a month counts once it has ended), 0-12"""
+    as_of = pd.Timestamp(as_of)
+    months = (as_of.year - fy) * 12 + as_of.month - FY_START_MONTH
+    return int(np.clip(months, 0, 12))
+
+
+# ==================== ACHIEVEMENT ENGINE ====================
+def compute_achievement(analytics_df, targets_df, fy, as_of=None):
+    """Cumulative achievement, run-rate projection and rank for every (district, field) with a target.
+
+    analytics_df is the frame from build_analytics_frame (approved rows only are counted);
+    targets_df has TARGET_COLUMNS.
+    """
+    columns = ['district', 'field', 'target', 'achieved', 'achievement_pct', 'expected_pct',
+               'projected', 'projected_pct', 'on_track', 'rank']
+    targets_df = targets_df[targets_df['target'] > 0]
+    if targets_df.empty:
+        return pd.DataFrame(columns=columns)
+
+    elapsed = months_elapsed(fy, as_of if as_of is not None else pd.Timestamp.now())
+    fields = [f for f in targets_df['field'].unique() if f in analytics_df.columns]
+
+    rows = analytics_df[analytics_df['status'] == 'approved']
+    in_year = financial_year(rows['year'].to_numpy(dtype=int), rows['month'].to_numpy(dtype=int)) == fy
+    if fields and in_year.any():
+        achieved = (
+            rows.loc[in_year, ['district'] + fields]
+            .groupby('district')[fields].sum()
+            .rename_axis(columns='field').stack().rename('achieved').reset_index()
+        )
+    else:
+        achieved = pd.DataFrame(columns=['district', 'field', 'achieved'])
+
+    result = targets_df.merge(achieved, on=['district', 'field'], how='left')
+    result['achieved'] = result['achieved'].astype(float).fillna(0.0)
+    result['achievement_pct'] = (result['achieved'] / result['target'] * 100).round(1)
+    result['expected_pct'] = round(elapsed / 12 * 100, 1)
+    # Straight-line projection of the pace so far to the end of the year
+    result['projected'] = result['achieved'] * 12 / elapsed if elapsed else np.nan
+    result['projected_pct'] = (result['projected'] / result['target'] * 100).round(1)
+    result['on_track'] = result['achievement_pct'] >= result['expected_pct']
+    # 1 = furthest behind for that field
+    result['rank'] = result.groupby('field')['achievement_pct'].rank(method='min').astype(int)
+    return result[columns].sort_values(['field', 'rank']).reset_index(drop=True)
+
+
+def rank_laggards(achievement_df):
+    """One row per district: mean achievement % (capped at 100 per field), fields on track and rank"""
+    if achievement_df.empty:
+        return pd.DataFrame(columns=['district', 'avg_achievement_pct', 'fields_on_track', 'fields', 'rank'])
+    scores = (
+        achievement_df.assign(capped=achievement_df['achievement_pct'].clip(upper=100))
+        .groupby('district')
+        .agg(avg_achievement_pct=('capped', 'mean'), fields_on_track=('on_track', 'sum'), fields=('field', 'size'))
+        .reset_index()
+    )
+    scores['avg_achievement_pct'] = scores['avg_achievement_pct'].round(1)
+    scores['rank'] = scores['avg_achievement_pct'].rank(method='min').astype(int)
+    return scores.sort_values('rank').reset_index(drop=True)
+
+
+def targets_fingerprint(targets_df):
+    """Changes whenever any target changes; used as part of cache keys"""
+    return str(pd.util.hash_pandas_object(targets_df, index=False).sum()) if len(targets_df) else "none"
+
+
+# ==================== FIRESTORE ====================
+@resilient("get_targets")
+def _fetch_targets(fy):
+    query = get_firestore_client().collection('targets').where('fy', '==', fy)
+    return [doc.to_dict() for doc in query.get(**firestore_call_options(retry=False))]
+
+
+def load_targets(fy, district=None):
+    """Targets of a financial year as a long frame with TARGET_COLUMNS"""
+    if get_firestore_client() is None:
+        return pd.DataFrame(columns=TARGET_COLUMNS)
+    try:
+        docs = _fetch_targets(fy)
+    except Exception as e:
+        logger.warning("Could not load targets: %s", e)
+        docs = []
+    rows = [
+        (doc['district'], field, float(value))
+        for doc in docs
+        if district is None or doc['district'] == district
+        for field, value in doc.get('targets', {}).items()
+    ]
+    return pd.DataFrame(rows, columns=TARGET_COLUMNS)
+
+
+def save_targets(fy, targets_df, updated_by=None):
+    """Replace the targets of every district in targets_df for one financial year"""
+    db = get_firestore_client()
+    if db is None:
+        return False, "Firestore not connected (db is None)"
+    try:
+        targets_ref = db.collection('targets')
+        batch = db.batch()
+        districts = 0
+        for district, group in targets_df.groupby('district'):
+            if districts and districts % BATCH_WRITE_LIMIT == 0:
+                batch.commit(**firestore_call_options())
+                batch = db.batch()
+            batch.set(targets_ref.document(f"{district}_{fy}"), {
+                'district': district,
+                'fy': fy,
+                'targets': {field: float(value) for field, value in zip(group['field'], group['target'])
+                            if pd.notna(value) and value > 0},
+                'updated_by': updated_by,
+                'updated_at': firestore.SERVER_TIMESTAMP,
+            })
+            districts += 1
+        batch.commit(**firestore_call_options())
+        return True, f"Targets for FY {fy_label(fy)} saved for {districts} districts"
+    except Exception as e:
+        return False, f"Error saving targets: {str(e)}"
@@ -0,0 +1,232 @@
+# write_queue.py
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.environ.get("GWD_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".gwd_data"))
+SERVER_TIMESTAMP_MARKER = "__SERVER_TIMESTAMP__"
+# Writes rejected with non-retryable errors move to failed_writes after this many tries
+MAX_ATTEMPTS = 5
+
+
+def _encode(document):
+    """JSON-safe copy of a report document (server timestamps become a marker)"""
+    def convert(value):
+        if value is SERVER_TIMESTAMP:
+            return SERVER_TIMESTAMP_MARKER
+        if isinstance(value, dict):
+            return {k: convert(v) for k, v in value.items()}
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+    return json.dumps(convert(document))
+
+
+def _decode(payload, for_display=False):
+    """Document ready to write (or, for display, with timestamps filled in locally)"""
+    now = datetime.now(timezone.utc)
+
+    def convert(value):
+        if value == SERVER_TIMESTAMP_MARKER:
+            return now if for_display else SERVER_TIMESTAMP
+        if isinstance(value, dict):
+            return {k: convert(v) for k, v in value.items()}
+        return value
+    return convert(json.loads(payload))
+
+
+class WriteQueue:
+    """Durable FIFO of report writes in a local SQLite file, replayed in order when the cloud is reachable"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DATA_DIR, "write_queue.sqlite3")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher = None
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_writes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    doc_id TEXT NOT NULL,
+                    district TEXT,
+                    payload TEXT NOT NULL,
+                    queued_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_district ON pending_writes (district)")
+            # Writes the cloud kept rejecting, held until someone resubmits or discards them
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS failed_writes (
+                    seq INTEGER PRIMARY KEY,
+                    doc_id TEXT NOT NULL,
+                    district TEXT,
+                    payload TEXT NOT NULL,
+                    queued_at REAL NOT NULL,
+                    failed_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT
+                )
+            """)
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            conn.execute("PRAGMA synchronous=FULL")
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, doc_id, document):
+        """Durably record a write; returns its sequence number"""
+        with self._lock, self._connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO pending_writes (doc_id, district, payload, queued_at) VALUES (?, ?, ?, ?)",
+                (doc_id, document.get('district'), _encode(document), time.time())
+            )
+            seq = cursor.lastrowid
+        self._wakeup.set()
+        return seq
+
+    def pending_count(self, district=None):
+        with self._connection() as conn:
+            if district:
+                row = conn.execute("SELECT COUNT(*) FROM pending_writes WHERE district = ?", (district,)).fetchone()
+            else:
+                row = conn.execute("SELECT COUNT(*) FROM pending_writes").fetchone()
+        return row[0]
+
+    def failed_count(self, district=None):
+        with self._connection() as conn:
+            if district:
+                row = conn.execute("SELECT COUNT(*) FROM failed_writes WHERE district = ?", (district,)).fetchone()
+            else:
+                row = conn.execute("SELECT COUNT(*) FROM failed_writes").fetchone()
+        return row[0]
+
+    def failed_summary(self, district=None):
+        """Rows for a failed-sync table"""
+        query = "SELECT seq, doc_id, district, failed_at, attempts, last_error FROM failed_writes"
+        params = ()
+        if district:
+            query += " WHERE district = ?"
+            params = (district,)
+        with self._connection() as conn:
+            return conn.execute(query + " ORDER BY seq", params).fetchall()
+
+    def resubmit_failed(self, seq):
+        """Queue a failed write again behind the current queue; returns False if it is gone"""
+        with self._lock, self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT doc_id, district, payload FROM failed_writes WHERE seq = ?", (seq,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "INSERT INTO pending_writes (doc_id, district, payload, queued_at) VALUES (?, ?, ?, ?)",
+                (*row, time.time())
+            )
+            conn.execute("DELETE FROM failed_writes WHERE seq = ?", (seq,))
+            conn.execute("COMMIT")
+        self._wakeup.set()
+        return True
+
+    def discard_failed(self, seq):
+        """Forget a failed write; returns False if it is gone"""
+        with self._connection() as conn:
+            return conn.execute("DELETE FROM failed_writes WHERE seq = ?", (seq,)).rowcount > 0
+
+    def pending_documents(self, district=None):
+        """Latest queued version of each pending document, for read-your-writes overlays"""
+        query = "SELECT doc_id, payload FROM pending_writes"
+        params = ()
+        if district:
+            query += " WHERE district = ?"
+            params = (district,)
+        with self._connection() as conn:
+            rows = conn.execute(query + " ORDER BY seq", params).fetchall()
+        return {doc_id: _decode(payload, for_display=True) for doc_id, payload in rows}
+
+    def pending_summary(self, district=None):
+        """Rows for a pending-sync table"""
+        query = "SELECT doc_id, queued_at, attempts, last_error FROM pending_writes"
+        params = ()
+        if district:
+            query += " WHERE district = ?"
+            params = (district,)
+        with self._connection() as conn:
+            return conn.execute(query + " ORDER BY seq", params).fetchall()
+
+    def flush(self, write_fn, is_retryable):
+        """Replay queued writes oldest first; stops at the first retryable failure to keep order"""
+        if not self._flush_lock.acquire(blocking=False):
+            return 0
+        written = 0
+        blocked = set()
+        try:
+            with self._connection() as conn:
+                rows = conn.execute("SELECT seq, doc_id, payload, attempts FROM pending_writes ORDER BY seq").fetchall()
+                for seq, doc_id, payload, attempts in rows:
+                    if doc_id in blocked:
+                        # Never apply a newer write of a document before an older one
+                        continue
+                    try:
+                        write_fn(doc_id, _decode(payload))
+                    except Exception as e:
+                        conn.execute(
+                            "UPDATE pending_writes SET attempts = attempts + 1, last_error = ? WHERE seq = ?",
+                            (str(e)[:200], seq)
+                        )
+                        if is_retryable(e):
+                            break
+                        if attempts + 1 >= MAX_ATTEMPTS:
+                            logger.error("Queued write %s failed %d times, moved to failed writes: %s",
+                                         doc_id, attempts + 1, e)
+                            conn.execute("BEGIN")
+                            conn.execute(
+                                "INSERT INTO failed_writes SELECT seq, doc_id, district, payload, queued_at, ?, "
+                                "attempts, last_error FROM pending_writes WHERE seq = ?",
+                                (time.time(), seq)
+                            )
+                            conn.execute("DELETE FROM pending_writes WHERE seq = ?", (seq,))
+                            conn.execute("COMMIT")
+                        else:
+                            blocked.add(doc_id)
+                        continue
+                    conn.execute("DELETE FROM pending_writes WHERE seq = ?", (seq,))
+                    written += 1
+        finally:
+            self._flush_lock.release()
+        return written
+
+    def start_flusher(self, write_fn, is_retryable, interval=15.0):
+        """Background thread that replays the queue after each enqueue and every `interval` seconds"""
+        if self._flusher is not None:
+            return
+
+        def run():
+            while True:
+                self._wakeup.wait(interval)
+                self._wakeup.clear()
+                try:
+                    if self.pending_count():
+                        self.flush(write_fn, is_retryable)
+                except Exception:
+                    logger.exception("Write queue flush failed")
+
+        self._flusher = threading.Thread(target=run, name="write-queue-flusher", daemon=True)
+        self._flusher.start()